@@ -1,5 +1,3 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext, filedialog
 import json
 import os
 import sys
@@ -7,6 +5,8 @@ import threading
 import requests
 import time
 import csv
+import hashlib
+import codecs
 import subprocess
 from datetime import datetime, timedelta
 import logging
@@ -14,13 +14,33 @@ import traceback
 import ctypes
 from ctypes import wintypes
 from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 import calendar
 import webbrowser
 import base64
 import io
 import random
+import queue
+import uuid
+import sqlite3
+import functools
+import re
+import shutil
+import socket
+import argparse
+import multiprocessing
+from contextlib import contextmanager
 from requests.adapters import HTTPAdapter
 
+# Process-pool workers (see _shard_worker_main) and lease worker nodes (see run_lease_worker)
+# run headless: they never import or start Tk.
+_HEADLESS_WORKER = os.environ.get('UEC_HEADLESS_WORKER') == '1' or '--lease-worker' in sys.argv[1:]
+if _HEADLESS_WORKER:
+    tk = ttk = messagebox = scrolledtext = filedialog = None
+else:
+    import tkinter as tk
+    from tkinter import ttk, messagebox, scrolledtext, filedialog
+
 try:
     from license_manager import (
         check_license, activate_license, deactivate_license,
@@ -30,6 +50,15 @@ try:
 except ImportError:
     _HAS_LICENSE = False
 
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
+    from cryptography.hazmat.primitives.serialization import pkcs12
+    _HAS_CRYPTOGRAPHY = True
+except ImportError:
+    _HAS_CRYPTOGRAPHY = False
+
 APP_VERSION = "v1.14.5"
 
 # Use a stable AppUserModelID on Windows. If this changes per version, Windows may keep
@@ -55,6 +84,1094 @@ def _get_pooled_session() -> requests.Session:
     return sess
 
 
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+class CertificateAssertionSigner:
+    """Sign Entra ID client-assertion JWTs (RS256) in-process with a loaded certificate key."""
+
+    def __init__(self, private_key, certificate):
+        self._key = private_key
+        der = certificate.public_bytes(serialization.Encoding.DER)
+        sha1 = hashlib.sha1(der).digest()
+        self.thumbprint = sha1.hex().upper()
+        self.x5t = _b64url(sha1)
+
+    @classmethod
+    def from_pfx_bytes(cls, data: bytes, password: str | None = None) -> 'CertificateAssertionSigner':
+        if not _HAS_CRYPTOGRAPHY:
+            raise Exception("未安装 cryptography，无法在进程内签名证书断言")
+        key, cert, _extra = pkcs12.load_key_and_certificates(data, password.encode('utf-8') if password else None)
+        if key is None or cert is None:
+            raise Exception("PFX 中缺少私钥或证书")
+        return cls(key, cert)
+
+    @classmethod
+    def from_file(cls, path: str, password: str | None = None) -> 'CertificateAssertionSigner':
+        """Load a .pfx/.p12 bundle, or a PEM file holding both the certificate and private key."""
+        if not _HAS_CRYPTOGRAPHY:
+            raise Exception("未安装 cryptography，无法在进程内签名证书断言")
+        with open(path, 'rb') as f:
+            data = f.read()
+        if b'-----BEGIN' not in data:
+            return cls.from_pfx_bytes(data, password)
+        pw = password.encode('utf-8') if password else None
+        key = serialization.load_pem_private_key(data, password=pw)
+        cert = x509.load_pem_x509_certificate(data)
+        return cls(key, cert)
+
+    def build_assertion(self, client_id: str, token_url: str, lifetime: int = 300) -> str:
+        now = int(time.time())
+        header = {"alg": "RS256", "typ": "JWT", "x5t": self.x5t}
+        payload = {
+            "aud": token_url,
+            "exp": now + lifetime,
+            "iss": client_id,
+            "jti": str(uuid.uuid4()),
+            "nbf": now,
+            "sub": client_id,
+        }
+        signing_input = (
+            _b64url(json.dumps(header, separators=(',', ':')).encode('utf-8'))
+            + '.'
+            + _b64url(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        )
+        signature = self._key.sign(signing_input.encode('ascii'), asym_padding.PKCS1v15(), hashes.SHA256())
+        return signing_input + '.' + _b64url(signature)
+
+
+def _jwt_expires_in(token: str) -> float | None:
+    """Seconds until a JWT's ``exp`` claim, or None if the token is opaque."""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp']) - time.time()
+    except Exception:
+        return None
+
+
+class AccessTokenManager:
+    """Hold one bearer token for a run and refresh it shortly before it expires.
+
+    ``fetch`` returns ``(token, expires_in_seconds_or_None)``. Only one thread refreshes at a
+    time: inside the refresh margin the others keep using the still-valid token, once it is
+    (nearly) expired they wait for the refresh instead of all hitting the token endpoint.
+    """
+
+    def __init__(self, fetch, refresh_margin: float = 300.0, default_lifetime: float = 3600.0):
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.default_lifetime = default_lifetime
+        self._lock = threading.Lock()
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self.refresh_count = 0
+
+    def _still_usable(self, now: float) -> bool:
+        return bool(self._token) and now < self._expires_at - 30
+
+    def _refresh_locked(self) -> str:
+        token, expires_in = self._fetch()
+        if not token:
+            raise Exception("获取 Token 失败")
+        try:
+            lifetime = float(expires_in) if expires_in is not None else self.default_lifetime
+        except Exception:
+            lifetime = self.default_lifetime
+        self._token = token
+        self._expires_at = time.monotonic() + lifetime
+        self.refresh_count += 1
+        return token
+
+    def get(self) -> str:
+        now = time.monotonic()
+        token = self._token
+        if token and now < self._expires_at - self.refresh_margin:
+            return token
+        if self._still_usable(now):
+            if not self._lock.acquire(blocking=False):
+                return token
+        else:
+            self._lock.acquire()
+        try:
+            if self._token and time.monotonic() < self._expires_at - self.refresh_margin:
+                return self._token
+            try:
+                return self._refresh_locked()
+            except Exception:
+                # A failed early refresh is retried on a later call while the old token lasts.
+                if self._still_usable(time.monotonic()):
+                    return self._token
+                raise
+        finally:
+            self._lock.release()
+
+    def invalidate(self, stale_token: str) -> str:
+        """Refresh after a 401, unless another thread already replaced ``stale_token``."""
+        with self._lock:
+            if self._token and self._token != stale_token:
+                return self._token
+            return self._refresh_locked()
+
+    def seconds_left(self) -> float:
+        return max(0.0, self._expires_at - time.monotonic()) if self._token else 0.0
+
+
+class RunJournal:
+    """Crash-safe journal of run progress (SQLite in WAL mode) used to resume interrupted runs.
+
+    Records per-mailbox completion and, for Graph email folders, the page link to continue from.
+    Every write is committed immediately, so a killed process loses at most the in-flight page.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY, kind TEXT, fingerprint TEXT, report_path TEXT,
+                status TEXT, created REAL, updated REAL);
+            CREATE TABLE IF NOT EXISTS mailboxes (
+                run_id TEXT, mailbox TEXT, status TEXT, updated REAL,
+                PRIMARY KEY (run_id, mailbox));
+            CREATE TABLE IF NOT EXISTS folders (
+                run_id TEXT, mailbox TEXT, folder TEXT, status TEXT, next_link TEXT, updated REAL,
+                PRIMARY KEY (run_id, mailbox, folder));
+            """
+        )
+        self._conn.commit()
+
+    def _write(self, sql: str, args: tuple):
+        with self._lock:
+            self._conn.execute(sql, args)
+            self._conn.commit()
+
+    def start_run(self, kind: str, fingerprint: str, report_path: str) -> str:
+        """Register a new run; older unfinished runs of the same kind can no longer be resumed."""
+        run_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute("UPDATE runs SET status='superseded', updated=? WHERE kind=? AND status='running'", (now, kind))
+            self._conn.execute(
+                "INSERT INTO runs (run_id, kind, fingerprint, report_path, status, created, updated) VALUES (?, ?, ?, ?, 'running', ?, ?)",
+                (run_id, kind, fingerprint, report_path, now, now),
+            )
+            self._conn.commit()
+        return run_id
+
+    def find_resumable(self, kind: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, fingerprint, report_path, created FROM runs WHERE kind=? AND status='running' ORDER BY created DESC LIMIT 1",
+                (kind,),
+            ).fetchone()
+        if not row:
+            return None
+        return {'run_id': row[0], 'fingerprint': row[1], 'report_path': row[2], 'created': row[3]}
+
+    def finish_run(self, run_id: str):
+        self._write("UPDATE runs SET status='done', updated=? WHERE run_id=?", (time.time(), run_id))
+
+    def done_mailboxes(self, run_id: str) -> set[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT mailbox FROM mailboxes WHERE run_id=? AND status='done'", (run_id,)).fetchall()
+        return {r[0] for r in rows}
+
+    def mark_mailbox_done(self, run_id: str, mailbox: str):
+        self._write("INSERT OR REPLACE INTO mailboxes (run_id, mailbox, status, updated) VALUES (?, ?, 'done', ?)",
+                    (run_id, (mailbox or '').lower(), time.time()))
+
+    def folder_state(self, run_id: str, mailbox: str, folder: str) -> tuple[str, str] | None:
+        """(status, next_link) for a folder of a resumed run, or None if it was never started."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, next_link FROM folders WHERE run_id=? AND mailbox=? AND folder=?",
+                (run_id, (mailbox or '').lower(), folder),
+            ).fetchone()
+        return (row[0], row[1] or '') if row else None
+
+    def save_folder_link(self, run_id: str, mailbox: str, folder: str, next_link: str):
+        status = 'partial' if next_link else 'done'
+        self._write("INSERT OR REPLACE INTO folders (run_id, mailbox, folder, status, next_link, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                    (run_id, (mailbox or '').lower(), folder, status, next_link or '', time.time()))
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+
+class PageCheckpoint:
+    """Advance a folder's resume link only once every earlier page is fully processed.
+
+    Pages are numbered in fetch order. A page holds one reference while its items are being
+    emitted plus one per queued delete chunk; ``on_advance(link)`` fires with the link that
+    follows the newest page whose predecessors have all completed ('' after the last page).
+    A chunk that raises never releases, so the checkpoint stays before it.
+    """
+
+    def __init__(self, on_advance):
+        self._on_advance = on_advance
+        self._lock = threading.Lock()
+        self._pending: dict[int, int] = {}
+        self._links: dict[int, str] = {}
+        self._next_seq = 0
+        self._done_upto = -1
+
+    def open_page(self) -> int:
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._pending[seq] = 1
+            return seq
+
+    def hold(self, seq: int):
+        with self._lock:
+            self._pending[seq] += 1
+
+    def release(self, seq: int, link_after: str | None = None):
+        with self._lock:
+            if link_after is not None:
+                self._links[seq] = link_after
+            self._pending[seq] -= 1
+            advanced = None
+            while self._pending.get(self._done_upto + 1) == 0:
+                self._done_upto += 1
+                del self._pending[self._done_upto]
+                advanced = self._links.pop(self._done_upto, '')
+            if advanced is not None:
+                self._on_advance(advanced)
+
+
+LEASE_DB_NAME = "mailbox_leases.sqlite3"
+LEASE_CHUNK_SIZE = 20
+LEASE_SECONDS = 300
+
+# Credentials never go into the shared lease store; worker nodes take them from these variables.
+_LEASE_SECRET_ENV = {
+    'client_secret_var': 'UEC_CLIENT_SECRET',
+    'graph_token_var': 'UEC_GRAPH_TOKEN',
+    'cert_password_var': 'UEC_CERT_PASSWORD',
+    'ews_pass_var': 'UEC_EWS_PASSWORD',
+    'ews_oauth_secret_var': 'UEC_EWS_OAUTH_SECRET',
+    'ews_token_var': 'UEC_EWS_TOKEN',
+}
+
+
+class MailboxLeaseStore:
+    """Shared lease table that hands the target mailboxes of a job to worker nodes in chunks.
+
+    The SQLite file lives on a volume every node can reach, so it keeps the rollback journal
+    (WAL needs shared memory and does not work across machines) and every claim runs in a
+    ``BEGIN IMMEDIATE`` transaction: two nodes never hold the same mailbox. A lease that is not
+    renewed by heartbeats expires and goes to the next node that asks; a mailbox whose lease
+    expired ``max_attempts`` times is given up as failed. Node clocks are assumed to be in sync.
+    """
+
+    def __init__(self, path: str, timeout: float = 60):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY, kind TEXT, fingerprint TEXT, settings TEXT,
+                status TEXT, created REAL, updated REAL);
+            CREATE TABLE IF NOT EXISTS leases (
+                job_id TEXT, mailbox TEXT, status TEXT, owner TEXT, lease_until REAL,
+                attempts INTEGER DEFAULT 0, updated REAL, seconds REAL, rows INTEGER,
+                PRIMARY KEY (job_id, mailbox));
+            CREATE INDEX IF NOT EXISTS leases_by_status ON leases (job_id, status);
+            CREATE TABLE IF NOT EXISTS nodes (
+                job_id TEXT, node TEXT, heartbeat REAL, done INTEGER DEFAULT 0,
+                PRIMARY KEY (job_id, node));
+            """
+        )
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def create_job(self, kind: str, fingerprint: str, settings: dict, mailboxes: list[str]) -> str:
+        """Register a job (superseding any running one) and queue its mailboxes in the given order."""
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._tx() as c:
+            # workers always follow the newest job; older ones stop at their next chunk
+            c.execute("UPDATE jobs SET status='superseded', updated=? WHERE status='running'", (now,))
+            c.execute("INSERT INTO jobs (job_id, kind, fingerprint, settings, status, created, updated) VALUES (?, ?, ?, ?, 'running', ?, ?)",
+                      (job_id, kind, fingerprint, json.dumps(settings, ensure_ascii=False), now, now))
+            c.executemany("INSERT OR IGNORE INTO leases (job_id, mailbox, status, attempts, updated) VALUES (?, ?, 'pending', 0, ?)",
+                          [(job_id, m, now) for m in mailboxes])
+        return job_id
+
+    def find_job(self, kind: str | None = None, fingerprint: str | None = None) -> dict | None:
+        """Newest running job, optionally restricted to a kind and fingerprint."""
+        sql = "SELECT job_id, kind, fingerprint, settings, created FROM jobs WHERE status='running'"
+        args: list = []
+        if kind:
+            sql += " AND kind=?"
+            args.append(kind)
+        if fingerprint:
+            sql += " AND fingerprint=?"
+            args.append(fingerprint)
+        with self._lock:
+            row = self._conn.execute(sql + " ORDER BY created DESC LIMIT 1", args).fetchone()
+        if not row:
+            return None
+        return {'job_id': row[0], 'kind': row[1], 'fingerprint': row[2], 'settings': json.loads(row[3] or '{}'), 'created': row[4]}
+
+    def job_status(self, job_id: str) -> str:
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return row[0] if row else ''
+
+    def finish_job(self, job_id: str, status: str = 'done'):
+        with self._tx() as c:
+            c.execute("UPDATE jobs SET status=?, updated=? WHERE job_id=?", (status, time.time(), job_id))
+
+    def lease(self, job_id: str, node: str, count: int, lease_seconds: float, max_attempts: int = 3) -> list[str]:
+        """Claim up to ``count`` pending (or expired) mailboxes for ``node``."""
+        now = time.time()
+        with self._tx() as c:
+            c.execute("UPDATE leases SET status='failed', owner=NULL, updated=? "
+                      "WHERE job_id=? AND status='leased' AND lease_until<? AND attempts>=?",
+                      (now, job_id, now, max_attempts))
+            rows = c.execute("SELECT mailbox FROM leases WHERE job_id=? AND (status='pending' OR (status='leased' AND lease_until<?)) "
+                             "ORDER BY rowid LIMIT ?", (job_id, now, max(1, int(count)))).fetchall()
+            mailboxes = [r[0] for r in rows]
+            c.executemany("UPDATE leases SET status='leased', owner=?, lease_until=?, attempts=attempts+1, updated=? WHERE job_id=? AND mailbox=?",
+                          [(node, now + lease_seconds, now, job_id, m) for m in mailboxes])
+            c.execute("INSERT INTO nodes (job_id, node, heartbeat) VALUES (?, ?, ?) "
+                      "ON CONFLICT (job_id, node) DO UPDATE SET heartbeat=excluded.heartbeat", (job_id, node, now))
+        return mailboxes
+
+    def heartbeat(self, job_id: str, node: str, lease_seconds: float):
+        """Renew every lease ``node`` still holds."""
+        now = time.time()
+        with self._tx() as c:
+            c.execute("UPDATE leases SET lease_until=? WHERE job_id=? AND owner=? AND status='leased'",
+                      (now + lease_seconds, job_id, node))
+            c.execute("UPDATE nodes SET heartbeat=? WHERE job_id=? AND node=?", (now, job_id, node))
+
+    def complete(self, job_id: str, node: str, results: dict[str, bool],
+                 stats: dict[str, tuple[float, int]] | None = None) -> set[str]:
+        """Record finished mailboxes (True = done, False = failed) with their (seconds, report rows).
+
+        Only mailboxes ``node`` still holds are recorded; the accepted ones are returned. A node
+        whose lease expired and went to another node must drop its results for the rest.
+        """
+        now = time.time()
+        stats = stats or {}
+        accepted: set[str] = set()
+        with self._tx() as c:
+            for m, ok in results.items():
+                cur = c.execute("UPDATE leases SET status=?, updated=?, seconds=?, rows=? "
+                                "WHERE job_id=? AND mailbox=? AND owner=? AND status='leased'",
+                                ('done' if ok else 'failed', now, *stats.get(m, (None, None)), job_id, m, node))
+                if cur.rowcount:
+                    accepted.add(m)
+            c.execute("UPDATE nodes SET done=done+?, heartbeat=? WHERE job_id=? AND node=?",
+                      (sum(1 for m in accepted if results[m]), now, job_id, node))
+        return accepted
+
+    def release(self, job_id: str, node: str, mailboxes: list[str]):
+        """Hand back unprocessed mailboxes without counting the attempt."""
+        with self._tx() as c:
+            c.executemany("UPDATE leases SET status='pending', owner=NULL, attempts=MAX(attempts-1, 0), updated=? "
+                          "WHERE job_id=? AND mailbox=? AND owner=? AND status='leased'",
+                          [(time.time(), job_id, m, node) for m in mailboxes])
+
+    def counts(self, job_id: str) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM leases WHERE job_id=? GROUP BY status", (job_id,)).fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    def mailboxes(self, job_id: str, status: str) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT mailbox FROM leases WHERE job_id=? AND status=? ORDER BY rowid", (job_id, status)).fetchall()
+        return [r[0] for r in rows]
+
+    def durations(self, job_id: str) -> list[tuple[str, float, int]]:
+        """(mailbox, seconds, report rows) of the mailboxes that finished cleanly."""
+        with self._lock:
+            return [tuple(r) for r in self._conn.execute(
+                "SELECT mailbox, seconds, rows FROM leases WHERE job_id=? AND status='done' AND seconds IS NOT NULL",
+                (job_id,)).fetchall()]
+
+    def nodes(self, job_id: str) -> list[tuple[str, float, int]]:
+        """(node, last heartbeat, mailboxes done) of every node that joined the job."""
+        with self._lock:
+            return [tuple(r) for r in self._conn.execute(
+                "SELECT node, heartbeat, done FROM nodes WHERE job_id=? ORDER BY node", (job_id,)).fetchall()]
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+
+class GraphDeltaStateStore:
+    """Persist Graph messages/delta links per (tenant, user, folder) for incremental scans.
+
+    Each entry also records the criteria fingerprint of the run that produced it; a link
+    saved under different criteria is ignored so the next run falls back to a full sync.
+    """
+
+    def __init__(self, path: str, persist: bool = True):
+        self.path = path
+        # Shard worker processes do not write the file; they hand export_changes() to the parent.
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._state: dict[str, dict] = {}
+        self._changes: dict[str, dict | None] = {}
+        self._dirty = 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._state = data
+        except Exception:
+            self._state = {}
+
+    @staticmethod
+    def _key(tenant: str, user: str, folder: str) -> str:
+        return f"{(tenant or '').lower()}|{(user or '').lower()}|{folder}"
+
+    def get(self, tenant: str, user: str, folder: str, fingerprint: str) -> str | None:
+        with self._lock:
+            entry = self._state.get(self._key(tenant, user, folder))
+        if not isinstance(entry, dict) or entry.get('fingerprint') != fingerprint:
+            return None
+        return entry.get('deltaLink') or None
+
+    def put(self, tenant: str, user: str, folder: str, fingerprint: str, delta_link: str):
+        with self._lock:
+            key = self._key(tenant, user, folder)
+            self._state[key] = {
+                'deltaLink': delta_link,
+                'fingerprint': fingerprint,
+                'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            self._changes[key] = self._state[key]
+            self._dirty += 1
+            flush_now = self._dirty >= 200
+        if flush_now:
+            self.flush()
+
+    def discard(self, tenant: str, user: str, folder: str):
+        with self._lock:
+            key = self._key(tenant, user, folder)
+            if self._state.pop(key, None) is not None:
+                self._changes[key] = None
+                self._dirty += 1
+
+    def export_changes(self) -> dict:
+        with self._lock:
+            return dict(self._changes)
+
+    def apply_changes(self, changes: dict):
+        with self._lock:
+            for key, entry in (changes or {}).items():
+                if entry is None:
+                    self._state.pop(key, None)
+                else:
+                    self._state[key] = entry
+                self._changes[key] = entry
+                self._dirty += 1
+
+    def flush(self):
+        if not self.persist:
+            return
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = json.dumps(self._state, ensure_ascii=False)
+                self._dirty = 0
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.path)
+
+
+class GraphFolderIndexCache:
+    """On-disk cache of per-mailbox Graph folder indexes (id -> displayName/path/parent/childFolderCount).
+
+    Entries older than `ttl_seconds` are ignored, so new or renamed folders show up after the TTL.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 4 * 3600, persist: bool = True):
+        self.path = path
+        self.ttl_seconds = float(ttl_seconds)
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._state: dict[str, dict] = {}
+        self._changes: dict[str, dict] = {}
+        self._dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._state = data
+        except Exception:
+            self._state = {}
+
+    @staticmethod
+    def _key(tenant: str, user: str) -> str:
+        return f"{(tenant or '').lower()}|{(user or '').lower()}"
+
+    def get(self, tenant: str, user: str) -> dict | None:
+        with self._lock:
+            entry = self._state.get(self._key(tenant, user))
+        if not isinstance(entry, dict):
+            return None
+        try:
+            if time.time() - float(entry.get('built', 0)) > self.ttl_seconds:
+                return None
+        except Exception:
+            return None
+        return entry
+
+    def put(self, tenant: str, user: str, folders: dict, wellknown: dict):
+        with self._lock:
+            key = self._key(tenant, user)
+            self._state[key] = {'built': time.time(), 'folders': folders, 'wellknown': wellknown}
+            self._changes[key] = self._state[key]
+            self._dirty = True
+
+    def export_changes(self) -> dict:
+        with self._lock:
+            return dict(self._changes)
+
+    def apply_changes(self, changes: dict):
+        with self._lock:
+            for key, entry in (changes or {}).items():
+                self._state[key] = entry
+                self._changes[key] = entry
+            self._dirty = self._dirty or bool(changes)
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty or not self.persist:
+                return
+            now = time.time()
+            # drop expired mailboxes so the file does not grow forever
+            self._state = {k: v for k, v in self._state.items()
+                           if isinstance(v, dict) and now - float(v.get('built', 0) or 0) <= self.ttl_seconds}
+            snapshot = json.dumps(self._state, ensure_ascii=False)
+            self._dirty = False
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.path)
+
+
+class MailboxStatsStore:
+    """Per-mailbox history of earlier runs (duration, report rows) for longest-first scheduling.
+
+    Durations are smoothed across runs so that one throttled run does not reorder everything.
+    Like the delta store, shard worker processes hand export_changes() to the parent.
+    """
+
+    def __init__(self, path: str, persist: bool = True):
+        self.path = path
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._state: dict[str, dict] = {}
+        self._changes: dict[str, dict] = {}
+        self._dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._state = data
+        except Exception:
+            self._state = {}
+
+    @staticmethod
+    def _key(kind: str, mailbox: str) -> str:
+        return f"{kind}|{(mailbox or '').lower()}"
+
+    def record(self, kind: str, mailbox: str, seconds: float, rows: int):
+        with self._lock:
+            key = self._key(kind, mailbox)
+            prev = self._state.get(key) if isinstance(self._state.get(key), dict) else {}
+            if prev.get('seconds'):
+                seconds = 0.5 * float(prev['seconds']) + 0.5 * seconds
+            self._state[key] = {
+                'seconds': round(seconds, 2),
+                'rows': int(rows),
+                'runs': int(prev.get('runs', 0)) + 1,
+                'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            self._changes[key] = self._state[key]
+            self._dirty = True
+
+    def estimate(self, kind: str, mailbox: str) -> float | None:
+        """Expected duration in seconds, or None for a mailbox without history."""
+        with self._lock:
+            entry = self._state.get(self._key(kind, mailbox))
+        try:
+            return float(entry['seconds']) if isinstance(entry, dict) else None
+        except Exception:
+            return None
+
+    def export_changes(self) -> dict:
+        with self._lock:
+            return dict(self._changes)
+
+    def apply_changes(self, changes: dict):
+        with self._lock:
+            for key, entry in (changes or {}).items():
+                self._state[key] = entry
+                self._changes[key] = entry
+            self._dirty = self._dirty or bool(changes)
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty or not self.persist:
+                return
+            snapshot = json.dumps(self._state, ensure_ascii=False)
+            self._dirty = False
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.path)
+
+
+class _RowCountingWriter:
+    """csv.DictWriter proxy that counts report rows per mailbox (callers hold the csv lock)."""
+
+    def __init__(self, writer, counts: dict):
+        self._writer = writer
+        self._counts = counts
+
+    def writerow(self, row):
+        key = (row.get('SMTPAddress') or row.get('UserPrincipalName') or '').lower()
+        self._counts[key] = self._counts.get(key, 0) + 1
+        return self._writer.writerow(row)
+
+    def __getattr__(self, name):
+        return getattr(self._writer, name)
+
+
+def _parse_size_hint(value) -> float:
+    """Number in an ItemCount / TotalItemSize cell; "1.2 GB (1,288,490,189 bytes)" gives the bytes."""
+    text = str(value or '')
+    m = re.search(r'\(([\d,]+) bytes\)', text)
+    if not m:
+        m = re.search(r'(\d[\d,]*(?:\.\d+)?)', text)
+    try:
+        return float(m.group(1).replace(',', '')) if m else 0.0
+    except ValueError:
+        return 0.0
+
+
+class SeriesMasterCache:
+    """Bounded, thread-safe LRU of series-master recurrence details for one run.
+
+    Entries are keyed per mailbox by seriesMasterId and, when known, tenant-wide by the clean
+    GOID so that attendees of the same series reuse one lookup. `claim`/`release`/`wait` let
+    one worker fetch a series while the others wait for its result instead of fetching too.
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: dict[str, threading.Event] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return self.MISSING
+
+    def _put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_master(self, user: str, master_id: str):
+        return self._get(('m', (user or '').lower(), master_id))
+
+    def get_series(self, clean_goid: str):
+        return self._get(('s', clean_goid)) if clean_goid else self.MISSING
+
+    def put(self, user: str, master_id: str, recurrence, clean_goids=()):
+        self._put(('m', (user or '').lower(), master_id), recurrence)
+        for key in clean_goids:
+            if key:
+                self._put(('s', key), recurrence)
+
+    def claim(self, clean_goid: str) -> bool:
+        with self._lock:
+            if clean_goid in self._inflight:
+                return False
+            self._inflight[clean_goid] = threading.Event()
+            return True
+
+    def release(self, clean_goid: str):
+        with self._lock:
+            ev = self._inflight.pop(clean_goid, None)
+        if ev is not None:
+            ev.set()
+
+    def wait(self, clean_goid: str, timeout: float = 30.0):
+        with self._lock:
+            ev = self._inflight.get(clean_goid)
+        if ev is not None:
+            ev.wait(timeout)
+
+
+class AdaptiveConcurrencyController:
+    """AIMD concurrency limit for the mailbox workers of one Graph/EWS run.
+
+    The thread pool is sized at ``max_limit`` and every mailbox task holds one slot.
+    The limit grows by one after a full window of healthy requests and is halved when
+    the service pushes back (429/503 Retry-After, EWS ErrorServerBusy). Back-off hints
+    also pause new requests tenant-wide instead of letting each thread sleep on its own.
+    """
+
+    def __init__(self, initial: int = 10, min_limit: int = 2, max_limit: int = 32, latency_target: float = 8.0):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = min(max(int(initial), self.min_limit), self.max_limit)
+        self.latency_target = latency_target
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._pause_until = 0.0
+        self._healthy = 0
+        self._last_decrease = 0.0
+        self._window_requests = 0
+        self._window_throttled = 0
+        self._monitor_stop: threading.Event | None = None
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait(0.5)
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._cond.notify_all()
+
+    def run(self, fn, *args, **kwargs):
+        """Run one mailbox task while holding a concurrency slot."""
+        self.acquire()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.release()
+
+    def wait_if_paused(self):
+        while True:
+            with self._cond:
+                remaining = self._pause_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 1.0))
+
+    def record_success(self, latency: float | None = None):
+        with self._cond:
+            self._window_requests += 1
+            if latency is not None and latency > self.latency_target:
+                # Slow but successful: hold the current limit.
+                self._healthy = 0
+                return
+            self._healthy += 1
+            if self._healthy >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._healthy = 0
+                self._cond.notify_all()
+
+    def record_error(self):
+        with self._cond:
+            self._window_requests += 1
+            self._healthy = 0
+
+    def record_throttle(self, retry_after: float | None = None):
+        now = time.monotonic()
+        with self._cond:
+            self._window_requests += 1
+            self._window_throttled += 1
+            self._healthy = 0
+            # One decrease per back-off episode, otherwise a burst of 429s collapses the limit to min.
+            if now - self._last_decrease >= max(1.0, float(retry_after or 0)):
+                self.limit = max(self.min_limit, self.limit // 2)
+                self._last_decrease = now
+            if retry_after:
+                self._pause_until = max(self._pause_until, now + float(retry_after))
+
+    def snapshot(self, reset: bool = False) -> dict:
+        with self._cond:
+            snap = {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'requests': self._window_requests,
+                'throttled': self._window_throttled,
+                'paused': max(0.0, self._pause_until - time.monotonic()),
+            }
+            if reset:
+                self._window_requests = 0
+                self._window_throttled = 0
+        return snap
+
+    def start_monitor(self, log_fn, interval: float = 30.0):
+        """Periodically report current concurrency and throttle rate through log_fn."""
+        stop = threading.Event()
+        self._monitor_stop = stop
+
+        def _loop():
+            while not stop.wait(interval):
+                s = self.snapshot(reset=True)
+                rate = (s['throttled'] / s['requests']) if s['requests'] else 0.0
+                msg = (f"并发控制: 当前并发上限 {s['limit']} (运行中 {s['in_flight']}) | "
+                       f"近 {int(interval)}s 请求 {s['requests']}，限流 {s['throttled']} ({rate:.1%})")
+                if s['paused'] > 0:
+                    msg += f" | 全局退避剩余 {s['paused']:.1f}s"
+                log_fn(msg)
+
+        threading.Thread(target=_loop, daemon=True).start()
+
+    def stop_monitor(self):
+        if self._monitor_stop is not None:
+            self._monitor_stop.set()
+            self._monitor_stop = None
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = max(0.001, float(rate))
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+
+    def reserve(self, cost: float) -> float:
+        """Take `cost` tokens (allowing debt) and return how long the caller must wait."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= cost
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class GraphRateLimiter:
+    """Token-bucket limiter shared by every Graph call of the application.
+
+    Mirrors the Exchange Online limits for Graph: a per-app request rate, a per-mailbox
+    request rate (10,000 requests / 10 min) and a cap on concurrent requests per mailbox (4).
+    Waiting locally is far cheaper than being rejected with 429 and retried. Per-mailbox state
+    is kept for the most recently used `max_mailboxes` only; idle mailboxes beyond that are
+    evicted (their bucket has long refilled, so nothing is lost).
+    """
+
+    def __init__(self, app_rate: float = 500.0, mailbox_rate: float = 16.0, mailbox_concurrency: int = 4,
+                 max_mailboxes: int = 2048):
+        self.app_rate = float(app_rate)
+        self.mailbox_rate = float(mailbox_rate)
+        self.mailbox_concurrency = max(1, int(mailbox_concurrency))
+        self.max_mailboxes = max(1, int(max_mailboxes))
+        self._lock = threading.Lock()
+        self._app_bucket = _TokenBucket(self.app_rate, self.app_rate)
+        # key -> [bucket, semaphore, requests holding or waiting for a slot]
+        self._mailboxes: OrderedDict = OrderedDict()
+
+    def _mailbox_state(self, mailbox: str) -> list:
+        key = (mailbox or '').strip().lower()
+        state = self._mailboxes.get(key)
+        if state is None:
+            state = [_TokenBucket(self.mailbox_rate, self.mailbox_rate * 2),
+                     threading.BoundedSemaphore(self.mailbox_concurrency), 0]
+            self._mailboxes[key] = state
+            if len(self._mailboxes) > self.max_mailboxes:
+                for old_key in [k for k, s in self._mailboxes.items() if s[2] == 0 and k != key]:
+                    del self._mailboxes[old_key]
+                    if len(self._mailboxes) <= self.max_mailboxes:
+                        break
+        else:
+            self._mailboxes.move_to_end(key)
+        return state
+
+    @contextmanager
+    def slot(self, mailbox: str | None, cost: int = 1):
+        """Hold a per-mailbox concurrency slot and pay `cost` tokens (a $batch costs one per sub-request)."""
+        state = None
+        with self._lock:
+            wait = self._app_bucket.reserve(cost)
+            if mailbox:
+                state = self._mailbox_state(mailbox)
+                state[2] += 1
+                wait = max(wait, state[0].reserve(cost))
+        try:
+            if wait > 0:
+                time.sleep(wait)
+            if state is not None:
+                state[1].acquire()
+            try:
+                yield
+            finally:
+                if state is not None:
+                    state[1].release()
+        finally:
+            if state is not None:
+                with self._lock:
+                    state[2] -= 1
+
+    @staticmethod
+    def mailbox_from_url(url: str) -> str:
+        m = re.search(r"/users/([^/?]+)", url or "")
+        return m.group(1) if m else ""
+
+
+class GraphPageStream:
+    """Incrementally decode one Graph collection page from a streamed response.
+
+    Iterating yields the items of the top-level `value` array one at a time, so only the
+    current item (plus one network chunk) is held in memory. Other top-level members such as
+    @odata.nextLink / @odata.deltaLink are collected into `annotations` wherever they appear
+    in the document; they are complete once iteration has finished.
+    """
+
+    _WS = ' \t\r\n'
+
+    def __init__(self, resp, chunk_size: int = 65536):
+        self._resp = resp
+        self._chunks = resp.iter_content(chunk_size=chunk_size)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self.annotations: dict = {}
+        self.count = 0
+
+    def _read_more(self, want: int):
+        # keep only the unread tail, then append until `want` chars are buffered (or EOF)
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        while len(self._buf) < want and not self._eof:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._buf += self._decoder.decode(b'', final=True)
+                self._eof = True
+            elif chunk:
+                self._buf += self._decoder.decode(chunk)
+
+    def _peek(self) -> str | None:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in self._WS:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if self._eof:
+                return None
+            self._read_more(1)
+
+    def _decode_value(self):
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buf, self._pos)
+                # a number ending exactly at the buffer edge may continue in the next chunk
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # incomplete: at least double the buffered text before retrying, keeping large items linear
+            self._read_more(max(2 * (len(self._buf) - self._pos), 65536))
+
+    def _expect(self, ch: str):
+        if self._peek() != ch:
+            raise ValueError(f"Graph 响应不是预期的 JSON 结构 (缺少 '{ch}')")
+        self._pos += 1
+
+    def __iter__(self):
+        self._expect('{')
+        while True:
+            c = self._peek()
+            if c == ',':
+                self._pos += 1
+                continue
+            if c == '}':
+                self._pos += 1
+                return
+            if c is None:
+                raise ValueError("Graph 响应被截断")
+            key = self._decode_value()
+            self._expect(':')
+            if self._peek() == '[' and key == 'value':
+                self._pos += 1
+                while True:
+                    c = self._peek()
+                    if c == ',':
+                        self._pos += 1
+                        continue
+                    if c == ']':
+                        self._pos += 1
+                        break
+                    if c is None:
+                        raise ValueError("Graph 响应被截断")
+                    item = self._decode_value()
+                    self.count += 1
+                    yield item
+            else:
+                self.annotations[key] = self._decode_value()
+
+    def close(self):
+        try:
+            self._resp.close()
+        except Exception:
+            pass
+
+
+def _ews_backoff_seconds(exc) -> float | None:
+    """Return the server back-off hint (seconds) if exc is an EWS busy/throttling error."""
+    if exc is None:
+        return None
+    if type(exc).__name__ not in ("ErrorServerBusy", "ErrorTooManyObjectsOpened"):
+        return None
+    back_off = getattr(exc, 'back_off', None)
+    try:
+        return float(back_off) if back_off else 30.0
+    except Exception:
+        return 30.0
+
+
 def _dpapi_protect_text(plain_text: str) -> str | None:
     if sys.platform != 'win32':
         return None
@@ -173,6 +1290,8 @@ def _win32_force_window_icon(hwnd: int, ico_path: str) -> None:
         pass
 
 try:
+    if _HEADLESS_WORKER:
+        raise ImportError("PIL.ImageTk imports tkinter")
     from PIL import Image, ImageTk
 except Exception:
     Image = None
@@ -272,7 +1391,7 @@ def _add_combobox_tooltip(widget, var):
     widget.bind("<FocusOut>", _hide)
 
 
-class DateEntry(ttk.Frame):
+class DateEntry(ttk.Frame if ttk is not None else object):
     def __init__(self, master, textvariable, mode_var=None, other_date_var=None, **kwargs):
         super().__init__(master, **kwargs)
         self.variable = textvariable
@@ -469,10 +1588,24 @@ class DateEntry(ttk.Frame):
         top.destroy()
 
 
+# Fields the EWS meeting report reads; fetched in one GetItem per EWS_FETCH_CHUNK_SIZE items.
+EWS_MEETING_FETCH_FIELDS = (
+    'subject', 'organizer', 'required_attendees', 'optional_attendees', 'uid', 'start', 'end',
+    'is_cancelled', 'my_response_type', 'original_start', 'recurrence_id', 'recurrence',
+    'is_recurring', 'type', 'location',
+)
+EWS_FETCH_CHUNK_SIZE = 100
+# Fields of the plain calendar listing (all FindItem-readable). Recurrence is a GetItem-only field,
+# so the scope filter classifies items by their CalendarItemType (`type`) instead.
+EWS_MEETING_LIST_FIELDS = ('subject', 'start', 'is_cancelled', 'is_recurring', 'recurrence_id', 'original_start', 'type')
+# Fields of a recurring master used to classify its instances and describe the pattern.
+EWS_MASTER_INDEX_FIELDS = ('uid', 'recurrence', 'subject', 'location', 'required_attendees', 'optional_attendees')
+
+
 def guess_calendar_item_type(item):
     """Guess CalendarItemType with fallbacks when exchangelib mapping is missing."""
-    # 1) Prefer server-provided CalendarItemType
-    cit = getattr(item, "calendar_item_type", None)
+    # 1) Prefer server-provided CalendarItemType (exchangelib field `type`)
+    cit = getattr(item, "type", None) or getattr(item, "calendar_item_type", None)
     if cit:
         cit_str = getattr(cit, "value", None) or str(cit)
         for v in ("RecurringMaster", "Occurrence", "Exception", "Single"):
@@ -762,6 +1895,28 @@ def decode_graph_goid_base64_to_hex(goid_b64):
         return ""
 
 
+# Class id (16) + instance date (4) + creation time (8) + reserved (8) + data size (4) bytes, then data.
+_FULL_GOID_HEX_RE = re.compile(r"040000008200E00074C5B7101A82E008(?:[0-9A-Fa-f]{2}){24,}", re.IGNORECASE)
+
+
+def goid_matches(criteria_goid: str, goid: str, exact: bool = False) -> bool:
+    """GOID criterion check: case-insensitive substring, or whole-value equality when `exact`."""
+    needle = (criteria_goid or '').strip().lower()
+    value = str(goid or '').strip().lower()
+    return needle == value if exact else needle in value
+
+
+def clean_goid_from_goid_hex(goid_hex):
+    """PidLidCleanGlobalObjectId: the GOID with the instance-date bytes (16..19) zeroed.
+
+    All occurrences of a series and the master share it, in every attendee's calendar.
+    """
+    goid_hex = (goid_hex or "").upper()
+    if len(goid_hex) < 40:
+        return ""
+    return goid_hex[:32] + "00000000" + goid_hex[40:]
+
+
 def redact_sensitive_headers(headers, save_authorization=False):
     """Mask sensitive auth material before writing debug logs."""
     if not isinstance(headers, dict) or not headers:
@@ -806,6 +1961,180 @@ def format_graph_meeting_response_status(user_email, user_role, organizer_email,
     return ((item_response_status or {}).get("response") or "").strip()
 
 
+def split_calendar_view_windows(start: str, end: str, window_days: int) -> list[tuple[str, str]]:
+    """Split a calendarView range ('%Y-%m-%dT%H:%M:%SZ') into consecutive windows of `window_days`."""
+    fmt = "%Y-%m-%dT%H:%M:%SZ"
+    try:
+        cur = datetime.strptime(start, fmt)
+        stop = datetime.strptime(end, fmt)
+    except Exception:
+        return [(start, end)]
+    step = timedelta(days=max(1, int(window_days or 1)))
+    windows: list[tuple[str, str]] = []
+    while cur < stop:
+        nxt = min(cur + step, stop)
+        windows.append((cur.strftime(fmt), nxt.strftime(fmt)))
+        cur = nxt
+    return windows or [(start, end)]
+
+
+def bisect_received_slices(start: datetime, end: datetime, count_fn, max_items: int, total: int | None = None,
+                           max_slices: int = 64, min_span: timedelta = timedelta(hours=1)) -> list[tuple[datetime, datetime, int | None]]:
+    """Split [start, end) into receivedDateTime slices of roughly ``max_items`` messages at most.
+
+    ``count_fn(lo, hi)`` returns the number of matching messages in [lo, hi) or None if unknown.
+    The fullest slice is halved first, so a mailbox with years of little mail and one busy
+    month gets narrow slices only where the mail is. The right half's count is derived from
+    the parent (one probe per split). Callers should leave the outer slices open-ended.
+    """
+    if total is None:
+        total = count_fn(start, end)
+    slices: list[tuple[datetime, datetime, int | None]] = [(start, end, total)]
+    while len(slices) < max_slices:
+        splittable = [i for i, (lo, hi, n) in enumerate(slices) if n is not None and n > max_items and hi - lo > min_span]
+        if not splittable:
+            break
+        i = max(splittable, key=lambda k: slices[k][2])
+        lo, hi, n = slices[i]
+        mid = (lo + (hi - lo) / 2).replace(microsecond=0)
+        left = count_fn(lo, mid)
+        right = max(0, n - left) if left is not None else None
+        slices[i:i + 1] = [(lo, mid, left), (mid, hi, right)]
+    return slices
+
+
+def _odata_quote(value) -> str:
+    return str(value).replace("'", "''")
+
+
+_FULL_ADDRESS_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+
+class GraphQueryPlan:
+    """Server-side $filter chosen for a Graph run, plus the checks left to the client.
+
+    Clauses marked risky are accepted by some endpoints/tenants only. If the server answers
+    400, the plan drops them for every mailbox of the run and the client-side checks (which
+    always run) cover them instead.
+    """
+
+    def __init__(self, target_type: str, resource: str):
+        self.target_type = target_type
+        self.resource = resource
+        self.clauses: list[tuple[str, float, bool, str]] = []  # (expr, selectivity, risky, label)
+        self.client_only: list[str] = []
+        self._risky_rejected = False
+        self._lock = threading.Lock()
+
+    def add(self, expr: str, selectivity: float, label: str, risky: bool = False):
+        self.clauses.append((expr, selectivity, risky, label))
+
+    def safe_filter(self) -> str:
+        return " and ".join(c[0] for c in self.clauses if not c[2])
+
+    def current_filter(self) -> str:
+        with self._lock:
+            rejected = self._risky_rejected
+        return " and ".join(c[0] for c in self.clauses if not (c[2] and rejected))
+
+    def fallback_after_reject(self, attempted_filter: str) -> bool:
+        """Called on a 400 for `attempted_filter`; True if a narrower plan is available to retry with."""
+        with self._lock:
+            if (attempted_filter or '') == self.safe_filter():
+                return False
+            self._risky_rejected = True
+            return True
+
+    def selectivity(self) -> float:
+        with self._lock:
+            rejected = self._risky_rejected
+        est = 1.0
+        for _expr, sel, risky, _label in self.clauses:
+            if not (risky and rejected):
+                est *= sel
+        return est
+
+    def describe(self) -> str:
+        with self._lock:
+            rejected = self._risky_rejected
+        server = [f"{label}{'(?)' if risky else ''}" for _expr, _sel, risky, label in self.clauses if not (risky and rejected)]
+        client = list(self.client_only) + [label for _expr, _sel, risky, label in self.clauses if risky and rejected]
+        return (f"服务器端: [{', '.join(server) or '无'}] | 客户端: [{', '.join(client) or '无'}] | "
+                f"估计选择性≈{self.selectivity() * 100:.3g}% | $filter={self.current_filter() or '(无)'}")
+
+
+def build_graph_query_plan(target_type: str, resource: str, criteria: dict, meeting_scope: str = "") -> GraphQueryPlan:
+    """Turn cleanup-tab criteria into the most selective $filter the endpoint accepts.
+
+    Selectivity values are rough guesses used only to order and log the plan.
+    """
+    plan = GraphQueryPlan(target_type, resource)
+    subject = (criteria.get('subject') or '').strip()
+    sender = (criteria.get('sender') or '').strip()
+    start_date = (criteria.get('start_date') or '').strip().replace('/', '-')
+    end_date = (criteria.get('end_date') or '').strip().replace('/', '-')
+    recipient = (criteria.get('recipient') or '').strip()
+    attendee = (criteria.get('attendee') or '').strip()
+    goid = (criteria.get('goid') or '').strip()
+
+    if target_type == "Email":
+        if criteria.get('msg_id'):
+            plan.add(f"internetMessageId eq '{_odata_quote(criteria['msg_id'])}'", 0.0001, "internetMessageId")
+        if sender:
+            plan.add(f"from/emailAddress/address eq '{_odata_quote(sender)}'", 0.05, "from")
+        if subject:
+            plan.add(f"contains(subject, '{_odata_quote(subject)}')", 0.1, "subject")
+        if criteria.get('has_attachments'):
+            plan.add("hasAttachments eq true", 0.3, "hasAttachments")
+        if start_date:
+            plan.add(f"receivedDateTime ge {start_date}T00:00:00Z", 0.5, "receivedDateTime>=")
+        if end_date:
+            plan.add(f"receivedDateTime le {end_date}T23:59:59Z", 0.5, "receivedDateTime<=")
+        # Only a full address can be pushed down (server eq vs. client substring match).
+        if recipient and _FULL_ADDRESS_RE.fullmatch(recipient):
+            plan.add(f"toRecipients/any(r: r/emailAddress/address eq '{_odata_quote(recipient)}')", 0.05, "toRecipients", risky=True)
+        elif recipient:
+            plan.client_only.append("toRecipients(contains)")
+        if criteria.get('body'):
+            plan.client_only.append("body" if not criteria.get('body_search') else "body($search)")
+        return plan
+
+    # Meeting
+    if resource == "events":
+        if start_date:
+            plan.add(f"start/dateTime ge '{start_date}T00:00:00'", 0.5, "start>=")
+        if end_date:
+            plan.add(f"end/dateTime le '{end_date}T23:59:59'", 0.5, "end<=")
+        if "Single" in meeting_scope:
+            plan.add("type eq 'singleInstance'", 0.6, "type")
+        elif "Series" in meeting_scope:
+            plan.add("type eq 'seriesMaster'", 0.2, "type")
+    elif meeting_scope and "All" not in meeting_scope:
+        # calendarView rejects $filter on type
+        plan.client_only.append("type")
+
+    # events/calendarView often reject these combined with other clauses; try once, then fall back.
+    # iCalUId eq is an exact match, so it is only pushed down when the user asked for one and
+    # the value is a complete GOID; a substring search stays client-side.
+    if goid and criteria.get('goid_exact') and _FULL_GOID_HEX_RE.fullmatch(goid):
+        plan.add(f"iCalUId eq '{_odata_quote(goid)}'", 0.001, "iCalUId", risky=True)
+    elif goid:
+        plan.client_only.append("GOID(==)" if criteria.get('goid_exact') else "GOID(contains)")
+    if sender:
+        plan.add(f"organizer/emailAddress/address eq '{_odata_quote(sender)}'", 0.05, "organizer", risky=True)
+    if criteria.get('only_cancelled'):
+        plan.add("isCancelled eq true", 0.05, "isCancelled", risky=True)
+    if subject:
+        plan.add(f"contains(subject, '{_odata_quote(subject)}')", 0.1, "subject", risky=True)
+    if attendee and _FULL_ADDRESS_RE.fullmatch(attendee):
+        plan.add(f"attendees/any(a: a/emailAddress/address eq '{_odata_quote(attendee)}')", 0.1, "attendees", risky=True)
+    elif attendee:
+        plan.client_only.append("attendees(contains)")
+    if criteria.get('clean_goid'):
+        plan.client_only.append("CleanGOID")
+    return plan
+
+
 class Logger:
     def __init__(self, log_area, log_dir):
         self.log_area = log_area
@@ -893,7 +2222,283 @@ class Logger:
         except Exception:
             pass
 
-class EwsTraceAdapter(NoVerifyHTTPAdapter):
+class _ShardLogger(Logger):
+    """Logger of a process-pool worker: lines go to the parent, which owns the GUI and log files."""
+
+    def __init__(self, index: int, msg_queue, level: str):
+        super().__init__(None, "")
+        self.index = index
+        self.level = level
+        self._queue = msg_queue
+
+    def log(self, message, level="INFO", is_advanced=False):
+        if is_advanced and self._level_rank(self.level) < self._level_rank("ADVANCED"):
+            return
+        self._queue.put(('log', self.index, message, level, is_advanced))
+
+    def log_to_file_only(self, message, min_level="ADVANCED"):
+        if self._level_rank(self.level) < self._level_rank(min_level):
+            return
+        self._queue.put(('file', self.index, message, min_level, None))
+
+
+class _PlainVar:
+    """Stand-in for a Tk variable in headless worker processes."""
+
+    def __init__(self, value=None):
+        self._value = value
+
+    def get(self):
+        return self._value
+
+    def set(self, value):
+        self._value = value
+
+
+class _HeadlessRoot:
+    """Swallows the Tk scheduling calls that shared code paths make in worker processes."""
+
+    def after(self, *args, **kwargs):
+        return None
+
+
+def _shard_worker_main(context: dict, msg_queue):
+    """Entry point of a process-pool worker: runs one shard of the mailboxes without Tk."""
+    try:
+        app = UniversalEmailCleanerApp._new_shard_worker(context, msg_queue)
+        if context['kind'] == "Graph":
+            app.run_graph_cleanup()
+        else:
+            app.run_ews_cleanup()
+    except Exception as e:
+        msg_queue.put(('log', context['index'], f"X 进程异常: {e}", "ERROR", False))
+    finally:
+        msg_queue.put(('done', context['index'], None, None, None))
+
+
+class _LeaseWorkerSink:
+    """Message sink of a lease worker node (stands in for the process-pool queue).
+
+    Log lines go to the console and to a per-node log file in the shared directory; delta
+    and folder-index changes are kept in node-local stores that are written after each chunk.
+    """
+
+    def __init__(self, node: str, log_path: str, state_dir: str):
+        self.node = node
+        self._lock = threading.Lock()
+        self._file = open(log_path, 'a', encoding='utf-8')
+        self._stores = {
+            '_graph_delta_store': GraphDeltaStateStore(os.path.join(state_dir, "graph_delta_state.json")),
+            '_graph_folder_index_cache': GraphFolderIndexCache(os.path.join(state_dir, "graph_folder_index.json")),
+        }
+
+    def line(self, message: str, level: str = "INFO"):
+        text = f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [{level}] [{self.node}] {message}"
+        with self._lock:
+            print(text, flush=True)
+            self._file.write(text + "\n")
+            self._file.flush()
+
+    def put(self, msg):
+        what, _index, a, b, _c = msg
+        if what in ('log', 'file'):
+            self.line(a, b)
+        elif what == 'state':
+            for attr, changes in (a or {}).items():
+                if attr in self._stores:
+                    self._stores[attr].apply_changes(changes)
+
+    def flush_state(self):
+        for store in self._stores.values():
+            try:
+                store.flush()
+            except Exception as e:
+                self.line(f"保存增量状态失败: {e}", "ERROR")
+
+    def close(self):
+        self.flush_state()
+        with self._lock:
+            self._file.close()
+
+
+def _drop_report_rows(report_path: str, mailboxes: list[str]):
+    """Remove the rows of `mailboxes` (SMTPAddress column) from a CSV report in place."""
+    if not os.path.exists(report_path):
+        return
+    drop = {m.strip().lower() for m in mailboxes}
+    tmp_path = report_path + ".tmp"
+    with open(report_path, 'r', encoding='utf-8-sig', newline='') as src, \
+            open(tmp_path, 'w', encoding='utf-8-sig', newline='') as dst:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dst, fieldnames=reader.fieldnames or [])
+        if reader.fieldnames:
+            writer.writeheader()
+        for row in reader:
+            if (row.get('SMTPAddress') or '').strip().lower() not in drop:
+                writer.writerow(row)
+    os.replace(tmp_path, report_path)
+
+
+def run_lease_worker(lease_dir: str, node: str | None = None, chunk_size: int | None = None,
+                     secrets: dict | None = None) -> int:
+    """Worker node loop: lease mailboxes of the running job in ``lease_dir`` until none are left.
+
+    Each chunk runs through the normal per-mailbox thread pool and writes its own partial
+    report (``reports/<node>_*.part``, renamed to ``.csv`` once complete) for the coordinator
+    to merge. Credentials come from ``secrets`` (local workers) or the UEC_* environment
+    variables, never from the shared store. Returns a process exit code.
+    """
+    node = node or f"{socket.gethostname()}-{os.getpid()}"
+    store = MailboxLeaseStore(os.path.join(lease_dir, LEASE_DB_NAME))
+    state_dir = os.path.join(os.path.expanduser("~"), "Documents", "UniversalEmailCleaner")
+    os.makedirs(state_dir, exist_ok=True)
+    os.makedirs(os.path.join(lease_dir, "logs"), exist_ok=True)
+    os.makedirs(os.path.join(lease_dir, "reports"), exist_ok=True)
+    sink = _LeaseWorkerSink(node, os.path.join(lease_dir, "logs", f"{node}.log"), state_dir)
+    stop = threading.Event()
+    try:
+        job = store.find_job()
+        if not job:
+            sink.line("没有进行中的分布式任务。", "ERROR")
+            return 1
+        job_id = job['job_id']
+        lease_cfg = job['settings'].get('lease', {})
+        lease_seconds = float(lease_cfg.get('lease_seconds', 300))
+        chunk_size = max(1, int(chunk_size or lease_cfg.get('chunk_size', 20)))
+        context = dict(job['settings'], index=node, kind=job['kind'], users=[], report_path='', journal_run='')
+        app = UniversalEmailCleanerApp._new_shard_worker(context, sink)
+        app._apply_lease_node_settings(secrets, state_dir)
+        sink.line(f"加入分布式任务 {job_id} ({job['kind']})，每次租用 {chunk_size} 个邮箱，租约 {int(lease_seconds)} 秒")
+
+        def _heartbeat():
+            while not stop.wait(max(5.0, lease_seconds / 5)):
+                try:
+                    store.heartbeat(job_id, node, lease_seconds)
+                except Exception as e:
+                    sink.line(f"心跳失败: {e}", "ERROR")
+        threading.Thread(target=_heartbeat, name="uec-lease-heartbeat", daemon=True).start()
+
+        run_tag = uuid.uuid4().hex[:6]
+        seq = 0
+        while store.job_status(job_id) == 'running':
+            batch = store.lease(job_id, node, chunk_size, lease_seconds)
+            if not batch:
+                counts = store.counts(job_id)
+                if not counts.get('pending') and not counts.get('leased'):
+                    break
+                # the rest is leased by other nodes; pick it up if their leases expire
+                stop.wait(min(5.0, max(1.0, lease_seconds / 10)))
+                continue
+            part_path = os.path.join(lease_dir, "reports", f"{node}_{run_tag}_{seq:04d}.part")
+            seq += 1
+            context['users'] = batch
+            context['report_path'] = part_path
+            app._lease_results = {}
+            if job['kind'] == "Graph":
+                app.run_graph_cleanup()
+            else:
+                app.run_ews_cleanup()
+            results = dict(app._lease_results)
+            accepted = store.complete(job_id, node, {m: results[m][0] for m in batch if m in results},
+                                      {m: results[m][1:] for m in batch if m in results})
+            lost = [m for m in batch if m in results and m not in accepted]
+            if lost:
+                # the lease expired and another node took these over; its report is the one that counts
+                sink.line(f"{len(lost)} 个邮箱的租约已被其他节点接管，丢弃本节点的结果: {', '.join(lost[:10])}", "ERROR")
+                _drop_report_rows(part_path, lost)
+            if os.path.exists(part_path):
+                os.replace(part_path, part_path[:-len(".part")] + ".csv")
+            unprocessed = [m for m in batch if m not in results]
+            if unprocessed:
+                store.release(job_id, node, unprocessed)
+            sink.flush_state()
+            if not results:
+                # nothing ran (authentication or setup failed): leave the mailboxes to healthy nodes
+                sink.line("本批次未处理任何邮箱，节点退出。", "ERROR")
+                return 1
+        sink.line("没有待处理的邮箱，节点退出。")
+        return 0
+    except Exception as e:
+        sink.line(f"X 节点异常: {e}", "ERROR")
+        return 1
+    finally:
+        stop.set()
+        store.close()
+        sink.close()
+
+
+def _lease_worker_process(lease_dir: str, node: str, secrets: dict):
+    """multiprocessing entry of a local lease worker started by the coordinator."""
+    sys.exit(run_lease_worker(lease_dir, node=node, secrets=secrets))
+
+
+def _lease_worker_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Universal Email Cleaner - 分布式工作节点")
+    parser.add_argument("--lease-worker", metavar="DIR", required=True, help="协调端创建任务的共享目录")
+    parser.add_argument("--node", help="节点名 (默认: 主机名-进程号)")
+    parser.add_argument("--chunk", type=int, help="每次租用的邮箱数 (默认使用任务设置)")
+    args = parser.parse_args(argv)
+    if _HAS_LICENSE:
+        license_status = check_license()
+        if not license_status['licensed']:
+            print(f"许可证无效，无法启动工作节点: {license_status.get('error') or '未激活'}", file=sys.stderr)
+            return 2
+    return run_lease_worker(args.lease_worker, node=args.node, chunk_size=args.chunk)
+
+
+_EWS_BACKOFF_RE = re.compile(rb"BackOffMilliseconds[^0-9]{0,40}?(\d+)")
+
+
+def _ews_response_backoff(response) -> float | None:
+    """Back-off hint (seconds) of a throttled EWS HTTP response, or None if it was not throttled."""
+    status = getattr(response, 'status_code', 0)
+    if status in (429, 503):
+        try:
+            return float(response.headers.get('Retry-After') or 0) or None
+        except (TypeError, ValueError):
+            return None
+    if status == 500:
+        try:
+            content = response.content or b''
+        except Exception:
+            return None
+        if b'ErrorServerBusy' in content:
+            m = _EWS_BACKOFF_RE.search(content)
+            return int(m.group(1)) / 1000.0 if m else 30.0
+    return None
+
+
+class EwsControlledAdapter(NoVerifyHTTPAdapter):
+    """Feeds every EWS HTTP request of a run into its AdaptiveConcurrencyController.
+
+    exchangelib sends the SOAP calls itself, so this is where requests wait out a tenant-wide
+    pause, successes let the limit grow and ErrorServerBusy/429/503 halve it.
+    """
+    controller = None
+
+    def send(self, request, *args, **kwargs):
+        ctl = EwsControlledAdapter.controller
+        if ctl is not None:
+            ctl.wait_if_paused()
+        t0 = time.monotonic()
+        response = super().send(request, *args, **kwargs)
+        if ctl is not None:
+            back_off = _ews_response_backoff(response)
+            if back_off is not None or response.status_code in (429, 503):
+                ctl.record_throttle(back_off)
+            elif 200 <= response.status_code < 300:
+                ctl.record_success(time.monotonic() - t0)
+            elif response.status_code >= 500:
+                ctl.record_error()
+        return response
+
+
+if not EXCHANGELIB_ERROR:
+    # Sessions outlive runs in exchangelib's protocol cache, so every one is created controllable.
+    BaseProtocol.HTTP_ADAPTER_CLS = EwsControlledAdapter
+
+
+class EwsTraceAdapter(EwsControlledAdapter):
     logger = None
     log_responses = True  # Default to True, can be disabled for "Advanced" mode
     response_log_path = None
@@ -1112,6 +2717,13 @@ class UniversalEmailCleanerApp:
         self.tenant_id_var = tk.StringVar()
         self.thumbprint_var = tk.StringVar()
         self.client_secret_var = tk.StringVar()
+        # Optional PFX/PEM file for in-process certificate signing (non-Windows or explicit file)
+        self.cert_file_var = tk.StringVar()
+        self.cert_password_var = tk.StringVar()
+        self._cert_password_protected_cache = ""
+        self._cert_signer_cache = {}
+        self._cert_signer_lock = threading.Lock()
+        self._ews_token_managers = {}
         self.graph_env_var = tk.StringVar(value="Global")
         self.graph_token_var = tk.StringVar()
         self.graph_cache_token_var = tk.BooleanVar(value=True)
@@ -1141,16 +2753,37 @@ class UniversalEmailCleanerApp:
         # Soft delete: move items to Deleted Items (best-effort).
         # Default OFF to preserve existing behavior.
         self.soft_delete_var = tk.BooleanVar(value=False)
+        # Incremental Graph scan: reuse messages/delta links saved by the previous run.
+        self.graph_incremental_var = tk.BooleanVar(value=False)
+        # Schedule mailboxes longest-first from the durations of earlier runs.
+        self.longest_first_var = tk.BooleanVar(value=True)
+        # Upper bound for the adaptive (AIMD) mailbox worker pool.
+        self.max_concurrency_var = tk.IntVar(value=32)
+        # Shared Graph rate limits (Exchange Online: 10,000 req / 10 min and 4 concurrent req per mailbox).
+        self.graph_app_rate_var = tk.IntVar(value=500)
+        self.graph_mailbox_rate_var = tk.IntVar(value=16)
+        self.graph_mailbox_concurrency_var = tk.IntVar(value=4)
+        self.graph_batch_concurrency_var = tk.IntVar(value=3)
+        self.calendar_window_days_var = tk.IntVar(value=30)
+        # Process-pool mode: >1 splits the target list across headless worker processes.
+        self.process_workers_var = tk.IntVar(value=1)
+        # Email folders with more matching items than this are scanned as parallel date slices (0 = off).
+        self.slice_threshold_var = tk.IntVar(value=20000)
+        # Multi-node mode: shared directory holding the lease store and the per-node reports.
+        self.lease_dir_var = tk.StringVar()
+        self._graph_rate_limiter_lock = threading.Lock()
         # self.log_level_var is already defined in menu setup
         
         # Cleanup Target
         self.cleanup_target_var = tk.StringVar(value="Email") # Email or Meeting
         self.meeting_scope_var = tk.StringVar(value="All") # All, Single, Series
         self.meeting_only_cancelled_var = tk.BooleanVar(value=False)
+        self.meeting_send_cancellations_var = tk.BooleanVar(value=False)
 
         # Criteria
         self.criteria_msg_id = tk.StringVar()
         self.criteria_goid = tk.StringVar()
+        self.criteria_goid_exact = tk.BooleanVar(value=False)
         self.criteria_clean_goid = tk.StringVar()
         self.criteria_subject = tk.StringVar()
         self.criteria_sender = tk.StringVar()
@@ -1540,6 +3173,13 @@ class UniversalEmailCleanerApp:
     def log(self, msg, level="INFO", is_advanced=False):
         self.logger.log(msg, level, is_advanced)
 
+    def _show_message(self, kind: str, title: str, body: str):
+        """Pop up a messagebox ("info"/"error"); replaced by a no-op in worker processes."""
+        if kind == "error":
+            messagebox.showerror(title, body)
+        else:
+            messagebox.showinfo(title, body)
+
     def update_report_link(self, path):
         self._last_report_path = path
         def _update():
@@ -1718,8 +3358,16 @@ class UniversalEmailCleanerApp:
         ttk.Button(btns, text="关闭", command=about.destroy).pack(side="right")
 
     # --- Config Management ---
-    def load_config(self):
-        if os.path.exists(self.config_file_path):
+    @staticmethod
+    def _safe_int_var(var, default: int) -> int:
+        """Read an IntVar bound to a Spinbox; free-typed text makes .get() raise."""
+        try:
+            return int(var.get())
+        except Exception:
+            return default
+
+    def load_config(self):
+        if os.path.exists(self.config_file_path):
             try:
                 with open(self.config_file_path, 'r', encoding='utf-8') as f:
                     config = json.load(f)
@@ -1729,6 +3377,11 @@ class UniversalEmailCleanerApp:
                     self.tenant_id_var.set(config.get('tenant_id', ''))
                     self.thumbprint_var.set(config.get('thumbprint', ''))
                     self.client_secret_var.set(config.get('client_secret', ''))
+                    try:
+                        self.cert_file_var.set(config.get('cert_file', '') or '')
+                        self._cert_password_protected_cache = config.get('cert_password_protected', '') or ''
+                    except Exception:
+                        pass
                     self.graph_env_var.set(config.get('graph_env', 'Global'))
                     try:
                         self.graph_cache_token_var.set(bool(config.get('graph_cache_token', True)))
@@ -1765,6 +3418,7 @@ class UniversalEmailCleanerApp:
                     try:
                         self.criteria_msg_id.set(config.get('criteria_msg_id', ''))
                         self.criteria_goid.set(config.get('criteria_goid', ''))
+                        self.criteria_goid_exact.set(bool(config.get('criteria_goid_exact', False)))
                         self.criteria_clean_goid.set(config.get('criteria_clean_goid', ''))
                         self.criteria_subject.set(config.get('criteria_subject', ''))
                         self.criteria_sender.set(config.get('criteria_sender', ''))
@@ -1777,6 +3431,7 @@ class UniversalEmailCleanerApp:
                         self.cleanup_target_var.set(config.get('cleanup_target', 'Email'))
                         self.meeting_scope_var.set(config.get('meeting_scope', 'All'))
                         self.meeting_only_cancelled_var.set(bool(config.get('meeting_only_cancelled', False)))
+                        self.meeting_send_cancellations_var.set(bool(config.get('meeting_send_cancellations', False)))
                     except Exception:
                         pass
                     try:
@@ -1818,6 +3473,26 @@ class UniversalEmailCleanerApp:
                             self.soft_delete_var.set(False)
                     except Exception:
                         pass
+                    try:
+                        self.graph_incremental_var.set(bool(config.get('graph_incremental', False)))
+                    except Exception:
+                        pass
+                    try:
+                        self.longest_first_var.set(bool(config.get('longest_first', True)))
+                    except Exception:
+                        pass
+                    try:
+                        self.max_concurrency_var.set(int(config.get('max_concurrency', 32)))
+                        self.graph_app_rate_var.set(int(config.get('graph_app_rate', 500)))
+                        self.graph_mailbox_rate_var.set(int(config.get('graph_mailbox_rate', 16)))
+                        self.graph_mailbox_concurrency_var.set(int(config.get('graph_mailbox_concurrency', 4)))
+                        self.graph_batch_concurrency_var.set(int(config.get('graph_batch_concurrency', 3)))
+                        self.calendar_window_days_var.set(int(config.get('calendar_window_days', 30)))
+                        self.process_workers_var.set(int(config.get('process_workers', 1)))
+                        self.slice_threshold_var.set(int(config.get('slice_threshold', 20000)))
+                    except Exception:
+                        pass
+                    self.lease_dir_var.set(config.get('lease_dir', '') or '')
                     self.log(">>> 配置已加载。")
             except Exception as e:
                 self.log(f"X 加载配置失败: {e}", "ERROR")
@@ -1872,12 +3547,20 @@ class UniversalEmailCleanerApp:
                 if protected:
                     self._ews_token_protected_cache = protected
 
+        cert_password_ui = self.cert_password_var.get() or ''
+        if cert_password_ui:
+            protected = _dpapi_protect_text(cert_password_ui)
+            if protected:
+                self._cert_password_protected_cache = protected
+
         config = {
             'graph_auth_mode': self.graph_auth_mode_var.get(),
             'app_id': self.app_id_var.get(),
             'tenant_id': self.tenant_id_var.get(),
             'thumbprint': self.thumbprint_var.get(),
             'client_secret': self.client_secret_var.get(),
+            'cert_file': self.cert_file_var.get(),
+            'cert_password_protected': self._cert_password_protected_cache,
             'graph_env': self.graph_env_var.get(),
             'graph_cache_token': bool(self.graph_cache_token_var.get()),
             'graph_token_protected': self._graph_token_protected_cache,
@@ -1896,6 +3579,7 @@ class UniversalEmailCleanerApp:
             'target_single_email': self.target_single_email_var.get(),
             'criteria_msg_id': self.criteria_msg_id.get(),
             'criteria_goid': self.criteria_goid.get(),
+            'criteria_goid_exact': bool(self.criteria_goid_exact.get()),
             'criteria_clean_goid': self.criteria_clean_goid.get(),
             'criteria_subject': self.criteria_subject.get(),
             'criteria_sender': self.criteria_sender.get(),
@@ -1908,12 +3592,24 @@ class UniversalEmailCleanerApp:
             'cleanup_target': self.cleanup_target_var.get(),
             'meeting_scope': self.meeting_scope_var.get(),
             'meeting_only_cancelled': bool(self.meeting_only_cancelled_var.get()),
+            'meeting_send_cancellations': bool(self.meeting_send_cancellations_var.get()),
             'mail_folder_scope': '',
             'folder_selections': {k: bool(v.get()) for k, v in self._folder_selections.items()},
             'search_detail': self.search_detail_var.get(),
             'result_field_selections': {k: bool(v.get()) for k, v in self._result_field_selections.items()},
             'permanent_delete': bool(self.permanent_delete_var.get()),
             'soft_delete': bool(self.soft_delete_var.get()),
+            'graph_incremental': bool(self.graph_incremental_var.get()),
+            'longest_first': bool(self.longest_first_var.get()),
+            'max_concurrency': self._safe_int_var(self.max_concurrency_var, 32),
+            'graph_app_rate': self._safe_int_var(self.graph_app_rate_var, 500),
+            'graph_mailbox_rate': self._safe_int_var(self.graph_mailbox_rate_var, 16),
+            'graph_mailbox_concurrency': self._safe_int_var(self.graph_mailbox_concurrency_var, 4),
+            'graph_batch_concurrency': self._safe_int_var(self.graph_batch_concurrency_var, 3),
+            'calendar_window_days': self._safe_int_var(self.calendar_window_days_var, 30),
+            'process_workers': self._safe_int_var(self.process_workers_var, 1),
+            'slice_threshold': self._safe_int_var(self.slice_threshold_var, 20000),
+            'lease_dir': self.lease_dir_var.get(),
         }
         try:
             with open(self.config_file_path, 'w', encoding='utf-8') as f:
@@ -2066,8 +3762,28 @@ class UniversalEmailCleanerApp:
         self.graph_auto_frame = ttk.Frame(self.graph_frame)
         # Note: We don't pack it here, toggle_graph_ui will handle it
         
-        ttk.Button(self.graph_auto_frame, text="一键初始化 (创建 App & 证书)", command=self.start_graph_setup_thread).pack(side="left", padx=0)
-        ttk.Button(self.graph_auto_frame, text="删除 App", command=self.start_delete_app_thread).pack(side="left", padx=5)
+        auto_btn_row = ttk.Frame(self.graph_auto_frame)
+        auto_btn_row.pack(anchor="w", fill="x")
+        ttk.Button(auto_btn_row, text="一键初始化 (创建 App & 证书)", command=self.start_graph_setup_thread).pack(side="left", padx=0)
+        ttk.Button(auto_btn_row, text="删除 App", command=self.start_delete_app_thread).pack(side="left", padx=5)
+
+        cert_row = ttk.Frame(self.graph_auto_frame)
+        cert_row.pack(anchor="w", fill="x", pady=(5, 0))
+        ttk.Label(cert_row, text="证书文件 (PFX/PEM，可选):").pack(side="left")
+        ttk.Entry(cert_row, textvariable=self.cert_file_var, width=40).pack(side="left", padx=5)
+        ttk.Button(
+            cert_row,
+            text="浏览...",
+            command=lambda: self.cert_file_var.set(
+                filedialog.askopenfilename(filetypes=[("Certificate", "*.pfx *.p12 *.pem"), ("All", "*.*")]) or self.cert_file_var.get()
+            ),
+        ).pack(side="left")
+        ttk.Label(cert_row, text="密码:").pack(side="left", padx=(10, 0))
+        ttk.Entry(cert_row, textvariable=self.cert_password_var, width=16, show="*").pack(side="left", padx=5)
+        ttk.Label(
+            self.graph_auto_frame,
+            text="提示：留空则使用 Windows 证书存储中的指纹证书；填写证书文件后可在非 Windows 环境使用。密码也可通过环境变量 UEC_CERT_PASSWORD 提供。",
+        ).pack(anchor="w", pady=(2, 0))
 
         # Graph Manual Frame
         self.graph_manual_frame = ttk.Frame(self.graph_frame)
@@ -2374,27 +4090,40 @@ class UniversalEmailCleanerApp:
             
         return date_str # Return original if parse fails
 
-    def _get_ews_access_token_oauth2(self):
-        """Obtain an EWS access token via OAuth2 Client Credentials flow."""
+    def _get_ews_oauth2_token_manager(self) -> AccessTokenManager:
+        """Token manager for the EWS client-credentials flow, shared per (tenant, app, secret)."""
         app_id = self.ews_oauth_app_id_var.get().strip()
         tenant_id = self.ews_oauth_tenant_id_var.get().strip()
         secret = self.ews_oauth_secret_var.get().strip()
         if not app_id or not tenant_id or not secret:
             raise Exception("OAuth2 模式需要 Application ID, Tenant ID 和 Client Secret。")
-        token_url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
-        data = {
-            "grant_type": "client_credentials",
-            "client_id": app_id,
-            "client_secret": secret,
-            "scope": "https://outlook.office365.com/.default",
-        }
-        resp = requests.post(token_url, data=data)
-        if resp.status_code != 200:
-            raise Exception(f"OAuth2 token 获取失败: {resp.status_code} {resp.text}")
-        token = resp.json().get("access_token")
-        if not token:
-            raise Exception("OAuth2 返回中缺少 access_token")
-        return token
+        key = (tenant_id.lower(), app_id.lower(), hashlib.sha256(secret.encode('utf-8')).hexdigest())
+        mgr = self._ews_token_managers.get(key)
+        if mgr is not None:
+            return mgr
+
+        def _fetch():
+            token_url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
+            data = {
+                "grant_type": "client_credentials",
+                "client_id": app_id,
+                "client_secret": secret,
+                "scope": "https://outlook.office365.com/.default",
+            }
+            resp = _get_pooled_session().post(token_url, data=data, timeout=30)
+            if resp.status_code != 200:
+                raise Exception(f"OAuth2 token 获取失败: {resp.status_code} {resp.text}")
+            payload = resp.json()
+            if not payload.get("access_token"):
+                raise Exception("OAuth2 返回中缺少 access_token")
+            return payload.get("access_token"), payload.get("expires_in")
+
+        mgr = self._ews_token_managers.setdefault(key, AccessTokenManager(_fetch))
+        return mgr
+
+    def _get_ews_access_token_oauth2(self):
+        """Obtain an EWS access token via OAuth2 Client Credentials flow (cached until near expiry)."""
+        return self._get_ews_oauth2_token_manager().get()
 
     def _get_ews_credentials(self):
         """Return (credentials_or_None, access_token_or_None) based on current EWS auth method."""
@@ -2570,6 +4299,7 @@ class UniversalEmailCleanerApp:
         self.meeting_scope_cb.pack(side="left", padx=5)
         
         ttk.Checkbutton(self.meeting_opt_frame, text="仅处理已取消 (IsCancelled Only)", variable=self.meeting_only_cancelled_var).pack(side="left", padx=15)
+        ttk.Checkbutton(self.meeting_opt_frame, text="删除时发送取消通知 (EWS)", variable=self.meeting_send_cancellations_var).pack(side="left", padx=5)
 
         # Criteria
         self.filter_frame = ttk.LabelFrame(frame, text="搜索条件 (留空则忽略)")
@@ -2601,6 +4331,7 @@ class UniversalEmailCleanerApp:
 
         self.chk_filter_has_attachments = ttk.Checkbutton(self.filter_frame, text="仅包含附件", variable=self.criteria_has_attachments)
         self.chk_filter_has_attachments.grid(row=3, column=2, columnspan=2, **grid_opts)
+        self.chk_goid_exact = ttk.Checkbutton(self.filter_frame, text="GOID 精确匹配", variable=self.criteria_goid_exact)
 
         ttk.Label(self.filter_frame, text="开始日期 (YYYY-MM-DD):").grid(row=2, column=0, **grid_opts)
         self.start_date_entry = DateEntry(self.filter_frame, textvariable=self.criteria_start_date, mode_var=self.cleanup_target_var, other_date_var=self.criteria_end_date)
@@ -2741,9 +4472,46 @@ class UniversalEmailCleanerApp:
         self._search_detail_hint_var = tk.StringVar(value="(轻量模式仅搜基础字段，速度更快)")
         self._lbl_search_detail_hint = ttk.Label(opt_frame2, textvariable=self._search_detail_hint_var, foreground="gray")
         self._lbl_search_detail_hint.pack(side="left", padx=5)
+
+        # --- Row 3c: Performance options ---
+        perf_frame = ttk.LabelFrame(frame, text="性能选项 (Performance)")
+        perf_frame.pack(fill="x", pady=5)
+
+        self.chk_graph_incremental = ttk.Checkbutton(
+            perf_frame,
+            text="Graph 增量扫描 (Delta，仅处理新增/变更邮件)",
+            variable=self.graph_incremental_var,
+        )
+        self.chk_graph_incremental.pack(side="left", padx=10)
+        ttk.Checkbutton(perf_frame, text="大邮箱优先", variable=self.longest_first_var).pack(side="left", padx=(0, 10))
+
+        ttk.Label(perf_frame, text="| 最大并发邮箱数:").pack(side="left", padx=(5, 2))
+        ttk.Spinbox(perf_frame, from_=1, to=64, textvariable=self.max_concurrency_var, width=5).pack(side="left", padx=2)
+        ttk.Label(perf_frame, text="(自适应: 健康时逐步增加，遇到限流自动减半)", foreground="gray").pack(side="left", padx=5)
+
+        perf_row2 = ttk.Frame(frame)
+        perf_row2.pack(fill="x", pady=(0, 5), after=perf_frame)
+        ttk.Label(perf_row2, text="Graph 限速  应用(次/秒):").pack(side="left", padx=(10, 2))
+        ttk.Spinbox(perf_row2, from_=1, to=5000, textvariable=self.graph_app_rate_var, width=6).pack(side="left", padx=2)
+        ttk.Label(perf_row2, text="单邮箱(次/秒):").pack(side="left", padx=(8, 2))
+        ttk.Spinbox(perf_row2, from_=1, to=100, textvariable=self.graph_mailbox_rate_var, width=5).pack(side="left", padx=2)
+        ttk.Label(perf_row2, text="单邮箱并发请求:").pack(side="left", padx=(8, 2))
+        ttk.Spinbox(perf_row2, from_=1, to=16, textvariable=self.graph_mailbox_concurrency_var, width=4).pack(side="left", padx=2)
+        ttk.Label(perf_row2, text="并发批次($batch):").pack(side="left", padx=(8, 2))
+        ttk.Spinbox(perf_row2, from_=1, to=8, textvariable=self.graph_batch_concurrency_var, width=4).pack(side="left", padx=2)
+        ttk.Label(perf_row2, text="日历分片(天):").pack(side="left", padx=(8, 2))
+        ttk.Spinbox(perf_row2, from_=1, to=730, textvariable=self.calendar_window_days_var, width=5).pack(side="left", padx=2)
+        ttk.Label(perf_row2, text="进程数:").pack(side="left", padx=(8, 2))
+        ttk.Spinbox(perf_row2, from_=1, to=max(1, os.cpu_count() or 1), textvariable=self.process_workers_var, width=4).pack(side="left", padx=2)
+        ttk.Label(perf_row2, text="文件夹分片(封):").pack(side="left", padx=(8, 2))
+        ttk.Spinbox(perf_row2, from_=0, to=1000000, increment=5000, textvariable=self.slice_threshold_var, width=8).pack(side="left", padx=2)
         
         # Start
-        ttk.Button(frame, textvariable=self.btn_start_text, command=self.start_cleanup_thread).pack(pady=10, ipadx=20, ipady=5)
+        start_row = ttk.Frame(frame)
+        start_row.pack(pady=10)
+        ttk.Button(start_row, textvariable=self.btn_start_text, command=self.start_cleanup_thread).pack(side="left", ipadx=20, ipady=5)
+        ttk.Button(start_row, text="续跑中断任务", command=self.start_resume_thread).pack(side="left", padx=(10, 0), ipadx=5, ipady=5)
+        ttk.Button(start_row, text="分布式运行...", command=self.start_distributed_thread).pack(side="left", padx=(10, 0), ipadx=5, ipady=5)
 
         # Progress bar
         progress_frame = ttk.Frame(frame)
@@ -3210,7 +4978,8 @@ class UniversalEmailCleanerApp:
         thumbprint = self.thumbprint_var.get()
         client_secret = self.client_secret_var.get()
         env = self.graph_env_var.get()
-        token = self._get_graph_access_token(auth_mode, tenant_id, app_id, thumbprint, client_secret, env)
+        token_mgr = self._new_graph_token_manager(auth_mode, tenant_id, app_id, thumbprint, client_secret, env)
+        token = token_mgr.get()
         if not token:
             self.log("无法获取 Graph 访问令牌。", "ERROR")
             return 0, len(selected_iids)
@@ -3249,11 +5018,11 @@ class UniversalEmailCleanerApp:
                         fail += 1
                         self._update_result_row_status(iid, "Skipped (NotOrganizer)", "error")
                         continue
-                    resp = requests.post(
+                    resp = self._graph_limited_request(
+                        "POST",
                         f"{base_url}/cancel",
-                        headers=headers,
-                        json={"comment": "Cancelled by UniversalEmailCleaner"},
-                        timeout=30,
+                        headers=headers, token_manager=token_mgr,
+                        json_body={"comment": "Cancelled by UniversalEmailCleaner"},
                     )
                 elif "拒绝会议" in action:
                     if resource != "events":
@@ -3264,29 +5033,29 @@ class UniversalEmailCleanerApp:
                         fail += 1
                         self._update_result_row_status(iid, "Skipped (NotAttendee)", "error")
                         continue
-                    resp = requests.post(
+                    resp = self._graph_limited_request(
+                        "POST",
                         f"{base_url}/decline",
-                        headers=headers,
-                        json={"comment": "Declined by UniversalEmailCleaner", "sendResponse": True},
-                        timeout=30,
+                        headers=headers, token_manager=token_mgr,
+                        json_body={"comment": "Declined by UniversalEmailCleaner", "sendResponse": True},
                     )
                 else:
                     if del_mode == "permanent" and resource == "messages":
                         # POST .../permanentDelete — 永久删除
-                        resp = requests.post(f"{base_url}/permanentDelete", headers=headers, timeout=30)
+                        resp = self._graph_limited_request("POST", f"{base_url}/permanentDelete", headers=headers, token_manager=token_mgr)
                         if resp.status_code in (404, 405):
-                            resp = requests.delete(base_url, headers=headers, timeout=30)
+                            resp = self._graph_limited_request("DELETE", base_url, headers=headers, token_manager=token_mgr)
                     elif del_mode == "soft" and resource == "messages":
                         # 软删除: DELETE 请求 — 进入 Recoverable Items
-                        resp = requests.delete(base_url, headers=headers, timeout=30)
+                        resp = self._graph_limited_request("DELETE", base_url, headers=headers, token_manager=token_mgr)
                     else:
                         # 普通删除: POST .../move → Deleted Items
                         if resource == "messages":
-                            resp = requests.post(f"{base_url}/move", headers=headers, json={"destinationId": "deleteditems"}, timeout=30)
+                            resp = self._graph_limited_request("POST", f"{base_url}/move", headers=headers, token_manager=token_mgr, json_body={"destinationId": "deleteditems"})
                             if resp is not None and resp.status_code in (404, 405):
-                                resp = requests.delete(base_url, headers=headers, timeout=30)
+                                resp = self._graph_limited_request("DELETE", base_url, headers=headers, token_manager=token_mgr)
                         else:
-                            resp = requests.delete(base_url, headers=headers, timeout=30)
+                            resp = self._graph_limited_request("DELETE", base_url, headers=headers, token_manager=token_mgr)
 
                 if resp is not None and resp.status_code in (200, 201, 202, 204):
                     success += 1
@@ -3514,6 +5283,7 @@ class UniversalEmailCleanerApp:
                 self._rb_search_custom.configure(state="disabled")
                 self._btn_result_fields.configure(state="disabled")
                 self._search_detail_hint_var.set("(会议扫描使用固定字段，搜索详细度不适用)")
+                self.chk_graph_incremental.configure(state="disabled")
             except Exception:
                 pass
             self._update_criteria_ui()
@@ -3535,6 +5305,7 @@ class UniversalEmailCleanerApp:
                 self._rb_search_custom.configure(state="normal")
                 self._btn_result_fields.configure(state="normal")
                 self._search_detail_hint_var.set("(轻量模式仅搜基础字段，速度更快)")
+                self.chk_graph_incremental.configure(state="normal")
             except Exception:
                 pass
             self._update_criteria_ui()
@@ -3549,6 +5320,7 @@ class UniversalEmailCleanerApp:
                 self.lbl_extra_addr.config(text="与会者包含地址:")
                 self.entry_extra_addr.configure(textvariable=self.criteria_attendee)
                 self.chk_filter_has_attachments.grid_remove()
+                self.chk_goid_exact.grid(row=3, column=2, columnspan=2, padx=5, pady=2, sticky='w')
 
                 scope = self.meeting_scope_var.get()
                 show_clean = "Single" not in scope
@@ -3566,11 +5338,12 @@ class UniversalEmailCleanerApp:
                 self.entry_secondary_id.grid_remove()
                 self.lbl_extra_addr.config(text="收件人地址包含:")
                 self.entry_extra_addr.configure(textvariable=self.criteria_recipient)
+                self.chk_goid_exact.grid_remove()
                 self.chk_filter_has_attachments.grid(row=3, column=2, columnspan=2, padx=5, pady=2, sticky='w')
         except Exception:
             pass
 
-    def start_cleanup_thread(self):
+    def start_cleanup_thread(self, resume: bool = False, lease_dir: str | None = None):
         if (not self.csv_path_var.get()) and (not (self.target_single_email_var.get() or '').strip()):
             messagebox.showerror("错误", "请选择 CSV 文件，或填写单个目标邮箱地址。")
             return
@@ -3580,7 +5353,7 @@ class UniversalEmailCleanerApp:
         if source == "Graph":
             mode = self.graph_auth_mode_var.get()
             if mode == "Auto":
-                if not self.app_id_var.get() or not self.tenant_id_var.get() or not self.thumbprint_var.get():
+                if not self.app_id_var.get() or not self.tenant_id_var.get() or not (self.thumbprint_var.get() or self.cert_file_var.get().strip()):
                     messagebox.showwarning("配置缺失", "您选择了 Graph API (自动/证书) 模式，但未配置 App ID, Tenant ID 或 Thumbprint。\n请前往 '1. 连接配置' 标签页进行配置。")
                     self.notebook.select(self.tab_connection)
                     return
@@ -3677,9 +5450,21 @@ class UniversalEmailCleanerApp:
         self.logger.set_level(self.log_level_var.get().upper())
         self.save_config()
         
-        threading.Thread(target=self.run_cleanup, daemon=True).start()
+        threading.Thread(target=self.run_cleanup, kwargs={'resume': resume, 'lease_dir': lease_dir}, daemon=True).start()
 
-    def run_cleanup(self):
+    def start_resume_thread(self):
+        """Resume the last interrupted run: finished mailboxes are skipped, the report is appended."""
+        self.start_cleanup_thread(resume=True)
+
+    def start_distributed_thread(self):
+        """Coordinate a multi-node run whose lease store lives in a shared directory."""
+        lease_dir = filedialog.askdirectory(title="选择共享目录 (所有工作节点均可访问)", initialdir=self.lease_dir_var.get() or None)
+        if not lease_dir:
+            return
+        self.lease_dir_var.set(lease_dir)
+        self.start_cleanup_thread(lease_dir=lease_dir)
+
+    def run_cleanup(self, resume: bool = False, lease_dir: str | None = None):
         # Reset progress bar
         self._progress_reset(0)
         self.log("-" * 60)
@@ -3693,16 +5478,526 @@ class UniversalEmailCleanerApp:
             else:
                 mode_str += ' | 可恢复删除'
         self.log(f"模式: {mode_str}")
+        if resume:
+            self.log("续跑: 跳过已完成的邮箱，从中断处继续。")
+        if lease_dir:
+            self.log(f"分布式模式: 共享目录 {lease_dir}")
         self.log("-" * 60)
 
         source = self.source_type_var.get()
         if source == "Graph":
-            self.run_graph_cleanup()
+            self.run_graph_cleanup(resume=resume, lease_dir=lease_dir)
         else:
-            self.run_ews_cleanup()
+            self.run_ews_cleanup(resume=resume, lease_dir=lease_dir)
 
     # --- Helper Methods ---
-    def run_powershell_script(self, script):
+    def _new_concurrency_controller(self) -> AdaptiveConcurrencyController:
+        """Create the AIMD controller for a new run and start its periodic stats log."""
+        max_workers = max(1, min(self._safe_int_var(self.max_concurrency_var, 32), 64))
+        ctl = AdaptiveConcurrencyController(initial=min(10, max_workers), min_limit=min(2, max_workers), max_limit=max_workers)
+        self._concurrency_ctl = ctl
+        self.log(f"自适应并发: 初始 {ctl.limit}，范围 {ctl.min_limit}-{ctl.max_limit}")
+        ctl.start_monitor(self.log)
+        return ctl
+
+    def _end_concurrency_controller(self, ctl: AdaptiveConcurrencyController):
+        """Stop the run's controller so later calls (result-tab deletes, next run) do not see it."""
+        ctl.stop_monitor()
+        if getattr(self, '_concurrency_ctl', None) is ctl:
+            self._concurrency_ctl = None
+        if EwsControlledAdapter.controller is ctl:
+            EwsControlledAdapter.controller = None
+
+    def _run_fingerprint(self, kind: str, users: list[str]) -> str:
+        """Identify a run by source, criteria, delete mode, folders and target list (for resume)."""
+        src = json.dumps({
+            'kind': kind,
+            'target': self.cleanup_target_var.get(),
+            'criteria': [
+                self.criteria_goid.get(), bool(self.criteria_goid_exact.get()),
+                self.criteria_clean_goid.get(), self.criteria_attendee.get(),
+                self.criteria_recipient.get(), bool(self.criteria_has_attachments.get()), self.criteria_subject.get(),
+                self.criteria_sender.get(), self.criteria_msg_id.get(), self.criteria_body.get(),
+                self._normalize_date_input(self.criteria_start_date.get()),
+                self._normalize_date_input(self.criteria_end_date.get()),
+            ],
+            'meeting': [self.meeting_scope_var.get(), bool(self.meeting_only_cancelled_var.get()),
+                        bool(self.meeting_send_cancellations_var.get())],
+            'mode': [bool(self.report_only_var.get()), bool(self.permanent_delete_var.get()), bool(self.soft_delete_var.get())],
+            'folders': self._get_selected_folders(),
+            'fields': self._get_selected_result_fields(),
+            'users': hashlib.sha256('\n'.join(sorted(u.lower() for u in users)).encode('utf-8')).hexdigest(),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(src.encode('utf-8')).hexdigest()[:16]
+
+    def _open_mailbox_stats(self, kind: str):
+        """Load the scheduling history; report writers are wrapped in _RowCountingWriter over _report_row_counts."""
+        self._mailbox_stats_kind = kind
+        self._report_row_counts = {}
+        try:
+            self._mailbox_stats = MailboxStatsStore(os.path.join(self.documents_dir, "mailbox_stats.json"),
+                                                    persist=getattr(self, '_shard_queue', None) is None)
+        except Exception as e:
+            self._mailbox_stats = None
+            self.log(f"无法加载邮箱历史统计: {e}", "ERROR", is_advanced=True)
+
+    def _schedule_longest_first(self, kind: str, users: list[str]) -> list[str]:
+        """Order mailboxes by expected duration, longest first.
+
+        Workers take the next mailbox from one shared queue, so a worker that goes idle picks
+        the next-largest one left and a big mailbox never starts last. The expected duration
+        comes from earlier runs; size hints of the target CSV (ItemCount / TotalItemSize) are
+        converted with the seconds-per-unit ratio of mailboxes that have both. Mailboxes with
+        no estimate at all go first, since they may be the large ones.
+        """
+        if getattr(self, '_shard_context', None) is not None:
+            return users  # already ordered by the parent
+        stats = getattr(self, '_mailbox_stats', None)
+        if stats is None or len(users) < 2 or not bool(self.longest_first_var.get()):
+            return users
+        hints = getattr(self, '_target_size_hints', None) or {}
+        history = {u: stats.estimate(kind, u) for u in users}
+        ratios = sorted(history[u] / hints[u.lower()] for u in users
+                        if history[u] is not None and hints.get(u.lower(), 0) > 0)
+        ratio = ratios[len(ratios) // 2] if ratios else None
+
+        def _expected(user):
+            if history[user] is not None:
+                return history[user]
+            hint = hints.get(user.lower(), 0)
+            return hint * ratio if (ratio and hint > 0) else None
+
+        expected = {u: _expected(u) for u in users}
+        ordered = sorted(users, key=lambda u: (expected[u] is not None,
+                                               -(expected[u] if expected[u] is not None else hints.get(u.lower(), 0))))
+        known = sum(1 for u in users if expected[u] is not None)
+        if known:
+            head = ", ".join(f"{u} (~{int(expected[u])}s)" for u in ordered if expected[u] is not None)
+            self.log(f"大邮箱优先: {known} 个邮箱按预计耗时排序，{len(users) - known} 个无历史的邮箱先行", is_advanced=True)
+            self.log(f"  预计最长: {head[:300]}", is_advanced=True)
+        return ordered
+
+    def _close_mailbox_stats(self):
+        stats = getattr(self, '_mailbox_stats', None)
+        if stats is None:
+            return
+        shard_queue = getattr(self, '_shard_queue', None)
+        if shard_queue is not None:
+            shard_queue.put(('state', self._shard_context['index'], {'_mailbox_stats': stats.export_changes()}, None, None))
+            return
+        try:
+            stats.flush()
+        except Exception as e:
+            self.log(f"保存邮箱历史统计失败: {e}", "ERROR", is_advanced=True)
+
+    def _begin_run_journal(self, kind: str, users: list[str], report_path: str, resume: bool) -> tuple[list[str], str, bool]:
+        """Start (or resume) a journaled run. Returns (users still to process, report path, resumed)."""
+        self._run_journal = None
+        self._run_journal_id = ''
+        self._run_journal_users = list(users)
+        shard = getattr(self, '_shard_context', None)
+        if shard is not None:
+            # Worker process: attach to the parent's run and write this shard's own report file.
+            if shard.get('journal_run'):
+                try:
+                    self._run_journal = RunJournal(os.path.join(self.documents_dir, "run_journal.sqlite3"))
+                    self._run_journal_id = shard['journal_run']
+                except Exception as e:
+                    self.log(f"无法打开运行日志: {e}", "ERROR")
+            return users, shard['report_path'], False
+        try:
+            journal = RunJournal(os.path.join(self.documents_dir, "run_journal.sqlite3"))
+        except Exception as e:
+            if resume:
+                raise Exception(f"无法打开运行日志，不能续跑: {e}")
+            self.log(f"无法打开运行日志 (本次任务中断后将无法续跑): {e}", "ERROR")
+            return users, report_path, False
+
+        fingerprint = self._run_fingerprint(kind, users)
+        if not resume:
+            self._run_journal = journal
+            self._run_journal_id = journal.start_run(kind, fingerprint, report_path)
+            return users, report_path, False
+
+        prev = journal.find_resumable(kind)
+        if not prev:
+            journal.close()
+            raise Exception("没有可续跑的中断任务。")
+        if prev['fingerprint'] != fingerprint:
+            journal.close()
+            raise Exception("当前筛选条件、目标列表或删除模式与中断的任务不一致，无法续跑。")
+        self._run_journal = journal
+        self._run_journal_id = prev['run_id']
+        done = journal.done_mailboxes(prev['run_id'])
+        remaining = [u for u in users if u.lower() not in done]
+        report_path = prev['report_path'] or report_path
+        self.log(f">>> 续跑中断的任务: 已完成 {len(users) - len(remaining)} 个邮箱，剩余 {len(remaining)} 个；报告追加到 {report_path}")
+        return remaining, report_path, True
+
+    def _run_mailbox_journaled(self, fn, user, *args):
+        """Run one mailbox task and record it in the run journal once it finished cleanly.
+
+        Duration and report rows go to the scheduling history; on a lease worker node the
+        outcome is also collected for the lease store.
+        """
+        started = time.monotonic()
+        ok = fn(user, *args)
+        seconds = time.monotonic() - started
+        rows = getattr(self, '_report_row_counts', {}).get((user or '').lower(), 0)
+        stats = getattr(self, '_mailbox_stats', None)
+        if stats is not None and ok:
+            stats.record(self._mailbox_stats_kind, user, seconds, rows)
+        lease_results = getattr(self, '_lease_results', None)
+        if lease_results is not None:
+            lease_results[user] = (bool(ok), seconds, rows)
+        journal = getattr(self, '_run_journal', None)
+        if journal is not None and ok:
+            try:
+                journal.mark_mailbox_done(self._run_journal_id, user)
+            except Exception as e:
+                self.log(f"  写入运行日志失败: {e}", "ERROR", is_advanced=True)
+        return ok
+
+    def _finish_run_journal(self):
+        """Close the run; it stays resumable while any mailbox has not finished cleanly."""
+        journal = getattr(self, '_run_journal', None)
+        if journal is None:
+            return
+        if getattr(self, '_shard_context', None) is not None:
+            # the parent decides whether the run is finished
+            self._close_run_journal()
+            return
+        try:
+            done = journal.done_mailboxes(self._run_journal_id)
+            pending = [u for u in getattr(self, '_run_journal_users', []) if u.lower() not in done]
+            if pending:
+                self.log(f"{len(pending)} 个邮箱未完整处理，可使用“续跑中断任务”重试。")
+            else:
+                journal.finish_run(self._run_journal_id)
+        finally:
+            self._close_run_journal()
+
+    def _close_run_journal(self):
+        journal = getattr(self, '_run_journal', None)
+        self._run_journal = None
+        if journal is not None:
+            journal.close()
+
+    @classmethod
+    def _new_shard_worker(cls, context: dict, msg_queue) -> 'UniversalEmailCleanerApp':
+        """Build a Tk-free instance for a worker process from the parent's settings snapshot."""
+        app = cls.__new__(cls)
+        for name, value in context['attrs'].items():
+            setattr(app, name, value)
+        for name, value in context['vars'].items():
+            setattr(app, name, _PlainVar(value))
+        for name, values in context['var_dicts'].items():
+            setattr(app, name, {k: _PlainVar(v) for k, v in values.items()})
+        index = context['index']
+        app.root = _HeadlessRoot()
+        app.logger = _ShardLogger(index, msg_queue, context['log_level'])
+        app._shard_context = context
+        app._shard_queue = msg_queue
+        app._graph_rate_limiter_lock = threading.Lock()
+        app._cert_signer_cache = {}
+        app._cert_signer_lock = threading.Lock()
+        app._ews_token_managers = {}
+        # GUI side effects become messages to the parent (or nothing)
+        app._progress_reset = lambda total: None
+        app._progress_increment = lambda label="": msg_queue.put(('progress', index, None, None, None))
+        app._progress_finish = lambda text="": None
+        app.update_report_link = lambda path: None
+        app.save_config = lambda: None
+        app._show_message = lambda kind, title, body: None
+        return app
+
+    def _shard_settings_snapshot(self) -> dict:
+        """Plain values of the Tk variables and simple attributes, for headless worker processes."""
+        tk_vars, var_dicts, attrs = {}, {}, {}
+        for name, value in vars(self).items():
+            if isinstance(value, tk.Variable):
+                try:
+                    tk_vars[name] = value.get()
+                except Exception:
+                    tk_vars[name] = ''
+            elif isinstance(value, dict) and value and all(isinstance(v, tk.Variable) for v in value.values()):
+                var_dicts[name] = {k: v.get() for k, v in value.items()}
+            elif value is None or isinstance(value, (str, int, float, bool)) or value == {}:
+                attrs[name] = value
+        return {'vars': tk_vars, 'var_dicts': var_dicts, 'attrs': attrs, 'log_level': self.logger.level}
+
+    def _process_shard_count(self, n_users: int) -> int:
+        if getattr(self, '_shard_context', None) is not None:
+            return 1
+        wanted = self._safe_int_var(self.process_workers_var, 1)
+        return max(1, min(wanted, n_users, os.cpu_count() or 1))
+
+    @staticmethod
+    def _merge_shard_report(shard_path: str, csvfile):
+        """Append a shard report (minus its header) to the main report and remove it."""
+        if not os.path.exists(shard_path):
+            return
+        with open(shard_path, 'r', encoding='utf-8-sig', newline='') as f:
+            f.readline()
+            shutil.copyfileobj(f, csvfile)
+        csvfile.flush()
+        os.remove(shard_path)
+
+    def _run_process_shards(self, kind: str, users: list[str], shard_count: int, csvfile):
+        """Run the mailboxes in headless worker processes (one thread pool each) and merge the output.
+
+        Shard reports live next to the main report until merged, so a resumed run picks up rows
+        of shards that finished before an interruption.
+        """
+        shard_dir = os.path.splitext(csvfile.name)[0] + "_shards"
+        os.makedirs(shard_dir, exist_ok=True)
+        for leftover in sorted(os.listdir(shard_dir)):
+            if leftover.endswith(".csv"):
+                self._merge_shard_report(os.path.join(shard_dir, leftover), csvfile)
+
+        # The thread budget and the app-wide Graph rate are split across the processes;
+        # per-mailbox limits stay as configured since every mailbox lives in one shard.
+        base = self._shard_settings_snapshot()
+        total_threads = max(1, min(self._safe_int_var(self.max_concurrency_var, 32), 64))
+        base['vars']['max_concurrency_var'] = max(1, -(-total_threads // shard_count))
+        base['vars']['graph_app_rate_var'] = max(1, self._safe_int_var(self.graph_app_rate_var, 500) // shard_count)
+        journal_run = self._run_journal_id if getattr(self, '_run_journal', None) is not None else ''
+        run_tag = uuid.uuid4().hex[:8]
+
+        mp = multiprocessing.get_context('spawn')
+        msg_queue = mp.Queue()
+        procs: dict[int, tuple] = {}
+        os.environ['UEC_HEADLESS_WORKER'] = '1'
+        try:
+            for index in range(shard_count):
+                shard_users = users[index::shard_count]
+                if not shard_users:
+                    continue
+                shard_path = os.path.join(shard_dir, f"shard_{index}_{run_tag}.csv")
+                context = dict(base, index=index, kind=kind, users=shard_users,
+                               report_path=shard_path, journal_run=journal_run)
+                proc = mp.Process(target=_shard_worker_main, args=(context, msg_queue), name=f"uec-shard-{index}", daemon=True)
+                proc.start()
+                procs[index] = (proc, shard_path)
+        finally:
+            os.environ.pop('UEC_HEADLESS_WORKER', None)
+        self.log(f"多进程模式: {len(procs)} 个进程，每个进程最多 {base['vars']['max_concurrency_var']} 个并发邮箱")
+
+        def _handle(msg) -> int | None:
+            what, index, a, b, c = msg
+            if what == 'log':
+                self.log(f"[进程{index}] {a}", b, c)
+            elif what == 'file':
+                self.logger.log_to_file_only(f"[进程{index}] {a}", b)
+            elif what == 'progress':
+                self._progress_increment()
+            elif what == 'state':
+                for attr, changes in (a or {}).items():
+                    store = getattr(self, attr, None)
+                    if store is not None:
+                        store.apply_changes(changes)
+            elif what == 'done':
+                return index
+            return None
+
+        finished: set[int] = set()
+        while len(finished) < len(procs):
+            try:
+                msg = msg_queue.get(timeout=1.0)
+            except queue.Empty:
+                for index, (proc, shard_path) in procs.items():
+                    if index not in finished and not proc.is_alive():
+                        self.log(f"进程 {index} 异常退出 (exit code {proc.exitcode})，其余邮箱可通过续跑重试。", "ERROR")
+                        finished.add(index)
+                        self._merge_shard_report(shard_path, csvfile)
+                continue
+            index = _handle(msg)
+            if index is not None and index not in finished:
+                finished.add(index)
+                procs[index][0].join(timeout=30)
+                self._merge_shard_report(procs[index][1], csvfile)
+
+        # late messages of workers that were declared dead while their queue was still draining
+        while True:
+            try:
+                _handle(msg_queue.get(timeout=0.2))
+            except queue.Empty:
+                break
+        for proc, shard_path in procs.values():
+            proc.join(timeout=5)
+            self._merge_shard_report(shard_path, csvfile)
+        try:
+            os.rmdir(shard_dir)
+        except OSError:
+            pass
+
+    def _lease_job_settings(self) -> dict:
+        """Settings snapshot for the shared lease store, with every credential blanked out."""
+        settings = self._shard_settings_snapshot()
+        for name in _LEASE_SECRET_ENV:
+            if name in settings['vars']:
+                settings['vars'][name] = ''
+        for name in settings['attrs']:
+            if name.endswith('_protected_cache'):
+                settings['attrs'][name] = ''
+        settings['lease'] = {'chunk_size': LEASE_CHUNK_SIZE, 'lease_seconds': LEASE_SECONDS}
+        return settings
+
+    def _lease_local_secrets(self) -> dict:
+        """Credentials handed in memory to the lease workers started on this machine."""
+        snapshot = self._shard_settings_snapshot()
+        return {
+            'vars': {name: snapshot['vars'].get(name, '') for name in _LEASE_SECRET_ENV},
+            'attrs': {name: value for name, value in snapshot['attrs'].items() if name.endswith('_protected_cache')},
+        }
+
+    def _apply_lease_node_settings(self, secrets: dict | None, state_dir: str):
+        """Fill in what a lease job leaves out: credentials and this node's own paths."""
+        for name, env_name in _LEASE_SECRET_ENV.items():
+            value = (secrets.get('vars') or {}).get(name) if secrets is not None else os.environ.get(env_name)
+            setattr(self, name, _PlainVar(value or ''))
+        for name, value in ((secrets or {}).get('attrs') or {}).items():
+            setattr(self, name, value)
+        if os.environ.get('UEC_CERT_FILE'):
+            self.cert_file_var = _PlainVar(os.environ['UEC_CERT_FILE'])
+        self.documents_dir = state_dir
+        self.reports_dir = os.path.join(state_dir, "Reports")
+
+    def _run_lease_coordinator(self, kind: str, users: list[str], lease_dir: str, csvfile):
+        """Coordinate a multi-node run through the lease store in ``lease_dir``.
+
+        The mailboxes are queued in the store; worker nodes (``--lease-worker``) lease them in
+        chunks and write one partial report per chunk, merged here as soon as it is complete.
+        The process count starts that many workers on this machine too. Starting again with the
+        same settings and directory continues an unfinished job.
+        """
+        reports_dir = os.path.join(lease_dir, "reports")
+        os.makedirs(reports_dir, exist_ok=True)
+        store = MailboxLeaseStore(os.path.join(lease_dir, LEASE_DB_NAME))
+        procs = []
+        try:
+            fingerprint = self._run_fingerprint(kind, users)
+            job = store.find_job(kind, fingerprint)
+            if job:
+                job_id = job['job_id']
+                lease_seconds = float(job['settings'].get('lease', {}).get('lease_seconds', LEASE_SECONDS))
+                self.log(f"继续未完成的分布式任务 {job_id}")
+            else:
+                lease_seconds = LEASE_SECONDS
+                job_id = store.create_job(kind, fingerprint, self._lease_job_settings(), users)
+            launcher = f'"{sys.executable}"' if getattr(sys, 'frozen', False) else f'"{sys.executable}" "{os.path.abspath(__file__)}"'
+            self.log(f"分布式任务 {job_id}: {len(users)} 个邮箱，共享目录 {lease_dir}")
+            self.log(f"其他节点加入: {launcher} --lease-worker \"{lease_dir}\"")
+            self.log("凭据不写入共享目录，其他节点通过环境变量提供: " + ", ".join(sorted(set(_LEASE_SECRET_ENV.values()))))
+            self.log("注意: Graph 限速按节点生效，多节点时请相应调低 应用(次/秒)。", is_advanced=True)
+
+            local_workers = self._safe_int_var(self.process_workers_var, 1)
+            secrets = self._lease_local_secrets()
+            mp = multiprocessing.get_context('spawn')
+            node_tag = f"{socket.gethostname()}-{uuid.uuid4().hex[:4]}"
+            os.environ['UEC_HEADLESS_WORKER'] = '1'
+            try:
+                for index in range(local_workers):
+                    proc = mp.Process(target=_lease_worker_process, args=(lease_dir, f"{node_tag}-{index}", secrets),
+                                      name=f"uec-lease-{index}", daemon=True)
+                    proc.start()
+                    procs.append(proc)
+            finally:
+                os.environ.pop('UEC_HEADLESS_WORKER', None)
+            self.log(f"本机启动 {len(procs)} 个工作进程")
+
+            journal = getattr(self, '_run_journal', None)
+            journaled: set[str] = set()
+            finished_seen = 0
+            last_alive = time.time()
+
+            def _merge_ready():
+                for name in sorted(os.listdir(reports_dir)):
+                    if name.endswith(".csv"):
+                        self._merge_shard_report(os.path.join(reports_dir, name), csvfile)
+
+            while True:
+                _merge_ready()
+                counts = store.counts(job_id)
+                finished = counts.get('done', 0) + counts.get('failed', 0)
+                for _ in range(finished - finished_seen):
+                    self._progress_increment()
+                finished_seen = max(finished_seen, finished)
+                if journal is not None:
+                    for mailbox in store.mailboxes(job_id, 'done'):
+                        if mailbox not in journaled:
+                            journaled.add(mailbox)
+                            journal.mark_mailbox_done(self._run_journal_id, mailbox)
+                if not counts.get('pending') and not counts.get('leased'):
+                    break
+                now = time.time()
+                if any(p.is_alive() for p in procs) or any(now - hb < lease_seconds for _, hb, _ in store.nodes(job_id)):
+                    last_alive = now
+                elif now - last_alive > lease_seconds:
+                    self.log("没有存活的工作节点，协调端停止等待；任务保留在共享目录中，以相同设置再次分布式运行即可继续。", "ERROR")
+                    break
+                time.sleep(2)
+
+            _merge_ready()
+            counts = store.counts(job_id)
+            if not counts.get('pending') and not counts.get('leased'):
+                store.finish_job(job_id)
+            stats = getattr(self, '_mailbox_stats', None)
+            if stats is not None:
+                for mailbox, seconds, rows in store.durations(job_id):
+                    stats.record(kind, mailbox, float(seconds), int(rows or 0))
+            for node, _hb, done in store.nodes(job_id):
+                self.log(f"  节点 {node}: 完成 {done} 个邮箱")
+            failed = store.mailboxes(job_id, 'failed')
+            if failed:
+                self.log(f"{len(failed)} 个邮箱处理失败: {', '.join(failed[:20])}{' ...' if len(failed) > 20 else ''}", "ERROR")
+            leftovers = [name for name in os.listdir(reports_dir) if name.endswith(".part")]
+            if leftovers:
+                self.log(f"{len(leftovers)} 个中断节点的分片报告未合并，保留在 {reports_dir}", "ERROR")
+        finally:
+            for proc in procs:
+                proc.join(timeout=30)
+            store.close()
+
+    def _get_graph_rate_limiter(self) -> GraphRateLimiter:
+        """Return the app-wide Graph limiter, rebuilding it when the configured limits change."""
+        settings = (
+            (self.app_id_var.get() or '').strip().lower(),
+            max(1, self._safe_int_var(self.graph_app_rate_var, 500)),
+            max(1, self._safe_int_var(self.graph_mailbox_rate_var, 16)),
+            max(1, self._safe_int_var(self.graph_mailbox_concurrency_var, 4)),
+        )
+        with self._graph_rate_limiter_lock:
+            limiter = getattr(self, '_graph_rate_limiter', None)
+            if limiter is None or getattr(self, '_graph_rate_limiter_settings', None) != settings:
+                limiter = GraphRateLimiter(app_rate=settings[1], mailbox_rate=settings[2], mailbox_concurrency=settings[3])
+                self._graph_rate_limiter = limiter
+                self._graph_rate_limiter_settings = settings
+            return limiter
+
+    def _graph_limited_request(self, method: str, url: str, *, headers: dict, json_body=None, timeout: int = 30,
+                               token_manager: AccessTokenManager | None = None):
+        """Single Graph call through the shared rate limiter (used outside the scan workers).
+
+        With a token manager the bearer token is taken per call and a 401 is retried once.
+        """
+        limiter = self._get_graph_rate_limiter()
+        mailbox = GraphRateLimiter.mailbox_from_url(url)
+        for attempt in range(2):
+            used_token = None
+            if token_manager is not None:
+                used_token = token_manager.get()
+                headers = {**headers, "Authorization": f"Bearer {used_token}"}
+            with limiter.slot(mailbox):
+                resp = _get_pooled_session().request(method, url, headers=headers, json=json_body, timeout=timeout)
+            if resp.status_code != 401 or not used_token or attempt:
+                return resp
+            if token_manager.invalidate(used_token) == used_token:
+                return resp
+        return resp
+
+    def run_powershell_script(self, script, env: dict | None = None):
+        """Run `script`; `env` entries are added to the child's environment (keeps secrets off the command line)."""
         wrapped_script = f"""
         $ErrorActionPreference = 'Stop'
         try {{
@@ -3714,12 +6009,17 @@ class UniversalEmailCleanerApp:
         """
         command = ["powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-Command", wrapped_script]
         creation_flags = 0x08000000 if sys.platform == 'win32' else 0
-        process = subprocess.run(command, capture_output=True, text=True, creationflags=creation_flags)
+        child_env = {**os.environ, **env} if env else None
+        process = subprocess.run(command, capture_output=True, text=True, creationflags=creation_flags, env=child_env)
         if process.returncode != 0:
             raise Exception(f"PowerShell Error: {process.stderr}")
         return process.stdout.strip()
 
     def _get_target_users(self):
+        shard = getattr(self, '_shard_context', None)
+        if shard is not None:
+            return list(shard['users'])
+        self._target_size_hints = {}
         single = (self.target_single_email_var.get() or '').strip()
         if single:
             self._target_identity_column = None
@@ -3744,6 +6044,9 @@ class UniversalEmailCleanerApp:
                     smtp_key = next((h for h in headers if str(h).strip().lower() in {'smtpaddress', 'smtp', 'mail', 'email'}), None)
                     upn_key = next((h for h in headers if str(h).strip().lower() in {'userprincipalname', 'upn'}), None)
                     use_key = smtp_key or upn_key
+                    # Get-MailboxStatistics exports carry a size estimate for first-run scheduling
+                    lowered = {str(h).strip().lower(): h for h in headers}
+                    size_key = next((lowered[k] for k in ('totalitemsize', 'totalitemsizebytes', 'itemcount') if k in lowered), None)
 
                     if use_key:
                         self._target_identity_column = 'SMTPAddress' if use_key == smtp_key else 'UserPrincipalName'
@@ -3751,6 +6054,8 @@ class UniversalEmailCleanerApp:
                             val = (row.get(use_key) or '').strip()
                             if val:
                                 users.append(val)
+                                if size_key:
+                                    self._target_size_hints[val.lower()] = _parse_size_hint(row.get(size_key))
                     else:
                         # Not a recognized mailbox CSV, fallback to plain-text mode
                         headers = []
@@ -3887,7 +6192,24 @@ class UniversalEmailCleanerApp:
             return self.get_token_from_cert(tenant_id, app_id, thumbprint, env)
         return self.get_token_from_secret(tenant_id, app_id, client_secret, env)
 
-    def get_token_from_secret(self, tenant_id, client_id, client_secret, env):
+    def _new_graph_token_manager(self, auth_mode, tenant_id, app_id, thumbprint, client_secret, env) -> AccessTokenManager:
+        """Token manager for one Graph run/action; refreshes ~5 minutes before expiry."""
+        if auth_mode == "Token":
+            # A pasted token cannot be renewed: resolve it once and only track its exp claim.
+            pasted = self._get_graph_access_token(auth_mode, tenant_id, app_id, thumbprint, client_secret, env)
+
+            def _fetch():
+                expires_in = _jwt_expires_in(pasted)
+                return pasted, (max(0.0, expires_in) if expires_in is not None else None)
+            return AccessTokenManager(_fetch)
+
+        def _fetch():
+            if auth_mode == "Auto":
+                return self.get_token_from_cert(tenant_id, app_id, thumbprint, env, return_expiry=True)
+            return self.get_token_from_secret(tenant_id, app_id, client_secret, env, return_expiry=True)
+        return AccessTokenManager(_fetch)
+
+    def get_token_from_secret(self, tenant_id, client_id, client_secret, env, return_expiry: bool = False):
         authority_host = "https://login.chinacloudapi.cn" if env == "China" else "https://login.microsoftonline.com"
         scope = "https://microsoftgraph.chinacloudapi.cn/.default" if env == "China" else "https://graph.microsoft.com/.default"
         token_url = f"{authority_host}/{tenant_id}/oauth2/v2.0/token"
@@ -3899,16 +6221,95 @@ class UniversalEmailCleanerApp:
             'grant_type': 'client_credentials'
         }
         
-        resp = requests.post(token_url, data=data)
+        resp = _get_pooled_session().post(token_url, data=data, timeout=30)
         if resp.status_code == 200:
-            return resp.json().get('access_token')
+            payload = resp.json()
+            if return_expiry:
+                return payload.get('access_token'), payload.get('expires_in')
+            return payload.get('access_token')
         else:
             raise Exception(f"获取 Token 失败: {resp.text}")
 
-    def get_token_from_cert(self, tenant_id, client_id, thumbprint, env):
+    def _get_cert_password(self) -> str:
+        pw = self.cert_password_var.get() or ''
+        if pw:
+            return pw
+        protected = getattr(self, '_cert_password_protected_cache', '') or ''
+        if protected:
+            pw = _dpapi_unprotect_text(protected) or ''
+        return pw or os.environ.get('UEC_CERT_PASSWORD', '')
+
+    def _get_cert_signer(self, thumbprint: str):
+        """Return a cached in-process signer, or None to fall back to the PowerShell path.
+
+        A configured certificate file always wins; otherwise on Windows the store certificate
+        is exported once per session (the setup wizard creates it exportable).
+        """
+        if not _HAS_CRYPTOGRAPHY:
+            return None
+        cert_file = (self.cert_file_var.get() or '').strip()
+        thumbprint = (thumbprint or '').strip().upper()
+        if cert_file:
+            try:
+                cache_key = ('file', os.path.abspath(cert_file), os.path.getmtime(cert_file))
+            except OSError as e:
+                raise Exception(f"无法读取证书文件: {cert_file} ({e})")
+        elif sys.platform == 'win32' and thumbprint:
+            cache_key = ('store', thumbprint)
+        else:
+            return None
+
+        with self._cert_signer_lock:
+            signer = self._cert_signer_cache.get(cache_key)
+            if signer is not None:
+                return signer
+
+            if cache_key[0] == 'file':
+                signer = CertificateAssertionSigner.from_file(cert_file, self._get_cert_password() or None)
+                if thumbprint and signer.thumbprint != thumbprint:
+                    self.log(f"  证书文件指纹 {signer.thumbprint} 与配置的 Thumbprint 不一致，以证书文件为准。", "ERROR")
+            else:
+                export_pw = uuid.uuid4().hex
+                ps = (
+                    f'$Cert = Get-Item "Cert:\\CurrentUser\\My\\{thumbprint}"\n'
+                    '$Bytes = $Cert.Export([System.Security.Cryptography.X509Certificates.X509ContentType]::Pfx, $env:UEC_PFX_EXPORT_PASSWORD)\n'
+                    '[Convert]::ToBase64String($Bytes)'
+                )
+                try:
+                    pfx = base64.b64decode(self.run_powershell_script(ps, env={'UEC_PFX_EXPORT_PASSWORD': export_pw}))
+                    signer = CertificateAssertionSigner.from_pfx_bytes(pfx, export_pw)
+                except Exception as e:
+                    self.log(f"  无法导出证书私钥用于进程内签名，改用 PowerShell 签名: {e}", is_advanced=True)
+                    return None
+
+            self._cert_signer_cache[cache_key] = signer
+            return signer
+
+    def get_token_from_cert(self, tenant_id, client_id, thumbprint, env, return_expiry: bool = False):
         authority = "https://login.chinacloudapi.cn" if env == "China" else "https://login.microsoftonline.com"
         scope = "https://microsoftgraph.chinacloudapi.cn/.default" if env == "China" else "https://graph.microsoft.com/.default"
-        
+
+        signer = self._get_cert_signer(thumbprint)
+        if signer is not None:
+            token_url = f"{authority}/{tenant_id}/oauth2/v2.0/token"
+            data = {
+                'client_id': client_id,
+                'scope': scope,
+                'client_assertion_type': 'urn:ietf:params:oauth:client-assertion-type:jwt-bearer',
+                'client_assertion': signer.build_assertion(client_id, token_url),
+                'grant_type': 'client_credentials',
+            }
+            resp = _get_pooled_session().post(token_url, data=data, timeout=30)
+            if resp.status_code == 200:
+                payload = resp.json()
+                if return_expiry:
+                    return payload.get('access_token'), payload.get('expires_in')
+                return payload.get('access_token')
+            raise Exception(f"获取 Token 失败: {resp.text}")
+
+        if sys.platform != 'win32':
+            raise Exception("非 Windows 环境下证书认证需要配置证书文件 (PFX/PEM) 并安装 cryptography")
+
         ps_template = r"""
         $ErrorActionPreference = 'Stop'
         try {
@@ -3963,6 +6364,7 @@ class UniversalEmailCleanerApp:
 
             $Response = Invoke-RestMethod -Method Post -Uri $Authority -Body $Body
             Write-Output $Response.access_token
+            Write-Output $Response.expires_in
         } catch {
             Write-Error $_
             exit 1
@@ -3974,8 +6376,12 @@ class UniversalEmailCleanerApp:
                             .replace("__CLIENTID__", client_id)\
                             .replace("__SCOPE__", scope)\
                             .replace("__AUTHORITY__", authority)
-                            
-        return self.run_powershell_script(script)
+
+        lines = self.run_powershell_script(script).splitlines()
+        token = lines[0].strip() if lines else ''
+        if return_expiry:
+            return token, (lines[1].strip() if len(lines) > 1 else None)
+        return token
 
     def process_single_user_graph(self, user, graph_endpoint, headers, resource, delete_resource, target_type, filter_str, body_keyword,
                                   report_only, writer, csv_lock, calendar_view_start=None, calendar_view_end=None,
@@ -3984,6 +6390,7 @@ class UniversalEmailCleanerApp:
         self.log(f"--- 正在处理: {user} ---")
         try:
             criteria_goid = (self.criteria_goid.get() or '').strip()
+            criteria_goid_exact = bool(self.criteria_goid_exact.get())
             criteria_clean_goid = (self.criteria_clean_goid.get() or '').strip().lower()
             criteria_attendee = (self.criteria_attendee.get() or '').strip().lower()
             criteria_recipient = (self.criteria_recipient.get() or '').strip().lower()
@@ -3991,29 +6398,84 @@ class UniversalEmailCleanerApp:
             req_headers = dict(headers)
             session = _get_pooled_session()
 
-            def _graph_request(method: str, url: str, *, params: dict | None = None, json_body=None):
+            rate_limiter = self._get_graph_rate_limiter()
+            token_mgr = getattr(self, '_graph_token_manager', None)
+            journal = getattr(self, '_run_journal', None)
+            journal_run = getattr(self, '_run_journal_id', '') or ''
+            query_plan = getattr(self, '_graph_query_plan', None)
+            if query_plan is not None:
+                filter_str = query_plan.current_filter()
+
+            def _graph_request(method: str, url: str, *, params: dict | None = None, json_body=None, extra_headers: dict | None = None,
+                               rate_cost: int = 1, stream: bool = False):
                 # Fast path: handle throttling/transient errors with limited retries.
                 # We keep this conservative to avoid making rate-limit worse.
                 max_attempts = 6
                 base_sleep = 0.6
+                send_headers = {**req_headers, **extra_headers} if extra_headers else req_headers
+                ctl = getattr(self, '_concurrency_ctl', None)
+                reauthed = False
                 for attempt in range(1, max_attempts + 1):
-                    resp = session.request(method, url, headers=req_headers, params=params, json=json_body)
+                    if ctl is not None:
+                        ctl.wait_if_paused()
+                    used_token = None
+                    if token_mgr is not None:
+                        used_token = token_mgr.get()
+                        send_headers = {**send_headers, "Authorization": f"Bearer {used_token}"}
+                    with rate_limiter.slot(user, rate_cost):
+                        t0 = time.monotonic()
+                        resp = session.request(method, url, headers=send_headers, params=params, json=json_body, stream=stream)
+
+                    if resp.status_code == 401 and used_token and not reauthed:
+                        # Token expired mid-run: refresh once (single-flight across workers) and retry.
+                        reauthed = True
+                        try:
+                            fresh = token_mgr.invalidate(used_token)
+                        except Exception as e:
+                            self.log(f"Token 刷新失败: {e}", "ERROR")
+                            return resp
+                        if fresh != used_token:
+                            self.log("Graph 返回 401，已刷新 Token 并重试。", is_advanced=True)
+                            if stream:
+                                resp.close()
+                            continue
+                        return resp
 
                     if resp.status_code in (429, 503, 502, 504):
                         retry_after = resp.headers.get('Retry-After')
+                        hinted = None
                         if retry_after:
                             try:
-                                sleep_s = float(retry_after)
+                                hinted = float(retry_after)
+                                sleep_s = hinted
                             except Exception:
                                 sleep_s = base_sleep * (2 ** (attempt - 1))
                         else:
                             sleep_s = base_sleep * (2 ** (attempt - 1))
+                        if ctl is not None:
+                            # Retry-After is a tenant-wide signal: shrink the pool and pause everyone.
+                            if resp.status_code in (429, 503):
+                                ctl.record_throttle(hinted)
+                            else:
+                                ctl.record_error()
                         # jitter to spread concurrent threads
                         sleep_s = min(12.0, sleep_s) + random.random() * 0.25
                         if attempt < max_attempts:
                             self.log(f"Graph 请求被限流/暂时失败({resp.status_code})，等待 {sleep_s:.2f}s 后重试...", is_advanced=True)
-                            time.sleep(sleep_s)
+                            if stream:
+                                resp.close()
+                            if ctl is not None and hinted:
+                                ctl.wait_if_paused()
+                                time.sleep(random.random() * 0.25)
+                            else:
+                                time.sleep(sleep_s)
                             continue
+                    elif ctl is not None:
+                        # only 2xx grows the window; 5xx counts against it, other 4xx say nothing about load
+                        if 200 <= resp.status_code < 300:
+                            ctl.record_success(time.monotonic() - t0)
+                        elif resp.status_code >= 500:
+                            ctl.record_error()
                     return resp
                 return resp
 
@@ -4022,7 +6484,7 @@ class UniversalEmailCleanerApp:
                 if not batch_requests:
                     return None
                 batch_url = f"{graph_endpoint}/v1.0/$batch"
-                resp = _graph_request("POST", batch_url, json_body={"requests": batch_requests})
+                resp = _graph_request("POST", batch_url, json_body={"requests": batch_requests}, rate_cost=len(batch_requests))
                 if resp.status_code != 200:
                     return None
                 try:
@@ -4079,12 +6541,119 @@ class UniversalEmailCleanerApp:
 
             # Build a folder name cache for Graph (parentFolderId -> displayName)
             _graph_folder_name_cache: dict[str, str] = {}
+            _folder_index: dict = {}
+            # received-date slices resolve folder names concurrently; only one of them builds the index
+            _folder_index_lock = threading.Lock()
+            folder_select = "id,displayName,parentFolderId,childFolderCount"
+
+            def _fetch_child_folders(chunk: list[tuple[str, str]]) -> list[tuple[dict, str]]:
+                # childFolders of up to 20 parents in one $batch; returns (child, parent path)
+                batch_json = _graph_batch_send([
+                    {
+                        "id": str(j),
+                        "method": "GET",
+                        "url": f"/v1.0/users/{user}/mailFolders/{fid}/childFolders?$top=200&$select={folder_select}",
+                    }
+                    for j, (fid, _path) in enumerate(chunk)
+                ]) or {}
+                resp_map = {str(r.get('id')): r for r in (batch_json.get('responses') or []) if isinstance(r, dict)}
+                found: list[tuple[dict, str]] = []
+                for j, (fid, path) in enumerate(chunk):
+                    r = resp_map.get(str(j)) or {}
+                    body = r.get('body') if isinstance(r.get('body'), dict) else {}
+                    if r.get('status') == 200:
+                        kids = list(body.get('value') or [])
+                        if body.get('@odata.nextLink'):
+                            kids.extend(_paged_folder_values(body['@odata.nextLink']))
+                    else:
+                        # throttled or failed sub-request: plain paged call (with retries)
+                        kids = _paged_folder_values(
+                            f"{graph_endpoint}/v1.0/users/{user}/mailFolders/{fid}/childFolders",
+                            params={"$top": 200, "$select": folder_select},
+                        )
+                    found.extend((k, path) for k in kids)
+                return found
+
+            def _walk_folder_levels(level: list[tuple[dict, str]]):
+                # Level-order walk yielding (folder, path) as soon as each level is known; the
+                # childFolders of up to 20 parents are fetched per $batch, and the batches of one
+                # level run in parallel (the per-mailbox limiter slots cap what is in flight).
+                seen: set[str] = set()
+                level_workers = max(1, self._safe_int_var(self.graph_mailbox_concurrency_var, 4))
+                while level:
+                    parents: list[tuple[str, str]] = []
+                    for f, parent_path in level:
+                        fid = f.get('id')
+                        if not fid or fid in seen:
+                            continue
+                        seen.add(fid)
+                        name = f.get('displayName') or fid
+                        path = f"{parent_path}/{name}" if parent_path else name
+                        yield f, path
+                        if int(f.get('childFolderCount') or 0) > 0:
+                            parents.append((fid, path))
+                    level = []
+                    chunks = [parents[i:i+20] for i in range(0, len(parents), 20)]
+                    if len(chunks) <= 1:
+                        for chunk in chunks:
+                            level.extend(_fetch_child_folders(chunk))
+                        continue
+                    # results are collected in chunk order, so paths come out as in a sequential walk
+                    with ThreadPoolExecutor(max_workers=min(len(chunks), level_workers)) as level_pool:
+                        for found in level_pool.map(_fetch_child_folders, chunks):
+                            level.extend(found)
+
+            def _load_cached_folder_index() -> bool:
+                if _folder_index:
+                    return True
+                index_cache = getattr(self, '_graph_folder_index_cache', None)
+                cache_tenant = getattr(self, '_graph_delta_tenant', '') or ''
+                cached = index_cache.get(cache_tenant, user) if index_cache is not None else None
+                if cached:
+                    _folder_index.update(cached)
+                    return True
+                return False
+
+            def _get_folder_index() -> dict:
+                # One mailFolders/childFolders sweep per mailbox, shared by name resolution and the
+                # Inbox subtree enumeration; cached on disk (TTL) so later runs skip the sweep.
+                with _folder_index_lock:
+                    return _build_folder_index()
+
+            def _build_folder_index() -> dict:
+                if _load_cached_folder_index():
+                    return _folder_index
+                index_cache = getattr(self, '_graph_folder_index_cache', None)
+                cache_tenant = getattr(self, '_graph_delta_tenant', '') or ''
+                inbox_meta = _graph_get_json(f"{graph_endpoint}/v1.0/users/{user}/mailFolders/inbox", params={"$select": "id"})
+                folders: dict[str, dict] = {}
+                top = _paged_folder_values(f"{graph_endpoint}/v1.0/users/{user}/mailFolders", params={"$top": 200, "$select": folder_select})
+                for f, path in _walk_folder_levels([(f, "") for f in top]):
+                    folders[f['id']] = {'displayName': f.get('displayName') or f['id'], 'path': path,
+                                        'parent': f.get('parentFolderId') or '',
+                                        'childFolderCount': int(f.get('childFolderCount') or 0)}
+                wellknown = {'inbox': inbox_meta.get('id') or ''}
+                self.log(f"  文件夹索引: {len(folders)} 个文件夹", is_advanced=True)
+                if index_cache is not None:
+                    index_cache.put(cache_tenant, user, folders, wellknown)
+                _folder_index.update({'folders': folders, 'wellknown': wellknown})
+                return _folder_index
 
             def _resolve_graph_folder_name(folder_id: str) -> str:
                 if not folder_id:
                     return ""
                 if folder_id in _graph_folder_name_cache:
                     return _graph_folder_name_cache[folder_id]
+                try:
+                    entry = (_get_folder_index().get('folders') or {}).get(folder_id)
+                except Exception as e:
+                    self.log(f"  文件夹索引构建失败，改为逐个查询: {e}", is_advanced=True)
+                    with _folder_index_lock:
+                        _folder_index.update({'folders': {}, 'wellknown': {}})
+                    entry = None
+                if entry:
+                    _graph_folder_name_cache[folder_id] = entry.get('displayName') or folder_id
+                    return _graph_folder_name_cache[folder_id]
                 # Well-known folder ID patterns
                 well_known = {
                     "inbox": "Inbox", "sentitems": "Sent Items", "drafts": "Drafts",
@@ -4109,6 +6678,239 @@ class UniversalEmailCleanerApp:
                     _graph_folder_name_cache[folder_id] = folder_id
                     return folder_id
 
+            perm_enabled = bool(permanent_delete and target_type == "Email" and str(delete_resource).lower() == "messages")
+            soft_enabled = bool((not perm_enabled) and (target_type == "Email") and bool(soft_delete) and str(delete_resource).lower() == "messages")
+
+            def _append_detail(row_data: dict, detail: str):
+                row_data['Details'] = ((row_data.get('Details') + '; ') if row_data.get('Details') else '') + detail
+
+            def _sub_retry_after(r: dict, attempt: int) -> float:
+                for k, v in ((r.get('headers') or {}).items()):
+                    if str(k).lower() == 'retry-after':
+                        try:
+                            return min(60.0, float(v))
+                        except Exception:
+                            break
+                return 0.6 * (2 ** (attempt - 1))
+
+            def _delete_chunk(chunk: list[tuple[dict, str, str]]) -> tuple[int, int]:
+                # Send one $batch (<= 20 deletes) and write a report row per item; returns
+                # (failed, throttled). Items still throttled after the retries are reported as
+                # 'Throttled' and keep the mailbox from being journaled as done, so a resume retries them.
+                batch_requests = []
+                id_to_row = {}
+                id_to_delurl = {}
+                id_to_mode = {}
+                for j, (row_data, _item_id, del_url) in enumerate(chunk, start=1):
+                    req_id = str(j)
+                    id_to_row[req_id] = row_data
+                    id_to_delurl[req_id] = del_url
+
+                    if perm_enabled:
+                        method = "POST"
+                        url_rel = _to_batch_rel(f"{del_url}/permanentDelete")
+                        id_to_mode[req_id] = "perm"
+                    elif soft_enabled:
+                        method = "POST"
+                        url_rel = _to_batch_rel(f"{del_url}/move")
+                        id_to_mode[req_id] = "soft"
+                    else:
+                        method = "DELETE"
+                        url_rel = _to_batch_rel(del_url)
+                        id_to_mode[req_id] = "delete"
+
+                    req = {
+                        "id": req_id,
+                        "method": method,
+                        "url": url_rel,
+                        "headers": {"Content-Type": "application/json"},
+                    }
+                    if soft_enabled:
+                        req["body"] = {"destinationId": "deleteditems"}
+                    batch_requests.append(req)
+
+                # Throttled sub-requests (429/503) are resent on their own after their
+                # Retry-After; the rest of the batch is not repeated.
+                resp_map = {}
+                pending = batch_requests
+                for attempt in range(1, 6):
+                    batch_json = _graph_batch_send(pending)
+                    if not (batch_json and isinstance(batch_json, dict)):
+                        break
+                    throttled: set[str] = set()
+                    retry_wait = 0.0
+                    for r in (batch_json.get('responses') or []):
+                        if isinstance(r, dict) and 'id' in r:
+                            resp_map[str(r.get('id'))] = r
+                            if r.get('status') in (429, 503):
+                                throttled.add(str(r.get('id')))
+                                retry_wait = max(retry_wait, _sub_retry_after(r, attempt))
+                    if not throttled or attempt == 5:
+                        break
+                    for rid in throttled:
+                        # a failed resend then falls back to the single-request path
+                        resp_map.pop(rid, None)
+                    self.log(f"  {len(throttled)} 个批量子请求被限流，{retry_wait:.1f}s 后仅重发这些请求...", is_advanced=True)
+                    ctl = getattr(self, '_concurrency_ctl', None)
+                    if ctl is not None:
+                        ctl.record_throttle(retry_wait)
+                        ctl.wait_if_paused()
+                    else:
+                        time.sleep(retry_wait)
+                    pending = [req for req in batch_requests if req["id"] in throttled]
+
+                for req_id, row_data in id_to_row.items():
+                    r = resp_map.get(req_id)
+                    status = None
+                    if r is not None:
+                        status = r.get('status')
+
+                    # If batch failed entirely, fall back to single-request
+                    if status is None:
+                        del_url = id_to_delurl.get(req_id)
+                        mode = id_to_mode.get(req_id) or "delete"
+                        self.log(f"  正在删除(回退): {row_data.get('Subject', '')}")
+                        if mode == "perm":
+                            del_resp = _graph_request("POST", f"{del_url}/permanentDelete")
+                            ok_codes = (200, 201, 202, 204)
+                        elif mode == "soft":
+                            del_resp = _graph_request("POST", f"{del_url}/move", json_body={"destinationId": "deleteditems"})
+                            ok_codes = (200, 201, 202, 204)
+                        else:
+                            del_resp = _graph_request("DELETE", del_url)
+                            ok_codes = (202, 204)
+
+                        if del_resp.status_code in ok_codes:
+                            row_data['Status'] = 'Success'
+                        elif del_resp.status_code in (429, 503):
+                            row_data['Status'] = 'Throttled'
+                            _append_detail(row_data, f"持续限流，未删除 (状态码: {del_resp.status_code})")
+                        else:
+                            row_data['Status'] = 'Failed'
+                            _append_detail(row_data, f"状态码: {del_resp.status_code}")
+                        with csv_lock:
+                            writer.writerow(row_data)
+                        continue
+
+                    # permanentDelete may be unsupported; fall back
+                    if perm_enabled and status in (404, 405):
+                        del_url = id_to_delurl.get(req_id)
+                        self.log("    ! permanentDelete 不可用，回退普通删除（可能进入 Recoverable Items）。", level="ERROR")
+                        del_resp = _graph_request("DELETE", del_url)
+                        if del_resp.status_code in (204, 202):
+                            row_data['Status'] = 'Success'
+                        else:
+                            row_data['Status'] = 'Failed'
+                            _append_detail(row_data, f"状态码: {del_resp.status_code}")
+                        with csv_lock:
+                            writer.writerow(row_data)
+                        continue
+
+                    # move may be unsupported; fall back
+                    if soft_enabled and status in (404, 405):
+                        del_url = id_to_delurl.get(req_id)
+                        self.log("    ! move 不可用，回退普通删除（可能进入 Recoverable Items）。", level="ERROR")
+                        del_resp = _graph_request("DELETE", del_url)
+                        if del_resp.status_code in (204, 202):
+                            row_data['Status'] = 'Success'
+                            row_data['Details'] = 'move 不可用，已回退 DELETE'
+                        else:
+                            row_data['Status'] = 'Failed'
+                            _append_detail(row_data, f"状态码: {del_resp.status_code}")
+                        with csv_lock:
+                            writer.writerow(row_data)
+                        continue
+
+                    if soft_enabled and status == 400:
+                        try:
+                            body = r.get('body') if isinstance(r, dict) else None
+                            msg = ((body or {}).get('error') or {}).get('message') if isinstance(body, dict) else ''
+                            msg = (msg or '').lower()
+                            if 'destination' in msg and ('same' in msg or 'identical' in msg):
+                                row_data['Status'] = 'Success'
+                                row_data['Details'] = '已在 Deleted Items，无需移动'
+                                with csv_lock:
+                                    writer.writerow(row_data)
+                                continue
+                        except Exception:
+                            pass
+
+                    if status in (204, 202, 200, 201):
+                        row_data['Status'] = 'Success'
+                    elif status in (429, 503):
+                        # still throttled after the last resend: not a failure of the item itself
+                        row_data['Status'] = 'Throttled'
+                        _append_detail(row_data, f"持续限流，未删除 (状态码: {status})")
+                    else:
+                        row_data['Status'] = 'Failed'
+                        _append_detail(row_data, f"状态码: {status}")
+                    with csv_lock:
+                        writer.writerow(row_data)
+                statuses = [row_data.get('Status') for row_data in id_to_row.values()]
+                throttled_count = statuses.count('Throttled')
+                if throttled_count:
+                    throttled_deletes.append(throttled_count)
+                return statuses.count('Failed'), throttled_count
+
+            # Delete engine shared by the email and meeting paths.
+            # Pipeline: this thread keeps paging while consumer threads send the $batch deletes
+            # from a bounded queue, so listing and deleting overlap (the per-mailbox slots of the
+            # rate limiter still cap what is actually in flight).
+            batch_workers = 0 if report_only else max(1, self._safe_int_var(self.graph_batch_concurrency_var, 3))
+            delete_queue: queue.Queue = queue.Queue(maxsize=max(4, batch_workers * 2))
+            delete_errors: list[Exception] = []
+            failed_delete_folders: set[str] = set()  # folders with a delete that did not go through
+            throttled_deletes: list[int] = []  # per chunk: deletes left undone by persistent throttling
+
+            def _delete_consumer():
+                while True:
+                    job = delete_queue.get()
+                    if job is None:
+                        return
+                    try:
+                        job()
+                    except Exception as e:
+                        delete_errors.append(e)
+                        self.log(f"  X 批量删除出错: {e}", "ERROR")
+
+            delete_workers: list[threading.Thread] = []
+            delete_start_lock = threading.Lock()
+
+            def _submit(job):
+                if batch_workers and not delete_workers:
+                    with delete_start_lock:  # folder slices may submit concurrently
+                        # started on first use: report-only and empty scans never spawn consumers
+                        for n in range(batch_workers if not delete_workers else 0):
+                            t = threading.Thread(target=_delete_consumer, name=f"graph-delete-{user}-{n}", daemon=True)
+                            t.start()
+                            delete_workers.append(t)
+                if delete_workers:
+                    delete_queue.put(job)
+                else:
+                    job()
+
+            def _finish_deletes():
+                # Wait until every queued delete chunk has been sent and reported.
+                for _t in delete_workers:
+                    delete_queue.put(None)
+                for _t in delete_workers:
+                    _t.join()
+                delete_workers.clear()
+
+            def _submit_chunk(chunk: list[tuple[dict, str, str]], ckpt: PageCheckpoint | None = None, seq: int = 0,
+                              folder: str = ''):
+                if ckpt is not None:
+                    ckpt.hold(seq)
+
+                def _job():
+                    failed, throttled = _delete_chunk(chunk)
+                    if (failed or throttled) and folder:
+                        failed_delete_folders.add(folder)
+                    # a throttled chunk keeps the resume link before its page, like a chunk that raises
+                    if ckpt is not None and not throttled:
+                        ckpt.release(seq)
+                _submit(_job)
+
             # Meetings: prefer calendarView to expand recurrence into occurrence/exception within a date range
             if target_type == "Meeting" and resource == "calendarView":
                 if not calendar_view_start or not calendar_view_end:
@@ -4142,40 +6944,70 @@ class UniversalEmailCleanerApp:
                         if mapped:
                             base_resources.append(mapped)
 
+                    # Inbox subtree: folder ids are streamed from a background walk so that scanning
+                    # starts on the first folders while deeper levels are still being enumerated.
+                    subtree_queue: queue.Queue | None = None
                     if include_inbox_subtree:
-                        try:
-                            inbox_meta = _graph_get_json(
-                                f"{graph_endpoint}/v1.0/users/{user}/mailFolders/inbox",
-                                params={"$select": "id,childFolderCount"},
-                            )
-                            inbox_id = inbox_meta.get('id')
-                            if not inbox_id:
-                                raise Exception("Inbox id missing")
-                            folder_ids: list[str] = []
-                            q: list[str] = [inbox_id]
-                            while q:
-                                fid = q.pop(0)
-                                folder_ids.append(fid)
-                                kids = _paged_folder_values(
-                                    f"{graph_endpoint}/v1.0/users/{user}/mailFolders/{fid}/childFolders",
-                                    params={"$top": 200, "$select": "id,childFolderCount"},
-                                )
-                                for k in kids:
-                                    kid = k.get('id')
-                                    if kid:
-                                        q.append(kid)
-                            base_resources.extend([f"mailFolders/{fid}/messages" for fid in folder_ids])
-                        except Exception as e:
-                            self.log(f"警告: 无法枚举 Inbox 子文件夹，回退为仅 Inbox。原因: {e}", level="ERROR")
-                            base_resources.append("mailFolders/inbox/messages")
+                        subtree_queue = queue.Queue()
+
+                        def _walk_inbox_subtree():
+                            try:
+                                if _load_cached_folder_index() and (_folder_index.get('wellknown') or {}).get('inbox'):
+                                    children: dict[str, list[str]] = {}
+                                    for fid, meta in (_folder_index.get('folders') or {}).items():
+                                        children.setdefault(meta.get('parent') or '', []).append(fid)
+                                    q: list[str] = [_folder_index['wellknown']['inbox']]
+                                    while q:
+                                        fid = q.pop(0)
+                                        subtree_queue.put(fid)
+                                        q.extend(children.get(fid, []))
+                                else:
+                                    inbox_meta = _graph_get_json(
+                                        f"{graph_endpoint}/v1.0/users/{user}/mailFolders/inbox",
+                                        params={"$select": folder_select},
+                                    )
+                                    if not inbox_meta.get('id'):
+                                        raise Exception("Inbox id missing")
+                                    for f, _path in _walk_folder_levels([(inbox_meta, "")]):
+                                        subtree_queue.put(f['id'])
+                            except Exception as e:
+                                subtree_queue.put(e)
+                            finally:
+                                subtree_queue.put(None)
+
+                        threading.Thread(target=_walk_inbox_subtree, name=f"graph-folders-{user}", daemon=True).start()
 
                     # fallback if nothing selected
-                    if not base_resources:
+                    if not base_resources and not include_inbox_subtree:
                         base_resources = ["mailFolders/inbox/messages"]
 
-                    # de-duplicate while preserving order
-                    _seen_res = set()
-                    base_resources = [r for r in base_resources if not (r in _seen_res or _seen_res.add(r))]
+                    def _iter_resources():
+                        # de-duplicate while preserving order
+                        seen_res: set[str] = set()
+                        for r in base_resources:
+                            if r not in seen_res:
+                                seen_res.add(r)
+                                yield r
+                        if subtree_queue is None:
+                            return
+                        walked = 0
+                        while True:
+                            fid = subtree_queue.get()
+                            if fid is None:
+                                return
+                            if isinstance(fid, Exception):
+                                self.log(f"警告: 无法枚举 Inbox 子文件夹，回退为仅 Inbox。原因: {fid}", level="ERROR")
+                                if walked == 0 and "mailFolders/inbox/messages" not in seen_res:
+                                    yield "mailFolders/inbox/messages"
+                                continue
+                            walked += 1
+                            r = f"mailFolders/{fid}/messages"
+                            if walked == 1 and "mailFolders/inbox/messages" in seen_res:
+                                # the walk starts at the Inbox itself, already selected by name
+                                continue
+                            if r not in seen_res:
+                                seen_res.add(r)
+                                yield r
 
                     # Email listing can be chatty; reduce payload when possible.
                     select_parts = ["id", "subject", "from", "receivedDateTime", "parentFolderId"]
@@ -4188,23 +7020,206 @@ class UniversalEmailCleanerApp:
                     if criteria_recipient:
                         select_parts.append("toRecipients")
                     if body_keyword:
-                        select_parts.append("body")
-                    select_fields = ",".join(select_parts)
-                    params = {"$top": 500, "$select": select_fields}
+                        # Two-phase scan: list with bodyPreview only; full bodies are fetched later for
+                        # the candidates that survive the cheap predicates (see _filter_by_body_keyword).
+                        select_parts.append("bodyPreview")
+                    # Incremental mode: messages/delta accepts neither $filter nor $search,
+                    # so the server-side criteria are re-applied locally on delta pages.
+                    delta_store = getattr(self, '_graph_delta_store', None)
+                    delta_fingerprint = getattr(self, '_graph_delta_fingerprint', '') or ''
+                    delta_tenant = getattr(self, '_graph_delta_tenant', '') or ''
+                    crit_subject = (self.criteria_subject.get() or '').strip().lower()
+                    crit_sender = (self.criteria_sender.get() or '').strip().lower()
+                    crit_msg_id = (self.criteria_msg_id.get() or '').strip()
+                    crit_start = (self.criteria_start_date.get() or '').strip().replace('/', '-')
+                    crit_end = (self.criteria_end_date.get() or '').strip().replace('/', '-')
+                    if delta_store is not None and crit_msg_id and "internetMessageId" not in select_parts:
+                        select_parts.append("internetMessageId")
+
+                    def _email_matches_server_criteria(item: dict) -> bool:
+                        if crit_subject and crit_subject not in (item.get('subject') or '').lower():
+                            return False
+                        if crit_sender:
+                            from_addr = ((item.get('from') or {}).get('emailAddress') or {}).get('address') or ''
+                            if from_addr.strip().lower() != crit_sender:
+                                return False
+                        if crit_msg_id and (item.get('internetMessageId') or '') != crit_msg_id:
+                            return False
+                        received = item.get('receivedDateTime') or ''
+                        if crit_start and received < f"{crit_start}T00:00:00Z":
+                            return False
+                        if crit_end and received > f"{crit_end}T23:59:59Z":
+                            return False
+                        return True
+
+                    def _filter_by_body_keyword(candidates: list[dict]) -> list[dict]:
+                        # bodyPreview is plain text from the start of the body: a hit there is a hit in the
+                        # body. The rest get their body as text through $batch GETs of 20 ids.
+                        kw = body_keyword.lower()
+                        matched: set[str] = set()
+                        pending: list[str] = []
+                        for it in candidates:
+                            if kw in (it.get('bodyPreview') or '').lower():
+                                matched.add(it['id'])
+                            else:
+                                pending.append(it['id'])
+                        text_pref = {"Prefer": 'outlook.body-content-type="text"'}
+                        for i in range(0, len(pending), 20):
+                            chunk = pending[i:i+20]
+                            batch_json = _graph_batch_send([
+                                {"id": str(j), "method": "GET", "url": f"/v1.0/users/{user}/messages/{mid}?$select=body", "headers": text_pref}
+                                for j, mid in enumerate(chunk)
+                            ]) or {}
+                            resp_map = {str(r.get('id')): r for r in (batch_json.get('responses') or []) if isinstance(r, dict)}
+                            for j, mid in enumerate(chunk):
+                                r = resp_map.get(str(j)) or {}
+                                if r.get('status') == 200 and isinstance(r.get('body'), dict):
+                                    body_obj = r['body']
+                                else:
+                                    # throttled/failed sub-request: single GET with the usual retries
+                                    single = _graph_request("GET", f"{graph_endpoint}/v1.0/users/{user}/messages/{mid}",
+                                                            params={"$select": "body"}, extra_headers=text_pref)
+                                    body_obj = single.json() if single.status_code == 200 else {}
+                                content = ((body_obj.get('body') or {}).get('content') or '')
+                                if kw in content.lower():
+                                    matched.add(mid)
+                        if candidates:
+                            self.log(f"  正文匹配: {len(candidates)} 个候选, 预览命中 {len(candidates) - len(pending)}, 获取正文 {len(pending)}, 命中 {len(matched)}", is_advanced=True)
+                        return [it for it in candidates if it['id'] in matched]
+
+                    def _passes_cheap_predicates(item: dict) -> bool:
+                        # Phase 1: cheap predicates on the light listing.
+                        if criteria_has_attachments and not bool(item.get('hasAttachments', False)):
+                            return False
+                        if criteria_recipient:
+                            recipients = []
+                            for rec in (item.get('toRecipients') or []):
+                                addr = ((rec.get('emailAddress') or {}).get('address') or '').strip()
+                                if addr:
+                                    recipients.append(addr)
+                            if not any(criteria_recipient in addr.lower() for addr in recipients):
+                                return False
+                        return True
+
+                    def _emit_rows(survivors: list[dict], server_searched: bool) -> list[tuple[dict, str, str]]:
+                        # Phase 2: body keyword, only for survivors (unless $search already applied it).
+                        if body_keyword and not server_searched:
+                            survivors = _filter_by_body_keyword(survivors)
+                        candidates: list[tuple[dict, str, str]] = []
+                        for item in survivors:
+                            item_id = item['id']
+                            subject = item.get('subject', '无主题')
+                            sender = item.get('from', {}).get('emailAddress', {}).get('address', '未知')
+                            time_val = item.get('receivedDateTime')
+                            item_type = "Email"
+                            folder_name = _resolve_graph_folder_name(item.get('parentFolderId', '')) if 'Folder' in selected_result_fields_set else ''
 
-                    # Iterate each base resource separately (folder scope)
-                    for _res in base_resources:
-                        url = f"{graph_endpoint}/v1.0/users/{user}/{_res}"
+                            row_data = {
+                                'SMTPAddress': user,
+                                'UserPrincipalName': user,
+                                'ItemId': item_id,
+                                'Subject': subject,
+                                'Sender/Organizer': sender,
+                                'Time': time_val,
+                                'Type': item_type,
+                                'Action': 'ReportOnly' if report_only else ('PermanentDelete' if perm_enabled else ('SoftDelete' if soft_enabled else 'Delete')),
+                                'Status': 'Pending',
+                                'Details': ''
+                            }
 
-                        params2 = dict(params or {})
-                        if filter_str:
-                            params2["$filter"] = filter_str
-                        if body_keyword:
-                            params2["$search"] = f'"body:{body_keyword}"'
-                            req_headers["ConsistencyLevel"] = "eventual"
+                            if 'Folder' in selected_result_fields_set:
+                                row_data['Folder'] = folder_name
+                            if 'HasAttachments' in selected_result_fields_set:
+                                row_data['HasAttachments'] = bool(item.get('hasAttachments', False))
+                            if 'Size' in selected_result_fields_set:
+                                row_data['Size'] = item.get('size', '')
+                            if 'MessageId' in selected_result_fields_set:
+                                row_data['MessageId'] = item.get('internetMessageId', '') or ''
+
+                            if report_only:
+                                self.log(f"  [报告] 发现: {subject} ({item_type})")
+                                row_data['Status'] = 'Skipped'
+                                row_data['Details'] = '仅报告模式'
+                            if report_only:
+                                with csv_lock:
+                                    writer.writerow(row_data)
+                            else:
+                                del_url = f"{graph_endpoint}/v1.0/users/{user}/{delete_resource}/{item_id}"
+                                candidates.append((row_data, item_id, del_url))
+                        return candidates
+
+                    select_fields = ",".join(select_parts)
+                    params = {"$top": 500, "$select": select_fields}
 
-                        next_url = url
-                        local_params = params2
+                    pending_delta_links: list[tuple[str, str]] = []
+                    slice_threshold = self._safe_int_var(self.slice_threshold_var, 20000)
+                    slice_workers_cap = max(1, self._safe_int_var(self.graph_mailbox_concurrency_var, 4))
+                    dt_fmt = "%Y-%m-%dT%H:%M:%SZ"
+
+                    def _with_slice(base: str, slice_clause: str) -> str:
+                        return f"{base} and {slice_clause}" if (base and slice_clause) else (base or slice_clause)
+
+                    def _slice_clause(lo: datetime | None, hi: datetime | None) -> str:
+                        parts = []
+                        if lo is not None:
+                            parts.append(f"receivedDateTime ge {lo.strftime(dt_fmt)}")
+                        if hi is not None:
+                            parts.append(f"receivedDateTime lt {hi.strftime(dt_fmt)}")
+                        return " and ".join(parts)
+
+                    def _count_messages(url: str, flt: str) -> int | None:
+                        resp = _graph_request("GET", f"{url}/$count", params={"$filter": flt} if flt else None,
+                                              extra_headers={"ConsistencyLevel": "eventual"})
+                        if resp.status_code != 200:
+                            return None
+                        try:
+                            return int((resp.text or '').strip().lstrip('﻿'))
+                        except ValueError:
+                            return None
+
+                    def _plan_received_slices(_res: str, url: str, base_filter: str) -> list[str] | None:
+                        # Big folders are split into disjoint receivedDateTime ranges by bisection on
+                        # cheap $count probes, so one huge mailbox is paged by several threads.
+                        if slice_threshold <= 0:
+                            return None
+                        total = _count_messages(url, base_filter)
+                        if total is None or total <= slice_threshold:
+                            return None
+                        try:
+                            lo = datetime.strptime(crit_start, "%Y-%m-%d") if crit_start else None
+                            hi = datetime.strptime(crit_end, "%Y-%m-%d") + timedelta(days=1) if crit_end else None
+                        except ValueError:
+                            return None
+                        if lo is None:
+                            lo = datetime(2000, 1, 1)
+                            oldest = _graph_request("GET", url, params={"$orderby": "receivedDateTime asc", "$top": 1, "$select": "receivedDateTime"})
+                            try:
+                                first = (oldest.json().get('value') or [{}])[0].get('receivedDateTime') if oldest.status_code == 200 else None
+                                if first:
+                                    lo = datetime.strptime(first[:19], "%Y-%m-%dT%H:%M:%S")
+                            except Exception:
+                                pass
+                        if hi is None:
+                            hi = datetime.utcnow() + timedelta(days=1)
+                        if hi <= lo:
+                            return None
+                        bounds = bisect_received_slices(lo, hi, lambda a, b: _count_messages(url, _with_slice(base_filter, _slice_clause(a, b))),
+                                                        slice_threshold, total=total)
+                        if len(bounds) < 2:
+                            return None
+                        self.log(f"  {_res}: 约 {total} 封匹配邮件，按接收时间分为 {len(bounds)} 个分片并行扫描", is_advanced=True)
+                        # the outer slices stay open-ended so nothing outside [lo, hi) is missed
+                        return [_slice_clause(None if i == 0 else b_lo, None if i == len(bounds) - 1 else b_hi)
+                                for i, (b_lo, b_hi, _n) in enumerate(bounds)]
+
+                    def _scan_pages(_res: str, url: str, next_url: str, local_params: dict | None, use_delta: bool,
+                                    extra_headers: dict | None, ckpt: PageCheckpoint | None, slice_clause: str = ''):
+                        base_filter = (local_params or {}).get("$filter", "")
+                        if slice_clause:
+                            local_params = dict(local_params or {})
+                            local_params["$filter"] = _with_slice(base_filter, slice_clause)
+                        delta_restarted = False
+                        server_searched = (not use_delta) and "$search" in (local_params or {})
                         while next_url:
                             graph_log_level = self.log_level_var.get()
                             if graph_log_level in ("Advanced", "Expert"):
@@ -4215,226 +7230,172 @@ class UniversalEmailCleanerApp:
                                     self.logger.log_to_file_only(f"PARAMS: {json.dumps(local_params, default=str)}")
 
                             self.log(f"请求: GET {next_url} | 参数: {local_params}", is_advanced=True)
-                            resp = _graph_request("GET", next_url, params=local_params if "users" in next_url and "?" not in next_url else None)
+                            resp = _graph_request("GET", next_url, params=local_params if "users" in next_url and "?" not in next_url else None,
+                                                  extra_headers=extra_headers, stream=True)
 
                             if graph_log_level in ("Advanced", "Expert"):
                                 self.logger.log_to_file_only(f"GRAPH RESP: {resp.status_code}")
                                 self.logger.log_to_file_only(f"HEADERS: {json.dumps(dict(resp.headers), default=str)}")
-                                body_text = resp.text or ""
-                                if graph_log_level == "Advanced":
-                                    body_text = body_text[:4096]
-                                else:
-                                    body_text = body_text[:50000]
-                                self.logger.log_to_file_only(f"BODY: {body_text}")
+                                # a 200 body is streamed below; reading resp.text here would load it whole
+                                if resp.status_code != 200:
+                                    body_text = resp.text or ""
+                                    if graph_log_level == "Advanced":
+                                        body_text = body_text[:4096]
+                                    else:
+                                        body_text = body_text[:50000]
+                                    self.logger.log_to_file_only(f"BODY: {body_text}")
+
+                            if (resp.status_code == 400 and query_plan is not None and local_params and not use_delta
+                                    and query_plan.fallback_after_reject(base_filter)):
+                                self.log(f"  服务器拒绝部分筛选条件 (400)，改由客户端筛选。新计划: {query_plan.describe()}", is_advanced=True)
+                                local_params = dict(local_params)
+                                local_params.pop("$filter", None)
+                                base_filter = query_plan.current_filter()
+                                if _with_slice(base_filter, slice_clause):
+                                    local_params["$filter"] = _with_slice(base_filter, slice_clause)
+                                continue
+
+                            if use_delta and resp.status_code == 410 and not delta_restarted:
+                                # syncStateNotFound / token expired: drop the link and resync from scratch
+                                self.log(f"  增量令牌已过期 (410)，{_res} 回退为完整扫描。")
+                                delta_store.discard(delta_tenant, user, _res)
+                                delta_restarted = True
+                                next_url = f"{url}/delta"
+                                local_params = {"$select": select_fields}
+                                continue
 
                             if resp.status_code != 200:
                                 self.log(f"  X 查询失败: {resp.text}", "ERROR")
                                 self.log(f"响应: {resp.text}", is_advanced=True)
                                 with csv_lock:
                                     writer.writerow({'SMTPAddress': user, 'UserPrincipalName': user, 'Status': 'Error', 'Details': resp.text})
-                                break
-
-                            data = resp.json()
-                            items = data.get('value', [])
-
-                            if not items:
-                                self.log("  未找到匹配项。")
-                                break
-
-                            perm_enabled = bool(permanent_delete and target_type == "Email" and str(delete_resource).lower() == "messages")
-                            soft_enabled = bool((not perm_enabled) and (target_type == "Email") and bool(soft_delete) and str(delete_resource).lower() == "messages")
-
-                            delete_candidates: list[tuple[dict, str, str]] = []  # (row_data, item_id, del_url)
-                            for item in items:
-                                should_delete = True
-                                if body_keyword and "$search" not in (local_params or {}):
-                                    content = item.get('body', {}).get('content', '')
-                                    if body_keyword.lower() not in content.lower():
-                                        should_delete = False
-
-                                if should_delete:
-                                    if criteria_has_attachments and not bool(item.get('hasAttachments', False)):
+                                return False
+
+                            # Items are decoded from the response stream one at a time and flow straight
+                            # through the predicates; only the survivors are kept. Rows and delete chunks
+                            # (body-keyword $batch, folder lookups, a blocking queue put) wait until the
+                            # page is closed, so slow deletes cannot stall an open response.
+                            page = GraphPageStream(resp)
+                            seq = ckpt.open_page() if ckpt is not None else 0
+                            survivors: list[dict] = []
+                            try:
+                                for item in page:
+                                    if use_delta and ('@removed' in item or not _email_matches_server_criteria(item)):
+                                        # Removed items carry only '@removed'; unchanged items are never returned.
                                         continue
-
-                                    if criteria_recipient:
-                                        recipients = []
-                                        for rec in (item.get('toRecipients') or []):
-                                            addr = ((rec.get('emailAddress') or {}).get('address') or '').strip()
-                                            if addr:
-                                                recipients.append(addr)
-                                        if not any(criteria_recipient in addr.lower() for addr in recipients):
-                                            continue
-
-                                    item_id = item['id']
-                                    subject = item.get('subject', '无主题')
-                                    sender = item.get('from', {}).get('emailAddress', {}).get('address', '未知')
-                                    time_val = item.get('receivedDateTime')
-                                    item_type = "Email"
-                                    folder_name = _resolve_graph_folder_name(item.get('parentFolderId', ''))
-
-                                    row_data = {
-                                        'SMTPAddress': user,
-                                        'UserPrincipalName': user,
-                                        'ItemId': item_id,
-                                        'Subject': subject,
-                                        'Sender/Organizer': sender,
-                                        'Time': time_val,
-                                        'Type': item_type,
-                                        'Action': 'ReportOnly' if report_only else ('PermanentDelete' if perm_enabled else ('SoftDelete' if soft_enabled else 'Delete')),
-                                        'Status': 'Pending',
-                                        'Details': ''
-                                    }
-
-                                    if 'Folder' in selected_result_fields_set:
-                                        row_data['Folder'] = folder_name
-                                    if 'HasAttachments' in selected_result_fields_set:
-                                        row_data['HasAttachments'] = bool(item.get('hasAttachments', False))
-                                    if 'Size' in selected_result_fields_set:
-                                        row_data['Size'] = item.get('size', '')
-                                    if 'MessageId' in selected_result_fields_set:
-                                        row_data['MessageId'] = item.get('internetMessageId', '') or ''
-
-                                    if report_only:
-                                        self.log(f"  [报告] 发现: {subject} ({item_type})")
-                                        row_data['Status'] = 'Skipped'
-                                        row_data['Details'] = '仅报告模式'
-                                    if report_only:
-                                        with csv_lock:
-                                            writer.writerow(row_data)
-                                    else:
-                                        del_url = f"{graph_endpoint}/v1.0/users/{user}/{delete_resource}/{item_id}"
-                                        delete_candidates.append((row_data, item_id, del_url))
+                                    if _passes_cheap_predicates(item):
+                                        survivors.append(item)
+                            finally:
+                                page.close()
+                            delete_candidates: list[tuple[dict, str, str]] = []  # (row_data, item_id, del_url)
+                            for i in range(0, len(survivors), 20):
+                                delete_candidates.extend(_emit_rows(survivors[i:i+20], server_searched))
+
+                            if not use_delta and page.count == 0:
+                                if not slice_clause:
+                                    self.log("  未找到匹配项。")
+                                if ckpt is not None:
+                                    ckpt.release(seq, '')
+                                break
 
                             # If we are deleting, use Graph $batch (20 req per call)
                             if (not report_only) and delete_candidates:
-                                # Chunk into batches of 20
                                 for i in range(0, len(delete_candidates), 20):
-                                    chunk = delete_candidates[i:i+20]
-                                    batch_requests = []
-                                    id_to_row = {}
-                                    id_to_delurl = {}
-                                    id_to_mode = {}
-                                    for j, (row_data, _item_id, del_url) in enumerate(chunk, start=1):
-                                        req_id = str(j)
-                                        id_to_row[req_id] = row_data
-                                        id_to_delurl[req_id] = del_url
-
-                                        if perm_enabled:
-                                            method = "POST"
-                                            url_rel = _to_batch_rel(f"{del_url}/permanentDelete")
-                                            id_to_mode[req_id] = "perm"
-                                        elif soft_enabled:
-                                            method = "POST"
-                                            url_rel = _to_batch_rel(f"{del_url}/move")
-                                            id_to_mode[req_id] = "soft"
-                                        else:
-                                            method = "DELETE"
-                                            url_rel = _to_batch_rel(del_url)
-                                            id_to_mode[req_id] = "delete"
-
-                                        req = {
-                                            "id": req_id,
-                                            "method": method,
-                                            "url": url_rel,
-                                            "headers": {"Content-Type": "application/json"},
-                                        }
-                                        if soft_enabled:
-                                            req["body"] = {"destinationId": "deleteditems"}
-                                        batch_requests.append(req)
-
-                                    batch_json = _graph_batch_send(batch_requests)
-                                    resp_map = {}
-                                    if batch_json and isinstance(batch_json, dict):
-                                        for r in (batch_json.get('responses') or []):
-                                            if isinstance(r, dict) and 'id' in r:
-                                                resp_map[str(r.get('id'))] = r
-
-                                    for req_id, row_data in id_to_row.items():
-                                        r = resp_map.get(req_id)
-                                        status = None
-                                        if r is not None:
-                                            status = r.get('status')
-
-                                        # If batch failed entirely, fall back to single-request
-                                        if status is None:
-                                            del_url = id_to_delurl.get(req_id)
-                                            mode = id_to_mode.get(req_id) or "delete"
-                                            self.log(f"  正在删除(回退): {row_data.get('Subject', '')}")
-                                            if mode == "perm":
-                                                del_resp = _graph_request("POST", f"{del_url}/permanentDelete")
-                                                ok_codes = (200, 201, 202, 204)
-                                            elif mode == "soft":
-                                                del_resp = _graph_request("POST", f"{del_url}/move", json_body={"destinationId": "deleteditems"})
-                                                ok_codes = (200, 201, 202, 204)
-                                            else:
-                                                del_resp = _graph_request("DELETE", del_url)
-                                                ok_codes = (202, 204)
-
-                                            if del_resp.status_code in ok_codes:
-                                                row_data['Status'] = 'Success'
-                                            else:
-                                                row_data['Status'] = 'Failed'
-                                                row_data['Details'] = f"状态码: {del_resp.status_code}"
-                                            with csv_lock:
-                                                writer.writerow(row_data)
-                                            continue
-
-                                        # permanentDelete may be unsupported; fall back
-                                        if perm_enabled and status in (404, 405):
-                                            del_url = id_to_delurl.get(req_id)
-                                            self.log("    ! permanentDelete 不可用，回退普通删除（可能进入 Recoverable Items）。", level="ERROR")
-                                            del_resp = _graph_request("DELETE", del_url)
-                                            if del_resp.status_code in (204, 202):
-                                                row_data['Status'] = 'Success'
-                                            else:
-                                                row_data['Status'] = 'Failed'
-                                                row_data['Details'] = f"状态码: {del_resp.status_code}"
-                                            with csv_lock:
-                                                writer.writerow(row_data)
-                                            continue
-
-                                        # move may be unsupported; fall back
-                                        if soft_enabled and status in (404, 405):
-                                            del_url = id_to_delurl.get(req_id)
-                                            self.log("    ! move 不可用，回退普通删除（可能进入 Recoverable Items）。", level="ERROR")
-                                            del_resp = _graph_request("DELETE", del_url)
-                                            if del_resp.status_code in (204, 202):
-                                                row_data['Status'] = 'Success'
-                                                row_data['Details'] = 'move 不可用，已回退 DELETE'
-                                            else:
-                                                row_data['Status'] = 'Failed'
-                                                row_data['Details'] = f"状态码: {del_resp.status_code}"
-                                            with csv_lock:
-                                                writer.writerow(row_data)
-                                            continue
-
-                                        if soft_enabled and status == 400:
-                                            try:
-                                                body = r.get('body') if isinstance(r, dict) else None
-                                                msg = ((body or {}).get('error') or {}).get('message') if isinstance(body, dict) else ''
-                                                msg = (msg or '').lower()
-                                                if 'destination' in msg and ('same' in msg or 'identical' in msg):
-                                                    row_data['Status'] = 'Success'
-                                                    row_data['Details'] = '已在 Deleted Items，无需移动'
-                                                    with csv_lock:
-                                                        writer.writerow(row_data)
-                                                    continue
-                                            except Exception:
-                                                pass
-
-                                        if status in (204, 202, 200, 201):
-                                            row_data['Status'] = 'Success'
-                                        else:
-                                            row_data['Status'] = 'Failed'
-                                            row_data['Details'] = f"状态码: {status}"
-                                        with csv_lock:
-                                            writer.writerow(row_data)
-
-                            next_url = data.get('@odata.nextLink')
+                                    _submit_chunk(delete_candidates[i:i+20], ckpt, seq, _res)
+
+                            next_url = page.annotations.get('@odata.nextLink')
                             local_params = None
+                            if ckpt is not None:
+                                ckpt.release(seq, next_url or '')
+                            if use_delta and not next_url and page.annotations.get('@odata.deltaLink'):
+                                # Only the last page carries the deltaLink; save it once the deletes have run.
+                                pending_delta_links.append((_res, page.annotations.get('@odata.deltaLink')))
+                        return True
+
+                    def _scan_slices(_res: str, url: str, local_params: dict, slices: list[str]) -> bool:
+                        # Slices are paged concurrently; the per-mailbox slots of the rate limiter
+                        # still cap what is in flight for this mailbox.
+                        with ThreadPoolExecutor(max_workers=min(len(slices), slice_workers_cap)) as slice_pool:
+                            futures = [slice_pool.submit(_scan_pages, _res, url, url, local_params, False, None, None, clause)
+                                       for clause in slices]
+                            ok = True
+                            for fut in futures:
+                                try:
+                                    ok = fut.result() and ok
+                                except Exception as e:
+                                    ok = False
+                                    self.log(f"  X 分片扫描出错: {e}", "ERROR")
+                        return ok
+
+                    # Iterate each base resource separately (folder scope); a folder whose scan failed
+                    # keeps the mailbox from being reported (and journaled) as done.
+                    scan_failed = False
+                    try:
+                        for _res in _iter_resources():
+                            url = f"{graph_endpoint}/v1.0/users/{user}/{_res}"
+                            ckpt = None
+                            resume_state = None
+                            if journal is not None:
+                                resume_state = journal.folder_state(journal_run, user, _res)
+                                if resume_state and resume_state[0] == 'done':
+                                    self.log(f"  续跑: {_res} 已完成，跳过。", is_advanced=True)
+                                    continue
+                                ckpt = PageCheckpoint(functools.partial(journal.save_folder_link, journal_run, user, _res))
+
+                            params2 = dict(params or {})
+                            use_delta = delta_store is not None
+                            extra_headers = None
+                            if use_delta:
+                                extra_headers = {"Prefer": "odata.maxpagesize=500"}
+                                saved_link = delta_store.get(delta_tenant, user, _res, delta_fingerprint)
+                                if saved_link:
+                                    self.log(f"  增量扫描: {_res} (使用上次的 deltaLink)", is_advanced=True)
+                                    next_url = saved_link
+                                    local_params = None
+                                else:
+                                    self.log(f"  增量扫描: {_res} 无可用 deltaLink，执行完整同步。", is_advanced=True)
+                                    next_url = f"{url}/delta"
+                                    local_params = {"$select": select_fields}
+                            else:
+                                if filter_str:
+                                    params2["$filter"] = query_plan.current_filter() if query_plan is not None else filter_str
+                                if body_keyword:
+                                    params2["$search"] = f'"body:{body_keyword}"'
+                                    req_headers["ConsistencyLevel"] = "eventual"
+                                next_url = url
+                                local_params = params2
+                            if resume_state and resume_state[1]:
+                                self.log(f"  续跑: {_res} 从上次中断的分页继续。", is_advanced=True)
+                                next_url = resume_state[1]
+                                local_params = None
+                            elif not use_delta and "$search" not in local_params:
+                                # $search cannot be combined with a date $filter; delta pages have no filter at all.
+                                # A sliced folder is journaled as a whole, once every slice has finished.
+                                slices = _plan_received_slices(_res, url, local_params.get("$filter", ""))
+                                if slices:
+                                    if not _scan_slices(_res, url, local_params, slices):
+                                        scan_failed = True
+                                    elif journal is not None:
+                                        journal.save_folder_link(journal_run, user, _res, '')
+                                    continue
+
+                            if not _scan_pages(_res, url, next_url, local_params, use_delta, extra_headers, ckpt):
+                                scan_failed = True
+                    finally:
+                        _finish_deletes()
+                    if not delete_errors:
+                        # A folder with failed deletes keeps its previous link: the new one would never
+                        # return those unchanged messages again, so a rerun could not retry them.
+                        for _res, link in pending_delta_links:
+                            if _res in failed_delete_folders:
+                                self.log(f"  {_res} 有删除失败的项，保留上次的 deltaLink。", is_advanced=True)
+                                continue
+                            delta_store.put(delta_tenant, user, _res, delta_fingerprint, link)
 
+                    if throttled_deletes:
+                        self.log(f"  {sum(throttled_deletes)} 个删除请求持续被限流未完成，邮箱不标记为完成，续跑时重新处理。", "ERROR")
                     # Email handled above; return to avoid running legacy single-resource path
-                    return
+                    return not delete_errors and not scan_failed and not throttled_deletes
 
             if filter_str: params["$filter"] = filter_str
             
@@ -4442,43 +7403,195 @@ class UniversalEmailCleanerApp:
                 params["$search"] = f'"body:{body_keyword}"'
                 req_headers["ConsistencyLevel"] = "eventual"
             
-            while url:
-                graph_log_level = self.log_level_var.get()
-                if graph_log_level in ("Advanced", "Expert"):
-                    save_auth = bool(graph_log_level == "Expert" and getattr(self, 'graph_save_auth_token_var', None) and self.graph_save_auth_token_var.get())
-                    self.logger.log_to_file_only(f"GRAPH REQ: GET {url}")
-                    self.logger.log_to_file_only(f"HEADERS: {json.dumps(redact_sensitive_headers(req_headers, save_authorization=save_auth), default=str)}")
-                    if params:
-                        self.logger.log_to_file_only(f"PARAMS: {json.dumps(params, default=str)}")
+            # set by any failed page query (also from the calendarView window threads)
+            query_failed = threading.Event()
+
+            def _page_chain(page_url: str, page_params: dict | None):
+                # Pages through one collection and yields each page's items; query errors go to the
+                # report and set query_failed, so the mailbox is not counted as done.
+                while page_url:
+                    graph_log_level = self.log_level_var.get()
+                    if graph_log_level in ("Advanced", "Expert"):
+                        save_auth = bool(graph_log_level == "Expert" and getattr(self, 'graph_save_auth_token_var', None) and self.graph_save_auth_token_var.get())
+                        self.logger.log_to_file_only(f"GRAPH REQ: GET {page_url}")
+                        self.logger.log_to_file_only(f"HEADERS: {json.dumps(redact_sensitive_headers(req_headers, save_authorization=save_auth), default=str)}")
+                        if page_params:
+                            self.logger.log_to_file_only(f"PARAMS: {json.dumps(page_params, default=str)}")
+
+                    self.log(f"请求: GET {page_url} | 参数: {page_params}", is_advanced=True)
+                    resp = _graph_request("GET", page_url, params=page_params if "users" in page_url and "?" not in page_url else None) # Simple check to avoid double params
+
+                    if graph_log_level in ("Advanced", "Expert"):
+                        self.logger.log_to_file_only(f"GRAPH RESP: {resp.status_code}")
+                        self.logger.log_to_file_only(f"HEADERS: {json.dumps(dict(resp.headers), default=str)}")
+                        body_text = resp.text or ""
+                        if graph_log_level == "Advanced":
+                            body_text = body_text[:4096]
+                        else:
+                            body_text = body_text[:50000]
+                        self.logger.log_to_file_only(f"BODY: {body_text}")
+
+                    if (resp.status_code == 400 and query_plan is not None and page_params
+                            and query_plan.fallback_after_reject(page_params.get("$filter", ""))):
+                        self.log(f"  服务器拒绝部分筛选条件 (400)，改由客户端筛选。新计划: {query_plan.describe()}", is_advanced=True)
+                        page_params = dict(page_params)
+                        page_params.pop("$filter", None)
+                        if query_plan.current_filter():
+                            page_params["$filter"] = query_plan.current_filter()
+                        continue
 
-                self.log(f"请求: GET {url} | 参数: {params}", is_advanced=True)
-                resp = _graph_request("GET", url, params=params if "users" in url and "?" not in url else None) # Simple check to avoid double params
-                
-                if graph_log_level in ("Advanced", "Expert"):
-                    self.logger.log_to_file_only(f"GRAPH RESP: {resp.status_code}")
-                    self.logger.log_to_file_only(f"HEADERS: {json.dumps(dict(resp.headers), default=str)}")
-                    body_text = resp.text or ""
-                    if graph_log_level == "Advanced":
-                        body_text = body_text[:4096]
-                    else:
-                        body_text = body_text[:50000]
-                    self.logger.log_to_file_only(f"BODY: {body_text}")
-                
-                if resp.status_code != 200:
-                    self.log(f"  X 查询失败: {resp.text}", "ERROR")
-                    self.log(f"响应: {resp.text}", is_advanced=True)
-                    with csv_lock:
-                        writer.writerow({'SMTPAddress': user, 'UserPrincipalName': user, 'Status': 'Error', 'Details': resp.text})
-                    break
-                
-                data = resp.json()
-                items = data.get('value', [])
-                
-                if not items:
-                    self.log("  未找到匹配项。")
-                    break
+                    if resp.status_code != 200:
+                        self.log(f"  X 查询失败: {resp.text}", "ERROR")
+                        self.log(f"响应: {resp.text}", is_advanced=True)
+                        with csv_lock:
+                            writer.writerow({'SMTPAddress': user, 'UserPrincipalName': user, 'Status': 'Error', 'Details': resp.text})
+                        query_failed.set()
+                        return
+
+                    data = resp.json()
+                    items = data.get('value', [])
+                    if not items:
+                        return
+                    yield items
+                    page_url = data.get('@odata.nextLink')
+                    # Reset params for next link as they are usually included
+                    page_params = None
+
+            def _parallel_window_pages(windows: list[tuple[str, str]]):
+                # calendarView windows are paged concurrently (the per-mailbox slots of the rate
+                # limiter cap what is in flight); pages are handed over as they arrive.
+                pages_q: queue.Queue = queue.Queue(maxsize=8)
+                stop = threading.Event()
+
+                def _fetch_window(w_start: str, w_end: str):
+                    try:
+                        w_params = dict(params or {})
+                        w_params["startDateTime"] = w_start
+                        w_params["endDateTime"] = w_end
+                        for page_items in _page_chain(url, w_params):
+                            while not stop.is_set():
+                                try:
+                                    pages_q.put(page_items, timeout=0.5)
+                                    break
+                                except queue.Full:
+                                    continue
+                            if stop.is_set():
+                                return
+                    except Exception as e:
+                        query_failed.set()
+                        self.log(f"  X 日历窗口 {w_start} ~ {w_end} 查询出错: {e}", "ERROR")
+                    finally:
+                        while not stop.is_set():
+                            try:
+                                pages_q.put(None, timeout=0.5)
+                                break
+                            except queue.Full:
+                                continue
+
+                window_workers = max(1, min(len(windows), self._safe_int_var(self.graph_mailbox_concurrency_var, 4)))
+                executor = ThreadPoolExecutor(max_workers=window_workers)
+                try:
+                    for w_start, w_end in windows:
+                        executor.submit(_fetch_window, w_start, w_end)
+                    remaining = len(windows)
+                    while remaining:
+                        page_items = pages_q.get()
+                        if page_items is None:
+                            remaining -= 1
+                            continue
+                        yield page_items
+                finally:
+                    stop.set()
+                    executor.shutdown(wait=True)
 
-                for item in items:
+            series_cache = getattr(self, '_graph_series_cache', None)
+            if series_cache is None:
+                series_cache = self._graph_series_cache = SeriesMasterCache()
+
+            def _item_clean_goid(item: dict) -> str:
+                try:
+                    props = item.get('singleValueExtendedProperties') or []
+                    return clean_goid_from_goid_hex(decode_graph_goid_base64_to_hex(props[0].get('value', '') if props else ''))
+                except Exception:
+                    return ''
+
+            def _is_instance(item: dict) -> bool:
+                t = str(item.get('type') or '').lower()
+                return ('occurrence' in t or 'exception' in t) and bool(item.get('seriesMasterId'))
+
+            def _prefetch_series_masters(page_items: list[dict]):
+                # Resolve the distinct series masters of a page together ($batch of 20); series already
+                # known through another attendee (same clean GOID) are not fetched again.
+                need: dict[str, set[str]] = {}
+                for it in page_items:
+                    if not _is_instance(it):
+                        continue
+                    mid = it['seriesMasterId']
+                    clean = _item_clean_goid(it)
+                    if series_cache.get_series(clean) is not SeriesMasterCache.MISSING:
+                        continue
+                    if series_cache.get_master(user, mid) is not SeriesMasterCache.MISSING:
+                        continue
+                    need.setdefault(mid, set()).add(clean)
+                fetch: list[str] = []
+                claimed: list[str] = []
+                waiting: list[str] = []
+                for mid, cleans in need.items():
+                    keys = [c for c in cleans if c]
+                    if keys and not series_cache.claim(keys[0]):
+                        waiting.append(keys[0])
+                        continue
+                    claimed.extend(keys[:1])
+                    fetch.append(mid)
+                try:
+                    for i in range(0, len(fetch), 20):
+                        chunk = fetch[i:i+20]
+                        batch_json = _graph_batch_send([
+                            {"id": str(j), "method": "GET", "url": f"/v1.0/users/{user}/events/{mid}?$select=id,type,recurrence,iCalUId"}
+                            for j, mid in enumerate(chunk)
+                        ]) or {}
+                        resp_map = {str(r.get('id')): r for r in (batch_json.get('responses') or []) if isinstance(r, dict)}
+                        for j, mid in enumerate(chunk):
+                            r = resp_map.get(str(j)) or {}
+                            if r.get('status') == 200 and isinstance(r.get('body'), dict):
+                                series_cache.put(user, mid, r['body'].get('recurrence'), need.get(mid, ()))
+                            elif r.get('status') in (403, 404):
+                                series_cache.put(user, mid, None)
+                            # other failures (throttling etc.) fall back to the per-item GET
+                finally:
+                    for key in claimed:
+                        series_cache.release(key)
+                for key in waiting:
+                    series_cache.wait(key)
+                if need:
+                    self.log(f"  系列主会议: 本页 {len(need)} 个, 批量获取 {len(fetch)}, 共享等待 {len(waiting)}", is_advanced=True)
+
+            def _iter_meeting_items():
+                windows = []
+                if resource == "calendarView":
+                    windows = split_calendar_view_windows(calendar_view_start, calendar_view_end,
+                                                          self._safe_int_var(self.calendar_window_days_var, 30))
+                if len(windows) > 1:
+                    self.log(f"  calendarView 按 {len(windows)} 个时间窗口并行获取", is_advanced=True)
+                    page_source = _parallel_window_pages(windows)
+                else:
+                    page_source = _page_chain(url, params)
+                # occurrences straddling a window boundary are returned by both windows
+                seen_ids: set[str] = set()
+                for page_items in page_source:
+                    _prefetch_series_masters(page_items)
+                    for item in page_items:
+                        item_id = item.get('id')
+                        if item_id in seen_ids:
+                            continue
+                        seen_ids.add(item_id)
+                        yield item
+
+            found_any = False
+            meeting_candidates: list[tuple[dict, str, str]] = []  # (row_data, item_id, del_url)
+            try:
+                for item in _iter_meeting_items():
+                    found_any = True
                     should_delete = True
 
                     # Client-side filtering for meetings (Graph rejects combined $filter on events/calendarView)
@@ -4520,7 +7633,7 @@ class UniversalEmailCleanerApp:
                     if should_delete:
                         item_id = item['id']
                         subject = item.get('subject', '无主题')
-                        
+
                         if target_type == "Email":
                             sender = item.get('from', {}).get('emailAddress', {}).get('address', '未知')
                             time_val = item.get('receivedDateTime')
@@ -4571,7 +7684,7 @@ class UniversalEmailCleanerApp:
                             meeting_goid = ical_uid or ''
                             clean_goid = (meeting_goid or item_id).strip().lower()
 
-                            if criteria_goid and criteria_goid.lower() not in meeting_goid.lower():
+                            if criteria_goid and not goid_matches(criteria_goid, meeting_goid, criteria_goid_exact):
                                 continue
                             if criteria_clean_goid and criteria_clean_goid not in clean_goid:
                                 continue
@@ -4628,23 +7741,20 @@ class UniversalEmailCleanerApp:
                             # pull recurrence from master (cache per user) to align with EWS report.
                             try:
                                 if (item_type in ('occurrence', 'exception') or 'occurrence' in str(item_type).lower() or 'exception' in str(item_type).lower()) and series_master_id:
-                                    if not hasattr(self, '_graph_master_cache'):
-                                        self._graph_master_cache = {}
-                                    user_cache = self._graph_master_cache.setdefault(user, {})
-                                    if series_master_id not in user_cache:
+                                    item_clean_goid = clean_goid_from_goid_hex(goid_hex)
+                                    rec = series_cache.get_series(item_clean_goid)
+                                    if rec is SeriesMasterCache.MISSING:
+                                        rec = series_cache.get_master(user, series_master_id)
+                                    if rec is SeriesMasterCache.MISSING:
                                         master_url = f"{graph_endpoint}/v1.0/users/{user}/events/{series_master_id}"
                                         master_params = {
                                             "$select": "id,type,recurrence,iCalUId",
                                         }
                                         # Use pooled session + retry
                                         m_resp = _graph_request("GET", master_url, params=master_params)
-                                        if m_resp.status_code == 200:
-                                            user_cache[series_master_id] = m_resp.json()
-                                        else:
-                                            user_cache[series_master_id] = None
-                                    master_obj = user_cache.get(series_master_id)
-                                    if master_obj and master_obj.get('recurrence'):
-                                        rec = master_obj.get('recurrence')
+                                        rec = (m_resp.json() or {}).get('recurrence') if m_resp.status_code == 200 else None
+                                        series_cache.put(user, series_master_id, rec, (item_clean_goid,) if m_resp.status_code == 200 else ())
+                                    if rec:
                                         pattern = (rec.get('pattern') or {})
                                         rng = (rec.get('range') or {})
                                         p_name, p_details = format_graph_recurrence_pattern(pattern)
@@ -4684,51 +7794,37 @@ class UniversalEmailCleanerApp:
                             row_data['Status'] = 'Skipped'
                             row_data['Details'] = ((row_data.get('Details') + '; ') if row_data.get('Details') else '') + '仅报告模式'
                         else:
-                            self.log(f"  正在删除: {subject}")
+                            # Meeting deletes go through the shared $batch engine (20 per call, concurrent,
+                            # with per-item fallback); it writes the report row once the batch returns.
                             del_url = f"{graph_endpoint}/v1.0/users/{user}/{delete_resource}/{item_id}"
-                            
-                            if graph_log_level in ("Advanced", "Expert"):
-                                save_auth = bool(graph_log_level == "Expert" and getattr(self, 'graph_save_auth_token_var', None) and self.graph_save_auth_token_var.get())
-                                self.logger.log_to_file_only(f"GRAPH REQ: DELETE {del_url}")
-                                self.logger.log_to_file_only(f"HEADERS: {json.dumps(redact_sensitive_headers(req_headers, save_authorization=save_auth), default=str)}")
+                            meeting_candidates.append((row_data, item_id, del_url))
+                            if len(meeting_candidates) >= 20:
+                                _submit(functools.partial(_delete_chunk, meeting_candidates[:20]))
+                                meeting_candidates = []
+                            continue
 
-                            self.log(f"请求: DELETE {del_url}", is_advanced=True)
-                            del_resp = _graph_request("DELETE", del_url)
-                            
-                            if graph_log_level in ("Advanced", "Expert"):
-                                self.logger.log_to_file_only(f"GRAPH RESP: {del_resp.status_code}")
-                                body_text = del_resp.text or ""
-                                if graph_log_level == "Advanced":
-                                    body_text = body_text[:4096]
-                                else:
-                                    body_text = body_text[:50000]
-                                self.logger.log_to_file_only(f"BODY: {body_text}")
-                            
-                            if del_resp.status_code == 204:
-                                self.log("    √ 已删除")
-                                row_data['Status'] = 'Success'
-                            else:
-                                self.log(f"    X 删除失败: {del_resp.status_code}", "ERROR")
-                                self.log(f"响应: {del_resp.text}", is_advanced=True)
-                                row_data['Status'] = 'Failed'
-                                err_detail = f"状态码: {del_resp.status_code}"
-                                row_data['Details'] = ((row_data.get('Details') + '; ') if row_data.get('Details') else '') + err_detail
-                        
                         with csv_lock:
                             writer.writerow(row_data)
                             # csvfile.flush() # Flush handled by main loop or context manager
-
-                url = data.get('@odata.nextLink')
-                # Reset params for next link as they are usually included
-                params = None 
+                if meeting_candidates:
+                    _submit(functools.partial(_delete_chunk, meeting_candidates))
+            finally:
+                _finish_deletes()
+
+            if not found_any and not query_failed.is_set():
+                self.log("  未找到匹配项。")
+            if throttled_deletes:
+                self.log(f"  {sum(throttled_deletes)} 个删除请求持续被限流未完成，邮箱不标记为完成，续跑时重新处理。", "ERROR")
+            return not delete_errors and not query_failed.is_set() and not throttled_deletes
                 
         except Exception as ue:
             self.log(f"  X 处理用户出错: {ue}", "ERROR")
             with csv_lock:
                 writer.writerow({'SMTPAddress': user, 'UserPrincipalName': user, 'Status': 'Error', 'Details': str(ue)})
+            return False
 
     # --- Graph Logic ---
-    def run_graph_cleanup(self):
+    def run_graph_cleanup(self, resume: bool = False, lease_dir: str | None = None):
         try:
             app_id = self.app_id_var.get()
             tenant_id = self.tenant_id_var.get()
@@ -4740,7 +7836,11 @@ class UniversalEmailCleanerApp:
             graph_endpoint = "https://microsoftgraph.chinacloudapi.cn" if env == "China" else "https://graph.microsoft.com"
 
             self.log(">>> 正在获取 Access Token...")
-            token = self._get_graph_access_token(auth_mode, tenant_id, app_id, thumbprint, client_secret, env)
+            # Workers pull the current token from the manager per request, so long runs
+            # survive token expiry; the headers below only carry the initial value.
+            token_mgr = self._new_graph_token_manager(auth_mode, tenant_id, app_id, thumbprint, client_secret, env)
+            self._graph_token_manager = token_mgr
+            token = token_mgr.get()
                 
             if not token: raise Exception("获取 Token 失败")
             
@@ -4750,16 +7850,20 @@ class UniversalEmailCleanerApp:
             users = self._get_target_users()
             
             self.log(f">>> 找到 {len(users)} 个用户")
-            self._progress_reset(len(users))
 
             # Report File
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             report_path = os.path.join(self.reports_dir, f"Graph_Report_{timestamp}.csv")
+            users, report_path, resumed = self._begin_run_journal("Graph", users, report_path, resume)
+            self._open_mailbox_stats("Graph")
+            users = self._schedule_longest_first("Graph", users)
+            append_report = resumed and os.path.exists(report_path)
+            self._progress_reset(len(users))
             self.update_report_link(report_path)
             
             target_type = self.cleanup_target_var.get()
             
-            with open(report_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
+            with open(report_path, 'a' if append_report else 'w', newline='', encoding='utf-8-sig') as csvfile:
                 if target_type == "Meeting":
                     fieldnames = [
                         'SMTPAddress', 'UserPrincipalName', 'ItemId', 'Subject', 'Type', 'MeetingGOID', 'CleanGOID',
@@ -4783,16 +7887,10 @@ class UniversalEmailCleanerApp:
                     if 'MessageId' in selected_result_fields:
                         fieldnames.append('MessageId')
                     fieldnames.extend(['Type', 'Action', 'Status', 'Details'])
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
+                writer = _RowCountingWriter(csv.DictWriter(csvfile, fieldnames=fieldnames), self._report_row_counts)
+                if not append_report:
+                    writer.writeheader()
 
-                # Build Filter
-                filters = []
-                
-                # Common Filters — subject filter only for Email; meetings use client-side filtering
-                if self.criteria_subject.get() and target_type == "Email":
-                    filters.append(f"contains(subject, '{self.criteria_subject.get()}')")
-                
                 start_date = self.criteria_start_date.get().strip().replace('/', '-')
                 end_date = self.criteria_end_date.get().strip().replace('/', '-')
                 
@@ -4800,11 +7898,6 @@ class UniversalEmailCleanerApp:
                 if target_type == "Email":
                     resource = "messages"
                     delete_resource = "messages"
-                    if self.criteria_msg_id.get(): filters.append(f"internetMessageId eq '{self.criteria_msg_id.get()}'")
-                    if self.criteria_sender.get(): filters.append(f"from/emailAddress/address eq '{self.criteria_sender.get()}'")
-                    if self.criteria_has_attachments.get(): filters.append("hasAttachments eq true")
-                    if start_date: filters.append(f"receivedDateTime ge {start_date}T00:00:00Z")
-                    if end_date: filters.append(f"receivedDateTime le {end_date}T23:59:59Z")
                 else: # Meeting
                     # If both start+end present -> use calendarView to expand recurrence instances
                     # Otherwise -> fallback to events (no recurrence expansion)
@@ -4816,32 +7909,35 @@ class UniversalEmailCleanerApp:
                         delete_resource = "events"
                         self.log("提示: 未指定日期范围，无法展开循环会议实例 (occurrence/exception)。建议设置起止日期。")
 
-                    # organizer / subject / isCancelled — Graph events/calendarView often rejects
-                    # combined $filter on these fields; use client-side filtering instead.
-
-                    if resource == "events":
-                        if start_date:
-                            filters.append(f"start/dateTime ge '{start_date}T00:00:00'")
-                        if end_date:
-                            filters.append(f"end/dateTime le '{end_date}T23:59:59'")
-                    
-                    # Meeting Specifics — type filter
-                    scope = self.meeting_scope_var.get()
-                    if resource == "calendarView":
-                        # calendarView returns occurrence/exception/singleInstance;
-                        # $filter on 'type' may be rejected — use client-side filtering.
-                        pass  # type filtering will be done client-side below
-                    else:
-                        # /events endpoint supports $filter on type
-                        if "Single" in scope:
-                            filters.append("type eq 'singleInstance'")
-                        elif "Series" in scope:
-                            filters.append("type eq 'seriesMaster'")
-                        # If All, no type filter
-
-                filter_str = " and ".join(filters)
                 body_keyword = self.criteria_body.get()
 
+                # Build Filter — the planner pushes as much as the endpoint accepts to the server;
+                # organizer / subject / isCancelled on events are tried as "risky" clauses and
+                # dropped run-wide on the first 400. Client-side checks always run as a safety net.
+                query_plan = build_graph_query_plan(
+                    target_type, resource,
+                    {
+                        'subject': self.criteria_subject.get(),
+                        'sender': self.criteria_sender.get(),
+                        'msg_id': (self.criteria_msg_id.get() or '').strip(),
+                        'has_attachments': bool(self.criteria_has_attachments.get()),
+                        'start_date': start_date,
+                        'end_date': end_date,
+                        'recipient': self.criteria_recipient.get(),
+                        'attendee': self.criteria_attendee.get(),
+                        'goid': self.criteria_goid.get(),
+                        'goid_exact': bool(self.criteria_goid_exact.get()),
+                        'clean_goid': self.criteria_clean_goid.get(),
+                        'only_cancelled': bool(self.meeting_only_cancelled_var.get()),
+                        'body': body_keyword,
+                        'body_search': bool(body_keyword) and not bool(self.graph_incremental_var.get()),
+                    },
+                    meeting_scope=self.meeting_scope_var.get(),
+                )
+                self._graph_query_plan = query_plan
+                filter_str = query_plan.current_filter()
+                self.log(f"查询计划: {query_plan.describe()}", is_advanced=True)
+
                 calendar_view_start = None
                 calendar_view_end = None
                 if target_type == "Meeting" and resource == "calendarView":
@@ -4854,26 +7950,87 @@ class UniversalEmailCleanerApp:
                 permanent_delete = bool(self.permanent_delete_var.get()) and (not report_only) and (target_type == "Email")
                 selected_folders = self._get_selected_folders()
                 selected_result_fields = self._get_selected_result_fields()
+
+                self._graph_series_cache = SeriesMasterCache() if target_type == "Meeting" else None
+
+                # Incremental (delta) scan — Email only. The fingerprint binds saved delta links to the
+                # criteria and delete mode of this run; changing either forces a full sync next time.
+                self._graph_delta_store = None
+                self._graph_delta_fingerprint = ""
+                self._graph_delta_tenant = (tenant_id or '').strip() or env
+                self._graph_folder_index_cache = None
+                shard_queue = getattr(self, '_shard_queue', None)
+                if target_type == "Email":
+                    self._graph_folder_index_cache = GraphFolderIndexCache(os.path.join(self.documents_dir, "graph_folder_index.json"),
+                                                                           persist=shard_queue is None)
+                if target_type == "Email" and bool(self.graph_incremental_var.get()):
+                    fp_src = json.dumps({
+                        'filter': filter_str,
+                        'body': body_keyword,
+                        'recipient': (self.criteria_recipient.get() or '').strip().lower(),
+                        'has_attachments': bool(self.criteria_has_attachments.get()),
+                        'report_only': bool(report_only),
+                        'permanent': bool(permanent_delete),
+                        'soft': bool(self.soft_delete_var.get()),
+                    }, sort_keys=True)
+                    self._graph_delta_fingerprint = hashlib.sha256(fp_src.encode('utf-8')).hexdigest()[:16]
+                    self._graph_delta_store = GraphDeltaStateStore(os.path.join(self.documents_dir, "graph_delta_state.json"),
+                                                                   persist=shard_queue is None)
+                    self.log("增量扫描已启用: 仅处理自上次运行以来新增/变更的邮件 (条件变化时自动完整同步)。")
                 
-                with ThreadPoolExecutor(max_workers=10) as executor:
-                    futures = []
-                    soft_delete = bool(self.soft_delete_var.get()) and (not report_only) and (target_type == "Email") and (not permanent_delete)
-                    for user in users:
-                        futures.append(executor.submit(
-                            self.process_single_user_graph, 
-                            user, graph_endpoint, headers, resource, delete_resource, target_type, filter_str, body_keyword,
-                            report_only, writer, csv_lock, calendar_view_start, calendar_view_end,
-                            selected_folders, selected_result_fields, permanent_delete, soft_delete
-                        ))
-                    
-                    # Wait for all to complete
-                    for future in futures:
-                        try:
-                            future.result()
-                        except Exception as e:
-                            self.log(f"Task Error: {e}", "ERROR")
-                        self._progress_increment()
+                shard_count = self._process_shard_count(len(users))
+                if lease_dir:
+                    self._run_lease_coordinator("Graph", users, lease_dir, csvfile)
+                elif shard_count > 1:
+                    self._run_process_shards("Graph", users, shard_count, csvfile)
+                else:
+                    ctl = self._new_concurrency_controller()
+                    try:
+                        with ThreadPoolExecutor(max_workers=ctl.max_limit) as executor:
+                            futures = []
+                            soft_delete = bool(self.soft_delete_var.get()) and (not report_only) and (target_type == "Email") and (not permanent_delete)
+                            for user in users:
+                                futures.append(executor.submit(
+                                    ctl.run, self._run_mailbox_journaled, self.process_single_user_graph,
+                                    user, graph_endpoint, headers, resource, delete_resource, target_type, filter_str, body_keyword,
+                                    report_only, writer, csv_lock, calendar_view_start, calendar_view_end,
+                                    selected_folders, selected_result_fields, permanent_delete, soft_delete
+                                ))
+
+                            # Wait for all to complete
+                            for future in futures:
+                                try:
+                                    future.result()
+                                except Exception as e:
+                                    self.log(f"Task Error: {e}", "ERROR")
+                                self._progress_increment()
+                    finally:
+                        self._end_concurrency_controller(ctl)
+
+                if shard_queue is not None:
+                    # Worker process: the parent merges these and writes the files once.
+                    shard_queue.put(('state', self._shard_context['index'], {
+                        '_graph_delta_store': self._graph_delta_store.export_changes() if self._graph_delta_store is not None else {},
+                        '_graph_folder_index_cache': self._graph_folder_index_cache.export_changes() if self._graph_folder_index_cache is not None else {},
+                    }, None, None))
+
+                if self._graph_delta_store is not None:
+                    try:
+                        self._graph_delta_store.flush()
+                    except Exception as e:
+                        self.log(f"保存增量扫描状态失败: {e}", "ERROR")
+                if token_mgr.refresh_count > 1:
+                    self.log(f"运行期间 Token 已自动刷新 {token_mgr.refresh_count - 1} 次", is_advanced=True)
+                if self._graph_series_cache is not None and shard_count == 1:
+                    self.log(f"系列主会议缓存: 命中 {self._graph_series_cache.hits}, 未命中 {self._graph_series_cache.misses}", is_advanced=True)
+                if self._graph_folder_index_cache is not None:
+                    try:
+                        self._graph_folder_index_cache.flush()
+                    except Exception as e:
+                        self.log(f"保存文件夹索引缓存失败: {e}", "ERROR", is_advanced=True)
 
+            self._close_mailbox_stats()
+            self._finish_run_journal()
             self._progress_finish("Graph 任务完成")
             self.log(f">>> 任务完成! 报告: {report_path}")
             msg_title = "完成"
@@ -4884,13 +8041,13 @@ class UniversalEmailCleanerApp:
             else:
                 msg_body = f"清理任务已完成。\n报告: {report_path}"
                 
-            messagebox.showinfo(msg_title, msg_body)
+            self._show_message("info", msg_title, msg_body)
 
         except Exception as e:
             self.log(f"X 运行时错误: {e}", "ERROR")
-            messagebox.showerror("错误", str(e))
+            self._show_message("error", "错误", str(e))
         finally:
-            pass
+            self._close_run_journal()
 
     def process_single_user_ews(self, target_email, creds, config, auth_type, use_auto, target_type, 
                                 start_date_str, end_date_str, criteria_sender, criteria_msg_id, 
@@ -4901,13 +8058,18 @@ class UniversalEmailCleanerApp:
         try:
             self.log(f"--- 正在处理: {target_email} ---")
             criteria_goid = (self.criteria_goid.get() or '').strip().lower()
+            criteria_goid_exact = bool(self.criteria_goid_exact.get())
             criteria_clean_goid = (self.criteria_clean_goid.get() or '').strip().lower()
             criteria_attendee = (self.criteria_attendee.get() or '').strip().lower()
             criteria_recipient = (self.criteria_recipient.get() or '').strip().lower()
             criteria_has_attachments = bool(self.criteria_has_attachments.get())
+            send_cancellations = bool(self.meeting_send_cancellations_var.get()) and target_type == "Meeting"
             
             # Build Account — support Basic credentials or OAuth2/Token
             access_type_val = IMPERSONATION if auth_type == "Impersonation" else DELEGATE
+            token_mgr = getattr(self, '_ews_run_token_manager', None)
+            if creds is None and access_token and token_mgr is not None:
+                access_token = token_mgr.get()
 
             if creds is not None:
                 # Basic or OAuth2Credentials path
@@ -4951,8 +8113,10 @@ class UniversalEmailCleanerApp:
                 dt = datetime.strptime(end_date_str, "%Y-%m-%d") + timedelta(days=1)
                 end_dt = EWSDateTime.from_datetime(dt).replace(tzinfo=account.default_timezone)
 
-            # Recurrence Cache
-            recurrence_cache = {}
+            # Recurring-master details shared by every mailbox worker of the run
+            series_cache = getattr(self, '_ews_series_cache', None)
+            if series_cache is None:
+                series_cache = self._ews_series_cache = SeriesMasterCache()
 
             # Optimization: Larger page size for fewer round-trips
             page_size = 200
@@ -5067,22 +8231,63 @@ class UniversalEmailCleanerApp:
                         with csv_lock:
                             writer.writerow(r)
 
-                for folder in folders:
+                slice_threshold = self._safe_int_var(self.slice_threshold_var, 20000)
+                slice_workers_cap = max(1, self._safe_int_var(self.graph_mailbox_concurrency_var, 4))
+
+                def _folder_query(folder):
+                    qs = folder.all().order_by('-datetime_received')
+                    qs.page_size = page_size
+                    if start_dt:
+                        qs = qs.filter(datetime_received__gte=start_dt)
+                    if end_dt:
+                        qs = qs.filter(datetime_received__lt=end_dt)
+                    if criteria_sender:
+                        qs = qs.filter(sender__icontains=criteria_sender)
+                    if criteria_subject:
+                        qs = qs.filter(subject__icontains=criteria_subject)
+                    if criteria_msg_id:
+                        qs = qs.filter(message_id=criteria_msg_id)
+                    return qs
+
+                def _received_cuts(folder, qs) -> list:
+                    # Big folders are split into disjoint datetime_received ranges. EWS has no cheap
+                    # filtered count (QuerySet.count() pages through every id), so the cut points come
+                    # from offset probes instead: qs[k] is a single FindItem of one item at offset k.
+                    if slice_threshold <= 0:
+                        return []
+                    try:
+                        total = int(getattr(folder, 'total_count', 0) or 0)
+                    except (TypeError, ValueError):
+                        total = 0
+                    if total <= slice_threshold:
+                        return []
+                    step = max(slice_threshold, -(-total // 64))
+                    probe = qs.only('datetime_received')
+                    cuts = []
+                    for k in range(step, total, step):
+                        try:
+                            received = probe[k].datetime_received
+                        except IndexError:
+                            # fewer matching items than the folder holds
+                            break
+                        except Exception as e:
+                            self.log(f"  分片探测失败: {getattr(folder, 'name', '')} | {e}", is_advanced=True)
+                            break
+                        # newest first, so cuts descend; equal timestamps would give an empty slice
+                        if received and (not cuts or received < cuts[-1]):
+                            cuts.append(received)
+                    return cuts
+
+                def _scan_folder(folder, lo=None, hi=None) -> bool:
+                    # False if the folder (or slice) could not be scanned to the end
                     batch_items = []
                     batch_rows = []
                     try:
-                        qs = folder.all().order_by('-datetime_received')
-                        qs.page_size = page_size
-                        if start_dt:
-                            qs = qs.filter(datetime_received__gte=start_dt)
-                        if end_dt:
-                            qs = qs.filter(datetime_received__lt=end_dt)
-                        if criteria_sender:
-                            qs = qs.filter(sender__icontains=criteria_sender)
-                        if criteria_subject:
-                            qs = qs.filter(subject__icontains=criteria_subject)
-                        if criteria_msg_id:
-                            qs = qs.filter(message_id=criteria_msg_id)
+                        qs = _folder_query(folder)
+                        if lo is not None:
+                            qs = qs.filter(datetime_received__gte=lo)
+                        if hi is not None:
+                            qs = qs.filter(datetime_received__lt=hi)
 
                         fields = ['id', 'changekey', 'subject', 'sender', 'datetime_received']
                         if 'MessageId' in selected_result_fields_set:
@@ -5164,8 +8369,33 @@ class UniversalEmailCleanerApp:
 
                         if batch_items:
                             _flush_delete_batch(folder, batch_items, batch_rows)
+                        return True
                     except Exception as e:
                         self.log(f"  文件夹扫描失败: {getattr(folder, 'name', '')} | {e}", "ERROR")
+                        return False
+
+                # a failed folder or slice keeps the mailbox from being reported (and journaled) as done
+                scan_ok = True
+                for folder in folders:
+                    try:
+                        cuts = _received_cuts(folder, _folder_query(folder))
+                    except Exception:
+                        cuts = []
+                    if not cuts:
+                        scan_ok = _scan_folder(folder) and scan_ok
+                        continue
+                    # [newest cut, +inf), [next cut, previous cut), ..., (-inf, oldest cut)
+                    bounds = [(cuts[0], None)] + [(cuts[i], cuts[i - 1]) for i in range(1, len(cuts))] + [(None, cuts[-1])]
+                    self.log(f"  {getattr(folder, 'name', '')}: {folder.total_count} 封邮件，按接收时间分为 {len(bounds)} 个分片并行扫描", is_advanced=True)
+                    with ThreadPoolExecutor(max_workers=min(len(bounds), slice_workers_cap)) as slice_pool:
+                        for _f in [slice_pool.submit(_scan_folder, folder, lo, hi) for lo, hi in bounds]:
+                            scan_ok = _f.result() and scan_ok
+                # every folder was streamed above; the common query below is meetings-only
+                if not scan_ok:
+                    with csv_lock:
+                        writer.writerow({'SMTPAddress': target_email, 'UserPrincipalName': target_email,
+                                         'Status': 'Error', 'Details': '部分文件夹扫描失败'})
+                return scan_ok
 
             else:
                 # Meeting Logic with CalendarView
@@ -5199,73 +8429,127 @@ class UniversalEmailCleanerApp:
             
             self.log(f"正在查询 EWS...", is_advanced=True)
             
-            # Execute query for Meeting (Email already streamed above)
-            if target_type != "Email":
-                items = list(qs)
-                if not items:
-                    self.log(f"用户 {target_email} 未找到项目。")
-            else:
-                # Email already handled
-                return
-            
-            for item in items:
-                # Client Side Filters
-                if target_type == "Meeting":
-                    # 1. Filter by Subject (if CalendarView)
-                    if is_calendar_view and criteria_subject:
-                        if criteria_subject.lower() not in (item.subject or "").lower():
-                            continue
-                    
-                    # 2. Filter by Organizer (if CalendarView)
-                    if is_calendar_view and criteria_sender:
-                        organizer_email = item.organizer.email_address if item.organizer else ""
-                        if criteria_sender.lower() not in organizer_email.lower():
-                            continue
-
-                    # 3. Filter by IsCancelled (if CalendarView)
-                    if is_calendar_view and meeting_only_cancelled:
-                        if not item.is_cancelled:
-                            continue
-
-                    inferred_type = guess_calendar_item_type(item)
-
-                    # Apply scope filter using inferred type
-                    if "Single" in meeting_scope:
-                        if inferred_type != 'Single': continue
-                    elif "Series" in meeting_scope:
-                        if inferred_type not in ('RecurringMaster', 'Occurrence', 'Exception'): continue
-
-                # Body check
+            # Meetings are streamed page by page: filters and GetItem enrichment run in chunks as items
+            # arrive instead of on a list of the whole calendar; deletes are queued by id and sent once
+            # the stream is exhausted. A plain calendar query lists
+            # only the fields the filters need; CalendarView is left without only() (InvalidField on
+            # some servers) and exchangelib fetches its items in GetItem chunks.
+            if not is_calendar_view:
+                list_fields = list(EWS_MEETING_LIST_FIELDS)
                 if criteria_body:
-                    if criteria_body.lower() not in (item.body or "").lower():
-                        continue
+                    list_fields.append('body')
+                try:
+                    qs = qs.only(*list_fields)
+                except Exception:
+                    pass
+            qs.page_size = page_size
+            items = qs
+            scanned = 0
 
-                # Enrich meeting item details
-                if target_type == "Meeting":
+            master_index: dict = {}
+
+            def _master_by_uid(uid):
+                # Recurring masters keyed by UID, read in one pass the first time an instance needs its
+                # master (instead of enumerating the whole calendar for every instance).
+                if not master_index:
+                    master_index[None] = None
                     try:
-                        _id = getattr(item, 'id', None) or getattr(item, 'item_id', None)
-                        _ck = getattr(item, 'changekey', None) or getattr(item, 'change_key', None) or getattr(item, 'changeKey', None)
-                        if _id:
-                            full_item = account.calendar.get(id=_id, changekey=_ck) if _ck else account.calendar.get(id=_id)
-                            try:
-                                full_item.refresh()
-                            except Exception:
-                                pass
-                            if full_item:
-                                item = full_item
+                        # IsRecurring is not reliably set on masters; CalendarItemType is
+                        for m in account.calendar.filter(type='RecurringMaster').only(*EWS_MASTER_INDEX_FIELDS):
+                            if getattr(m, 'recurrence', None) and getattr(m, 'uid', ''):
+                                master_index.setdefault(m.uid, m)
                     except Exception as _e:
-                        self.log(f"  无法获取完整项属性 (GetItem): {_e}", is_advanced=True)
+                        self.log(f"  无法建立循环会议主项索引: {_e}", is_advanced=True)
+                    self.log(f"  已索引 {len(master_index) - 1} 个循环会议主项", is_advanced=True)
+                return master_index.get(uid)
+
+            def _attendees_set(it) -> frozenset:
+                s = set()
+                if getattr(it, 'required_attendees', None):
+                    s.update([a.mailbox.email_address for a in it.required_attendees if a.mailbox])
+                if getattr(it, 'optional_attendees', None):
+                    s.update([a.mailbox.email_address for a in it.optional_attendees if a.mailbox])
+                return frozenset(s)
+
+            def _describe_master(master) -> dict:
+                rec = getattr(master, 'recurrence', None)
+                pat = getattr(rec, 'pattern', None) if rec else None
+                return {
+                    'pattern': translate_pattern_type(pat.__class__.__name__) if pat else '',
+                    'details': get_pattern_details(pat) if pat else '',
+                    'duration': get_recurrence_duration(rec) if rec else '',
+                    'endless': is_endless_recurring('RecurringMaster', rec),
+                    'subject': master.subject or '',
+                    'location': getattr(master, 'location', None) or '',
+                    'attendees': _attendees_set(master),
+                }
 
+            def _master_info(uid, master_ref) -> dict | None:
+                # Cached per master id for this mailbox and run-wide per UID, so the attendees of
+                # one organizer's series share a single master GetItem; None if it cannot be found.
+                master_id, master_ck = master_ref, None
+                if master_id is not None and hasattr(master_id, "id"):
+                    master_ck = getattr(master_id, "changekey", None)
+                    master_id = master_id.id
+                info = series_cache.get_series(uid)
+                if info is SeriesMasterCache.MISSING and master_id:
+                    info = series_cache.get_master(target_email, master_id)
+                if info is not SeriesMasterCache.MISSING:
+                    return info
+                claimed = bool(uid) and series_cache.claim(uid)
+                if uid and not claimed:
+                    series_cache.wait(uid)
+                    info = series_cache.get_series(uid)
+                    if info is not SeriesMasterCache.MISSING:
+                        return info
+                try:
+                    master = None
+                    if master_id:
+                        try:
+                            master = account.calendar.get(id=master_id, changekey=master_ck) if master_ck else account.calendar.get(id=master_id)
+                        except Exception:
+                            pass
+                    if master is None and uid:
+                        master = _master_by_uid(uid)
+                    info = _describe_master(master) if master is not None else None
+                    series_cache.put(target_email, master_id or '', info, (uid,) if info else ())
+                    return info
+                except Exception:
+                    return None
+                finally:
+                    if claimed:
+                        series_cache.release(uid)
+
+            def _enrich_meetings(batch):
+                # One GetItem per chunk for the report fields, instead of calendar.get() + refresh()
+                # (two round trips) per meeting. Results come back in input order; an item that
+                # cannot be fetched keeps its FindItem fields.
+                try:
+                    fetched = list(account.fetch(ids=batch, folder=account.calendar,
+                                                 only_fields=EWS_MEETING_FETCH_FIELDS, chunk_size=len(batch)))
+                except Exception as _e:
+                    self.log(f"  无法获取完整项属性 (GetItem): {_e}", is_advanced=True)
+                    return batch
+                enriched = []
+                for orig, full_item in zip(batch, fetched):
+                    if isinstance(full_item, Exception):
+                        self.log(f"  无法获取完整项属性 (GetItem): {full_item}", is_advanced=True)
+                        enriched.append(orig)
+                    else:
+                        enriched.append(full_item)
+                return enriched
+
+            def _emit_meeting(item):
                 # Extract attributes
                 item_id = getattr(item, 'id', None) or (item.item_id if hasattr(item, 'item_id') else getattr(item, 'message_id', 'Unknown ID'))
                 subject = item.subject
-                
+            
                 row = {}
                 if target_type == "Meeting":
                     # (1) Master vs Instance
                     has_recurrence = getattr(item, 'recurrence', None) is not None
                     has_instance_markers = (getattr(item, 'original_start', None) is not None) or (getattr(item, 'recurrence_id', None) is not None)
-                    
+                
                     if has_recurrence:
                         m_type = "RecurringMaster"
                     elif has_instance_markers:
@@ -5278,7 +8562,7 @@ class UniversalEmailCleanerApp:
                     m_goid = m_uid
                     m_clean_goid = (m_goid or item_id or '').strip().lower()
                     m_organizer = item.organizer.email_address if item.organizer else 'Unknown'
-                    
+                
                     m_attendees = []
                     if item.required_attendees:
                         m_attendees.extend([a.mailbox.email_address for a in item.required_attendees if a.mailbox])
@@ -5286,23 +8570,23 @@ class UniversalEmailCleanerApp:
                         m_attendees.extend([a.mailbox.email_address for a in item.optional_attendees if a.mailbox])
                     m_attendees_str = "; ".join(m_attendees)
 
-                    if criteria_goid and criteria_goid not in str(m_goid or '').lower():
-                        continue
+                    if criteria_goid and not goid_matches(criteria_goid, m_goid, criteria_goid_exact):
+                        return
                     if criteria_clean_goid and criteria_clean_goid not in str(m_clean_goid or '').lower():
-                        continue
+                        return
                     if criteria_attendee and not any(criteria_attendee in str(addr).lower() for addr in m_attendees):
-                        continue
-                    
+                        return
+                
                     m_start = getattr(item, 'start', '')
                     m_end = getattr(item, 'end', '')
-                    
+                
                     m_role = 'Attendee'
                     if m_organizer.lower() == target_email.lower():
                         m_role = 'Organizer'
-                    
+                
                     m_is_cancelled = getattr(item, 'is_cancelled', False)
                     m_response_status = getattr(item, 'my_response_type', 'Unknown')
-                    
+                
                     # (2) If instance, determine Occurrence vs Exception
                     original_start = getattr(item, 'original_start', None)
                     if m_type == "Instance":
@@ -5310,41 +8594,15 @@ class UniversalEmailCleanerApp:
                         if start_val and original_start and start_val != original_start:
                             m_type = "Exception"
                         else:
-                            master_item = None
-                            try:
-                                master_id = m_recurring_master_id
-                                master_ck = None
-                                if master_id is not None:
-                                    if hasattr(master_id, "id"):
-                                        master_ck = getattr(master_id, "changekey", None)
-                                        master_id = master_id.id
-                                    master_item = account.calendar.get(id=master_id, changekey=master_ck) if master_ck else account.calendar.get(id=master_id)
-                                if master_item is None and m_uid:
-                                    for m in account.calendar.all():
-                                        if getattr(m, 'uid', '') == m_uid and getattr(m, 'recurrence', None):
-                                            master_item = m
-                                            break
-                            except Exception:
-                                pass
-
-                            if master_item:
-                                try:
-                                    subj_diff = (item.subject or '') != (master_item.subject or '')
-                                    loc_diff = (getattr(item, 'location', None) or '') != (getattr(master_item, 'location', None) or '')
-                                    def attendees_set(it):
-                                        s = set()
-                                        if getattr(it, 'required_attendees', None):
-                                            s.update([a.mailbox.email_address for a in it.required_attendees if a.mailbox])
-                                        if getattr(it, 'optional_attendees', None):
-                                            s.update([a.mailbox.email_address for a in it.optional_attendees if a.mailbox])
-                                        return s
-                                    att_diff = attendees_set(item) != attendees_set(master_item)
-                                    if subj_diff or loc_diff or att_diff:
-                                        m_type = "Exception"
-                                    else:
-                                        m_type = "Occurrence"
-                                except Exception:
-                                    m_type = "Instance-Unknown"
+                            master_info = _master_info(m_uid, m_recurring_master_id)
+                            if master_info:
+                                subj_diff = (item.subject or '') != master_info['subject']
+                                loc_diff = (getattr(item, 'location', None) or '') != master_info['location']
+                                att_diff = _attendees_set(item) != master_info['attendees']
+                                if subj_diff or loc_diff or att_diff:
+                                    m_type = "Exception"
+                                else:
+                                    m_type = "Occurrence"
                             else:
                                 m_type = "Instance-Unknown"
 
@@ -5353,7 +8611,7 @@ class UniversalEmailCleanerApp:
                     m_pattern_details = ""
                     m_recurrence_duration = ""
                     m_is_endless = "N/A"
-                    
+                
                     if m_type == "RecurringMaster" and getattr(item, 'recurrence', None):
                         pat = getattr(item.recurrence, 'pattern', None)
                         if pat:
@@ -5362,41 +8620,11 @@ class UniversalEmailCleanerApp:
                         m_recurrence_duration = get_recurrence_duration(item.recurrence)
                         m_is_endless = is_endless_recurring(m_type, item.recurrence)
                     elif m_type in ("Occurrence", "Exception", "Instance", "Instance-Unknown"):
-                        master_item_for_pattern = None
-                        try:
-                            if m_uid and m_uid in recurrence_cache:
-                                m_recurrence = recurrence_cache[m_uid]
-                            else:
-                                master_id = m_recurring_master_id
-                                master_ck = None
-                                if master_id is not None:
-                                    if hasattr(master_id, "id"):
-                                        master_ck = getattr(master_id, "changekey", None)
-                                        master_id = master_id.id
-                                    try:
-                                        master_item_for_pattern = account.calendar.get(id=master_id, changekey=master_ck) if master_ck else account.calendar.get(id=master_id)
-                                    except Exception:
-                                        pass
-                                
-                                if master_item_for_pattern is None and m_uid:
-                                    try:
-                                        for m in account.calendar.all():
-                                            if getattr(m, 'uid', '') == m_uid and getattr(m, 'recurrence', None):
-                                                master_item_for_pattern = m
-                                                break
-                                    except Exception:
-                                        pass
-                                
-                                if master_item_for_pattern and getattr(master_item_for_pattern, 'recurrence', None):
-                                    pat = getattr(master_item_for_pattern.recurrence, 'pattern', None)
-                                    if pat:
-                                        m_recurrence = translate_pattern_type(pat.__class__.__name__)
-                                        m_pattern_details = get_pattern_details(pat)
-                                        if m_uid:
-                                            recurrence_cache[m_uid] = m_recurrence
-                                    m_recurrence_duration = get_recurrence_duration(master_item_for_pattern.recurrence)
-                        except Exception:
-                            pass
+                        master_info = _master_info(m_uid, m_recurring_master_id)
+                        if master_info:
+                            m_recurrence = master_info['pattern']
+                            m_pattern_details = master_info['details']
+                            m_recurrence_duration = master_info['duration']
 
                     row = {
                         'SMTPAddress': target_email,
@@ -5417,7 +8645,7 @@ class UniversalEmailCleanerApp:
                         'PatternDetails': m_pattern_details,
                         'RecurrenceDuration': m_recurrence_duration,
                         'IsEndless': m_is_endless,
-                        'Action': 'Report' if report_only else 'Delete',
+                        'Action': 'Report' if report_only else ('PermanentDelete' if permanent_delete else ('SoftDelete' if soft_delete else 'HardDelete')),
                         'Status': 'Pending',
                         'Details': ''
                     }
@@ -5432,7 +8660,7 @@ class UniversalEmailCleanerApp:
                         'Subject': subject,
                         'Sender': sender_val,
                         'Received': received_val,
-                        'Action': 'Report' if report_only else 'Delete',
+                        'Action': 'Report' if report_only else ('PermanentDelete' if permanent_delete else ('SoftDelete' if soft_delete else 'Delete')),
                         'Status': 'Pending',
                         'Details': ''
                     }
@@ -5442,34 +8670,111 @@ class UniversalEmailCleanerApp:
                     row['Status'] = 'Skipped'
                 else:
                     self.log(f"  正在删除: {item.subject}")
-                    if permanent_delete and (target_type == "Email") and (DeleteType is not None):
-                        try:
-                            dt = getattr(DeleteType, 'PURGE', None) or getattr(DeleteType, 'HARD_DELETE', None)
-                            if dt is not None:
-                                item.delete(delete_type=dt)
-                            else:
-                                item.delete()
-                        except Exception:
-                            item.delete()
-                    else:
-                        item.delete()
-                    row['Status'] = 'Success'
-                
+                    pending_deletes.append(((getattr(item, 'id', None), getattr(item, 'changekey', None)), row))
+                    return
+
                 with csv_lock:
                     writer.writerow(row)
                     # csvfile.flush()
 
+            # ((id, changekey), row); deleted only after the query is exhausted, because FindItem
+            # pages by offset and deleting mid-stream would shift later matches past the next page.
+            pending_deletes: list = []
+
+            def _flush_meeting_deletes():
+                # One DeleteItem per chunk with the run's delete type; results come back per item.
+                kwargs = {
+                    'send_meeting_cancellations': 'SendToAllAndSaveCopy' if send_cancellations else 'SendToNone',
+                    'affected_task_occurrences': 'AllOccurrences',
+                }
+                # EWS DeleteType values: only the soft mode keeps the meeting in Deleted Items; the
+                # default mode is a HardDelete like the permanent one (and its rows say so).
+                kwargs['delete_type'] = 'MoveToDeletedItems' if (soft_delete and not permanent_delete) else 'HardDelete'
+                for i in range(0, len(pending_deletes), EWS_FETCH_CHUNK_SIZE):
+                    batch = pending_deletes[i:i + EWS_FETCH_CHUNK_SIZE]
+                    try:
+                        results = list(account.bulk_delete([item_ref for item_ref, _row in batch], **kwargs))
+                    except Exception as e:
+                        self.log(f"  批量删除会议失败: {e}", "ERROR")
+                        results = [e] * len(batch)
+                    for (_ref, row), res in zip(batch, results):
+                        if res is True:
+                            row['Status'] = 'Success'
+                        else:
+                            row['Status'] = 'Failed'
+                            row['Details'] = ((row.get('Details') + '; ') if row.get('Details') else '') + str(res)
+                        with csv_lock:
+                            writer.writerow(row)
+                pending_deletes.clear()
+
+            pending_enrich = []
+            for item in items:
+                scanned += 1
+                # Client Side Filters
+                if target_type == "Meeting":
+                    # 1. Filter by Subject (if CalendarView)
+                    if is_calendar_view and criteria_subject:
+                        if criteria_subject.lower() not in (item.subject or "").lower():
+                            continue
+                    
+                    # 2. Filter by Organizer (if CalendarView)
+                    if is_calendar_view and criteria_sender:
+                        organizer_email = item.organizer.email_address if item.organizer else ""
+                        if criteria_sender.lower() not in organizer_email.lower():
+                            continue
+
+                    # 3. Filter by IsCancelled (if CalendarView)
+                    if is_calendar_view and meeting_only_cancelled:
+                        if not item.is_cancelled:
+                            continue
+
+                    inferred_type = guess_calendar_item_type(item)
+
+                    # Apply scope filter using inferred type
+                    if "Single" in meeting_scope:
+                        if inferred_type != 'Single': continue
+                    elif "Series" in meeting_scope:
+                        if inferred_type not in ('RecurringMaster', 'Occurrence', 'Exception'): continue
+
+                # Body check
+                if criteria_body:
+                    if criteria_body.lower() not in (item.body or "").lower():
+                        continue
+
+                # CalendarView items already come from a GetItem with all fields; only the
+                # projected calendar.all() listing needs the report fields fetched.
+                if target_type == "Meeting" and not is_calendar_view and (getattr(item, 'id', None) or getattr(item, 'item_id', None)):
+                    pending_enrich.append(item)
+                    if len(pending_enrich) >= EWS_FETCH_CHUNK_SIZE:
+                        for full_item in _enrich_meetings(pending_enrich):
+                            _emit_meeting(full_item)
+                        pending_enrich = []
+                else:
+                    _emit_meeting(item)
+            if pending_enrich:
+                for full_item in _enrich_meetings(pending_enrich):
+                    _emit_meeting(full_item)
+            _flush_meeting_deletes()
+            if not scanned:
+                self.log(f"用户 {target_email} 未找到项目。")
+            return True
+
         except Exception as e:
+            back_off = _ews_backoff_seconds(e)
+            if back_off is not None:
+                # the throttled request itself was already fed to the controller by EwsControlledAdapter
+                self.log(f"  EWS 服务器繁忙 (ErrorServerBusy)，全局退避 {back_off:.0f}s。", "ERROR")
             self.log(f"  处理用户 {target_email} 出错: {e}", "ERROR")
             self.log(f"  Traceback: {traceback.format_exc()}", is_advanced=True)
             with csv_lock:
                 writer.writerow({'SMTPAddress': target_email, 'UserPrincipalName': target_email, 'Status': 'Error', 'Details': str(e)})
+            return False
 
     # --- EWS Logic ---
-    def run_ews_cleanup(self):
+    def run_ews_cleanup(self, resume: bool = False, lease_dir: str | None = None):
         if EXCHANGELIB_ERROR:
             self.log(f"EWS 模块加载失败: {EXCHANGELIB_ERROR}", level="ERROR")
-            messagebox.showerror("错误", f"无法加载 EWS 模块 (exchangelib)。\n错误信息: {EXCHANGELIB_ERROR}")
+            self._show_message("error", "错误", f"无法加载 EWS 模块 (exchangelib)。\n错误信息: {EXCHANGELIB_ERROR}")
             return
 
         # Configure Advanced/Expert Logging for EWS
@@ -5517,8 +8822,7 @@ class UniversalEmailCleanerApp:
                 self.log(f"无法启用 EWS 调试日志: {e}", "ERROR")
         else:
             # Reset to default if not advanced/expert
-            BaseProtocol.HTTP_ADAPTER_CLS = NoVerifyHTTPAdapter
-            BaseProtocol.HTTP_ADAPTER_CLS = NoVerifyHTTPAdapter
+            BaseProtocol.HTTP_ADAPTER_CLS = EwsControlledAdapter
 
         try:
             self.log(">>> 开始 EWS 清理...")
@@ -5530,6 +8834,11 @@ class UniversalEmailCleanerApp:
             ews_auth_method = self.ews_auth_method_var.get()
 
             creds, token = self._get_ews_credentials()
+            # Bare OAuth2 bearer tokens are re-read per mailbox so long runs pick up refreshed tokens;
+            # OAuth2Credentials handles its own renewal inside exchangelib.
+            self._ews_run_token_manager = None
+            if creds is None and token and ews_auth_method == "OAuth2":
+                self._ews_run_token_manager = self._get_ews_oauth2_token_manager()
 
             # Determine exchangelib auth_type constant for NTLM vs Basic
             ews_proto_auth_type = None
@@ -5557,11 +8866,15 @@ class UniversalEmailCleanerApp:
             users = self._get_target_users()
             
             self.log(f"目标列表中共有 {len(users)} 个邮箱。")
-            self._progress_reset(len(users))
 
             # 3. Report File
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             report_path = os.path.join(self.reports_dir, f"EWS_Report_{timestamp}.csv")
+            users, report_path, resumed = self._begin_run_journal("EWS", users, report_path, resume)
+            self._open_mailbox_stats("EWS")
+            users = self._schedule_longest_first("EWS", users)
+            append_report = resumed and os.path.exists(report_path)
+            self._progress_reset(len(users))
             self.update_report_link(report_path)
 
             # Determine headers based on target type
@@ -5587,9 +8900,10 @@ class UniversalEmailCleanerApp:
                     fieldnames.append('Size')
                 fieldnames.extend(['Action', 'Status', 'Details'])
 
-            with open(report_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
+            with open(report_path, 'a' if append_report else 'w', newline='', encoding='utf-8-sig') as csvfile:
+                writer = _RowCountingWriter(csv.DictWriter(csvfile, fieldnames=fieldnames), self._report_row_counts)
+                if not append_report:
+                    writer.writeheader()
 
                 # Extract variables for threads
                 start_date_str = self._normalize_date_input(self.criteria_start_date.get())
@@ -5609,31 +8923,47 @@ class UniversalEmailCleanerApp:
                 log_level = self.log_level_var.get()
                 selected_folders = self._get_selected_folders()
                 selected_result_fields = self._get_selected_result_fields()
-                permanent_delete = bool(self.permanent_delete_var.get()) and (not report_only) and (target_type == "Email")
-                soft_delete = bool(self.soft_delete_var.get()) and (not report_only) and (target_type == "Email") and (not permanent_delete)
+                permanent_delete = bool(self.permanent_delete_var.get()) and (not report_only)
+                soft_delete = bool(self.soft_delete_var.get()) and (not report_only) and (not permanent_delete)
                 
                 csv_lock = threading.Lock()
+                self._ews_series_cache = SeriesMasterCache() if target_type == "Meeting" else None
 
-                with ThreadPoolExecutor(max_workers=10) as executor:
-                    futures = []
-                    for target_email in users:
-                        futures.append(executor.submit(
-                            self.process_single_user_ews,
-                            target_email, creds, config, auth_type, use_auto, target_type,
-                            start_date_str, end_date_str, criteria_sender, criteria_msg_id,
-                            criteria_subject, criteria_body, meeting_only_cancelled, meeting_scope,
-                            report_only, writer, csv_lock, log_level, selected_folders, selected_result_fields,
-                            permanent_delete, soft_delete,
-                            token
-                        ))
-                    
-                    for future in futures:
-                        try:
-                            future.result()
-                        except Exception as e:
-                            self.log(f"Task Error: {e}", "ERROR")
-                        self._progress_increment()
-
+                shard_count = self._process_shard_count(len(users))
+                if lease_dir:
+                    self._run_lease_coordinator("EWS", users, lease_dir, csvfile)
+                elif shard_count > 1:
+                    self._run_process_shards("EWS", users, shard_count, csvfile)
+                else:
+                    ctl = self._new_concurrency_controller()
+                    EwsControlledAdapter.controller = ctl
+                    try:
+                        with ThreadPoolExecutor(max_workers=ctl.max_limit) as executor:
+                            futures = []
+                            for target_email in users:
+                                futures.append(executor.submit(
+                                    ctl.run, self._run_mailbox_journaled, self.process_single_user_ews,
+                                    target_email, creds, config, auth_type, use_auto, target_type,
+                                    start_date_str, end_date_str, criteria_sender, criteria_msg_id,
+                                    criteria_subject, criteria_body, meeting_only_cancelled, meeting_scope,
+                                    report_only, writer, csv_lock, log_level, selected_folders, selected_result_fields,
+                                    permanent_delete, soft_delete,
+                                    token
+                                ))
+
+                            for future in futures:
+                                try:
+                                    future.result()
+                                except Exception as e:
+                                    self.log(f"Task Error: {e}", "ERROR")
+                                self._progress_increment()
+                    finally:
+                        self._end_concurrency_controller(ctl)
+                if self._ews_series_cache is not None and shard_count == 1:
+                    self.log(f"系列主会议缓存: 命中 {self._ews_series_cache.hits}, 未命中 {self._ews_series_cache.misses}", is_advanced=True)
+
+            self._close_mailbox_stats()
+            self._finish_run_journal()
             self._progress_finish("EWS 任务完成")
             self.log(f">>> 任务完成。报告: {report_path}")
             
@@ -5645,7 +8975,7 @@ class UniversalEmailCleanerApp:
             else:
                 msg_body = "清理任务已完成。"
                 
-            messagebox.showinfo(msg_title, msg_body)
+            self._show_message("info", msg_title, msg_body)
 
         except Exception as e:
             self.log(f"EWS 运行时错误: {e}", "ERROR")
@@ -5658,9 +8988,11 @@ class UniversalEmailCleanerApp:
                 except:
                     pass
             # Reset Adapter
-            BaseProtocol.HTTP_ADAPTER_CLS = NoVerifyHTTPAdapter
+            BaseProtocol.HTTP_ADAPTER_CLS = EwsControlledAdapter
+            EwsControlledAdapter.controller = None
             EwsTraceAdapter.logger = None
             EwsTraceAdapter.response_log_path = None
+            self._close_run_journal()
 
 def _show_activation_dialog(parent, on_success=None, allow_exit=True, initial_error=None):
     """显示许可证激活对话框。返回 True 表示激活成功。"""
@@ -5774,6 +9106,10 @@ def _show_activation_dialog(parent, on_success=None, allow_exit=True, initial_er
 
 
 if __name__ == "__main__":
+    # Frozen builds re-enter here in process-pool workers; let multiprocessing take over.
+    multiprocessing.freeze_support()
+    if '--lease-worker' in sys.argv[1:]:
+        sys.exit(_lease_worker_cli(sys.argv[1:]))
     root = tk.Tk()
 
     # ---- 许可证验证 ----